@@ -0,0 +1,213 @@
+"""
+Bulk Mutation - Filtered server-side updates in chunks
+A validated filter + allowed update runs in the background as chunked update_many with persisted progress, a dry-run count and a cap
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional
+
+from bson import json_util
+
+from uuid_utils import generate_uuid
+
+logger = logging.getLogger(__name__)
+
+STATUS_RUNNING = "RUNNING"
+STATUS_DONE = "DONE"
+STATUS_FAILED = "FAILED"
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_DOCUMENTS_HARD_CAP = 50000  # Larger mutations should be split by filter
+
+
+class BulkLimitExceeded(Exception):
+    """Filter matches more documents than the mutation is allowed to touch"""
+
+    def __init__(self, matched: int, cap: int):
+        super().__init__(f"Filter matches {matched} documents, cap is {cap}")
+        self.matched = matched
+        self.cap = cap
+
+
+class BulkMutator:
+    """Runs filtered update_many in _id-ordered chunks as background jobs, recording progress in bulk_jobs
+
+    Jobs start right away in the submitting process; one whose worker stops renewing its lease
+    is resumed from its last chunk by any process.
+    """
+
+    def __init__(
+        self,
+        db,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        lease_seconds: int = 120,
+        poll_interval: float = 10.0,
+    ):
+        self.db = db
+        self.jobs = db.bulk_jobs
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def ensure_indexes(self):
+        await self.jobs.create_index("id", unique=True)
+        await self.jobs.create_index("created_at")
+        await self.jobs.create_index([("status", 1), ("locked_until", 1)])
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.jobs.find_one({"id": job_id}, {"_id": 0, "query": 0, "update": 0, "last_id": 0})
+
+    async def dry_run(self, collection, query: Dict[str, Any], cap: int, sample_size: int = 20) -> Dict[str, Any]:
+        """Count + sample ids - nothing is written"""
+        matched = await collection.count_documents(query)
+        sample = await collection.find(query, {"_id": 0, "id": 1}).limit(sample_size).to_list(sample_size)
+        return {
+            "dry_run": True,
+            "matched": matched,
+            "cap": cap,
+            "within_cap": matched <= cap,
+            "sample_ids": [doc["id"] for doc in sample if "id" in doc]
+        }
+
+    def _lease(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+
+    async def submit(
+        self,
+        collection,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        cap: int,
+        description: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Start a mutation of every document matching query - refuses up front when the match exceeds cap"""
+        matched = await collection.count_documents(query)
+        if matched > cap:
+            raise BulkLimitExceeded(matched, cap)
+
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": generate_uuid(),
+            "collection": collection.name,
+            "description": description,
+            "status": STATUS_RUNNING,
+            "matched": matched,
+            "cap": cap,
+            "modified": 0,
+            "chunks_done": 0,
+            # Extended JSON - operator keys and dates survive the round trip through the job document
+            "query": json_util.dumps(query),
+            "update": json_util.dumps(update),
+            "locked_until": now + timedelta(seconds=self.lease_seconds),
+            "created_at": now,
+            "updated_at": now
+        }
+        await self.jobs.insert_one(job)
+        self._spawn(job)
+        return {key: value for key, value in job.items() if key not in ("_id", "query", "update")}
+
+    def _spawn(self, job: Dict[str, Any]):
+        task = asyncio.create_task(self._execute(job))
+        self._running[job["id"]] = task
+        task.add_done_callback(lambda _: self._running.pop(job["id"], None))
+
+    async def _execute(self, job: Dict[str, Any]):
+        """Chunks from the job's last position until the filter is exhausted or cap is reached"""
+        collection = self.db[job["collection"]]
+        query = json_util.loads(job["query"])
+        update = json_util.loads(job["update"])
+        cap = job["cap"]
+        modified = job.get("modified", 0)
+        last_id = job.get("last_id")
+
+        # Walk matches by _id - documents the update moves out of the filter are not revisited
+        try:
+            while modified < cap:
+                page_query = dict(query)
+                if last_id is not None:
+                    page_query["_id"] = {"$gt": last_id}
+                limit = min(self.chunk_size, cap - modified)
+                chunk = await collection.find(page_query, {"_id": 1}).sort("_id", 1).limit(limit).to_list(limit)
+                if not chunk:
+                    break
+                last_id = chunk[-1]["_id"]
+
+                # Filter is re-applied so documents changed since the page read (or a resumed chunk) are skipped
+                result = await collection.update_many(
+                    {**query, "_id": {"$in": [doc["_id"] for doc in chunk]}},
+                    update
+                )
+                modified += result.modified_count
+                # Progress, resume point and lease renewal in one write
+                await self.jobs.update_one(
+                    {"id": job["id"]},
+                    {
+                        "$inc": {"modified": result.modified_count, "chunks_done": 1},
+                        "$set": {"last_id": last_id, "locked_until": self._lease(), "updated_at": datetime.now(timezone.utc)}
+                    }
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Bulk mutation {job['id']} failed after {modified} documents: {e}")
+            await self.jobs.update_one(
+                {"id": job["id"]},
+                {
+                    "$set": {"status": STATUS_FAILED, "error": str(e), "updated_at": datetime.now(timezone.utc)},
+                    "$unset": {"locked_until": ""}
+                }
+            )
+            return
+
+        finished_at = datetime.now(timezone.utc)
+        await self.jobs.update_one(
+            {"id": job["id"]},
+            {
+                "$set": {"status": STATUS_DONE, "finished_at": finished_at, "updated_at": finished_at},
+                "$unset": {"locked_until": ""}
+            }
+        )
+        logger.info(f"Bulk mutation {job['id']} on {job['collection']}: {modified}/{job['matched']} modified")
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """A running job whose worker stopped renewing its lease"""
+        now = datetime.now(timezone.utc)
+        return await self.jobs.find_one_and_update(
+            {"status": STATUS_RUNNING, "locked_until": {"$lt": now}},
+            {"$set": {"locked_until": self._lease()}},
+            sort=[("created_at", 1)]
+        )
+
+    async def _resume_forever(self):
+        while True:
+            try:
+                job = await self._claim()
+                if job and job["id"] not in self._running:
+                    self._spawn(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error resuming bulk mutations: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._resume_forever())
+
+    async def stop(self):
+        """Stop the workers - interrupted jobs are released for the next start (or another process)"""
+        tasks = [task for task in [self._task, *self._running.values()] if task]
+        job_ids = list(self._running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        if job_ids:
+            await self.jobs.update_many(
+                {"id": {"$in": job_ids}, "status": STATUS_RUNNING},
+                {"$set": {"locked_until": datetime.now(timezone.utc)}}
+            )
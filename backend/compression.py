@@ -0,0 +1,297 @@
+"""
+Response Compression - Negotiated gzip/brotli ASGI middleware
+Bodies under a size threshold pass through; large bodies are compressed off the event loop; streams are compressed chunk by chunk
+"""
+
+import asyncio
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _header(headers: Headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _without(headers: Headers, *names: bytes) -> Headers:
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _weakened(headers: Headers) -> Headers:
+    """Strong ETag turned weak - a compressed representation is not byte-identical"""
+    etag = _header(headers, b"etag")
+    if etag and not etag.startswith("W/"):
+        headers = _without(headers, b"etag")
+        headers.append((b"etag", f"W/{etag}".encode("latin-1")))
+    return headers
+
+
+def negotiate(accept_encoding: Optional[str], available: Tuple[str, ...]) -> Optional[str]:
+    """Best encoding the client accepts - ties go to server preference (available order)"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if coding:
+            weights[coding] = weight
+    best, best_weight = None, 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class _Encoder:
+    """Incremental gzip or brotli stream - every chunk is flushed so streamed rows reach the client"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31 - gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionStats:
+    """Bytes before/after compression per route template"""
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: str, encoding: Optional[str], bytes_in: int, bytes_out: int, seconds: float):
+        stats = self._routes.setdefault(route, {
+            "responses": 0,
+            "compressed": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "compress_ms": 0.0,
+            "encodings": {},
+        })
+        stats["responses"] += 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        if encoding:
+            stats["compressed"] += 1
+            stats["compress_ms"] += seconds * 1000
+            stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + 1
+
+    def metrics(self) -> Dict[str, Any]:
+        routes = {
+            route: {
+                **stats,
+                "compress_ms": round(stats["compress_ms"], 2),
+                "ratio": round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None,
+            }
+            for route, stats in sorted(self._routes.items())
+        }
+        bytes_in = sum(stats["bytes_in"] for stats in self._routes.values())
+        bytes_out = sum(stats["bytes_out"] for stats in self._routes.values())
+        return {
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "bytes_saved": bytes_in - bytes_out,
+            "routes": routes,
+        }
+
+
+class CompressionMiddleware:
+    """Compress responses the client accepts gzip/br for
+
+    minimum_size - bodies below this go out as-is (not worth the CPU or the framing overhead)
+    offload_size - single bodies (or stream chunks) from this size are compressed in a worker thread
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        offload_size: int = 64 * 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        stats: Optional[CompressionStats] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats if stats is not None else CompressionStats()
+        self.available = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope.get("headers") or [])
+        encoding = None
+        if scope.get("method") != "HEAD":  # HEAD must report the uncompressed Content-Length of GET
+            encoding = negotiate(request_headers.get(b"accept-encoding", b"").decode("latin-1"), self.available)
+        await _CompressedResponse(self, scope, encoding, send).run(receive)
+
+    async def _run(self, encoder: _Encoder, data: bytes, final: bool) -> bytes:
+        operation = encoder.finish if final else encoder.compress
+        if len(data) >= self.offload_size:
+            return await asyncio.to_thread(operation, data)
+        return operation(data)
+
+
+class _CompressedResponse:
+    """Per-request send wrapper - holds back http.response.start until the body size is known"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: Optional[str], send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send = send
+        self.start: Dict[str, Any] = {}
+        self.buffer: List[bytes] = []
+        self.buffered = 0
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    async def run(self, receive):
+        await self.middleware.app(self.scope, receive, self.wrapped_send)
+
+    def _route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def _record(self):
+        self.middleware.stats.record(
+            self._route(), self.encoder.encoding if self.encoder else None,
+            self.bytes_in, self.bytes_out, self.seconds
+        )
+
+    def _compressible(self, headers: Headers) -> bool:
+        if self.start["status"] in (204, 304) or self.start["status"] < 200:
+            return False
+        if _header(headers, b"content-encoding"):
+            return False
+        content_type = (_header(headers, b"content-type") or "").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _start_headers(self, compressed: bool) -> Headers:
+        headers = list(self.start["headers"])
+        vary = _header(headers, b"vary")
+        if not vary or "accept-encoding" not in vary.lower():
+            headers = _without(headers, b"vary")
+            headers.append((b"vary", (f"{vary}, Accept-Encoding" if vary else "Accept-Encoding").encode("latin-1")))
+        if compressed:
+            headers = _without(headers, b"content-length")
+            headers.append((b"content-encoding", self.encoder.encoding.encode("latin-1")))
+            headers = _weakened(headers)
+        return headers
+
+    async def _send_start(self, compressed: bool, content_length: Optional[int] = None):
+        headers = self._start_headers(compressed)
+        if content_length is not None:
+            headers = _without(headers, b"content-length")
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        await self.send({**self.start, "headers": headers})
+
+    async def _compress(self, data: bytes, final: bool) -> bytes:
+        started = time.perf_counter()
+        compressed = await self.middleware._run(self.encoder, data, final)
+        self.seconds += time.perf_counter() - started
+        return compressed
+
+    async def wrapped_send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            if message["status"] == 304 and self.encoding:
+                # The 200 this revalidates went out compressed with a weak ETag - the 304 must echo the same form
+                self.passthrough = True
+                await self.send({**message, "headers": _weakened(self._start_headers(False))})
+            elif not self._compressible(message["headers"]):
+                self.passthrough = True
+                await self.send(message)
+            elif not self.encoding:
+                # Not compressed for this client, but the representation still varies by Accept-Encoding
+                self.passthrough = True
+                await self._send_start(False)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        self.bytes_in += len(body)
+
+        if self.passthrough:
+            self.bytes_out += len(body)
+            await self.send(message)
+            if not more_body:
+                self._record()
+            return
+
+        if self.encoder is None:
+            # Still deciding - buffer until the threshold is crossed or the body ends
+            self.buffer.append(body)
+            self.buffered += len(body)
+            if self.buffered < self.middleware.minimum_size:
+                if more_body:
+                    return
+                data = b"".join(self.buffer)
+                await self._send_start(False, len(data))
+                self.bytes_out += len(data)
+                await self.send({"type": "http.response.body", "body": data})
+                self._record()
+                return
+            self.encoder = _Encoder(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            data = b"".join(self.buffer)
+            self.buffer = []
+            compressed = await self._compress(data, not more_body)
+            if more_body:
+                await self._send_start(True)
+            else:
+                await self._send_start(True, len(compressed))
+        else:
+            compressed = await self._compress(body, not more_body)
+
+        self.bytes_out += len(compressed)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+        if not more_body:
+            self._record()
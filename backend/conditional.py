@@ -0,0 +1,92 @@
+"""
+Conditional GET - ETag / Last-Modified validators and 304 checks
+Entity validators come from version + newest change time; list/stat validators from cheap per-collection change markers
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, NamedTuple, Optional
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class MarkerSource(NamedTuple):
+    """A collection whose document count + newest time_field value changes on every write"""
+    collection: Any
+    time_field: Optional[str] = "updated_at"  # None - count only
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Mongo returns naive UTC datetimes unless tz_aware is set"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def latest(*moments: Any) -> Optional[datetime]:
+    """Newest of the given datetimes - non-datetimes (missing fields) are ignored"""
+    found = [_as_utc(moment) for moment in moments if isinstance(moment, datetime)]
+    return max(found) if found else None
+
+
+def entity_etag(version: int, changed_at: Optional[datetime], selected: Optional[Iterable[str]] = None) -> str:
+    """Strong ETag v<version>.<ms hex>[.<fields hash>] - version alone feeds If-Match, the time covers writes
+    that do not bump it, the hash keeps each fields= projection its own representation
+    """
+    tag = f"v{version}"
+    if changed_at is not None:
+        millis = (changed_at - EPOCH) // timedelta(milliseconds=1)
+        tag += f".{millis:x}"
+    if selected:
+        tag += "." + hashlib.sha1(",".join(selected).encode()).hexdigest()[:8]
+    return f'"{tag}"'
+
+
+def http_date(moment: datetime) -> str:
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+
+def _tags(header: str) -> Iterable[str]:
+    for tag in header.split(","):
+        tag = tag.strip()
+        yield tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> bool:
+    """RFC 9110 precedence - If-Modified-Since only counts when If-None-Match is absent"""
+    if if_none_match:
+        current = etag[2:] if etag.startswith("W/") else etag
+        return any(tag == "*" or tag == current for tag in _tags(if_none_match))
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have second precision
+        return last_modified.replace(microsecond=0) <= _as_utc(since)
+    return False
+
+
+async def _marker_part(source: MarkerSource) -> str:
+    count = await source.collection.estimated_document_count()
+    if not source.time_field:
+        return f"{count}"
+    newest = await source.collection.find(
+        {source.time_field: {"$ne": None}}, {"_id": 0, source.time_field: 1}
+    ).sort(source.time_field, -1).limit(1).to_list(1)
+    return f"{count}:{newest[0][source.time_field].isoformat() if newest else '-'}"
+
+
+async def change_marker(sources: Iterable[MarkerSource], *parts: str) -> str:
+    """Weak ETag over collection markers plus request-specific parts (query string, date)
+
+    Every source costs a metadata count and one index-backed newest-document read.
+    """
+    markers = await asyncio.gather(*(_marker_part(source) for source in sources))
+    digest = hashlib.sha1("|".join([*markers, *parts]).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
@@ -0,0 +1,147 @@
+"""
+Customer Prefix Index - In-process autocomplete over phone digits and accent-folded names
+Sorted (token, id) keys searched with bisect; built at startup, kept current on customer writes
+"""
+
+import asyncio
+import logging
+import re
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from search_tokens import fold
+
+logger = logging.getLogger(__name__)
+
+MIN_PHONE_SUFFIX = 3  # Phone digits are indexed by every suffix this long so any fragment matches
+ENTRY_FIELDS = ("id", "name", "phone", "type")
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def customer_tokens(customer: Dict[str, Any]) -> Set[str]:
+    """Name words (folded) plus every phone-digit suffix"""
+    tokens = {word for word in _NON_ALNUM.split(fold(customer.get("name") or "")) if word}
+    digits = re.sub(r"\D", "", customer.get("phone") or "")
+    tokens.update(digits[start:] for start in range(0, max(len(digits) - MIN_PHONE_SUFFIX + 1, 0)))
+    return tokens
+
+
+class CustomerPrefixIndex:
+    """Autocomplete index - each process keeps its own copy and rebuilds it periodically"""
+
+    def __init__(self, collection, base_filter: Dict[str, Any], refresh_interval: float = 300.0):
+        self.collection = collection
+        self.base_filter = base_filter  # e.g. not soft-deleted
+        self.refresh_interval = refresh_interval
+        self._keys: List[Tuple[str, str]] = []
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._tokens: Dict[str, Set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Optional[List[Tuple[str, Any]]] = None  # Writes seen while a build is running
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def build(self):
+        """Rebuild from a projected cursor and swap it in at once
+
+        upsert/remove calls made while the cursor runs may be missing from the snapshot -
+        they are buffered and replayed on top of it after the swap
+        """
+        if self._pending is not None:
+            return  # A build is already running
+        self._pending = []
+        try:
+            entries, tokens, keys = {}, {}, []
+            projection = {"_id": 0, **{field: 1 for field in ENTRY_FIELDS}}
+            async for customer in self.collection.find(self.base_filter, projection):
+                entry = {field: customer.get(field) for field in ENTRY_FIELDS}
+                entries[entry["id"]] = entry
+                tokens[entry["id"]] = customer_tokens(entry)
+                keys.extend((token, entry["id"]) for token in tokens[entry["id"]])
+            keys.sort()
+            self._keys, self._entries, self._tokens = keys, entries, tokens
+        finally:
+            pending, self._pending = self._pending, None
+        for operation, value in pending:
+            if operation == "upsert":
+                self.upsert(value)
+            else:
+                self.remove(value)
+        logger.info(f"Customer prefix index built: {len(entries)} customers, {len(keys)} keys")
+
+    def upsert(self, customer: Dict[str, Any]):
+        """Add or refresh one customer after a create/update"""
+        if self._pending is not None:
+            self._pending.append(("upsert", dict(customer)))
+        self._remove(customer["id"])
+        entry = {field: customer.get(field) for field in ENTRY_FIELDS}
+        self._entries[entry["id"]] = entry
+        self._tokens[entry["id"]] = customer_tokens(entry)
+        for token in self._tokens[entry["id"]]:
+            insort(self._keys, (token, entry["id"]))
+
+    def remove(self, customer_id: str):
+        if self._pending is not None:
+            self._pending.append(("remove", customer_id))
+        self._remove(customer_id)
+
+    def _remove(self, customer_id: str):
+        for token in self._tokens.pop(customer_id, ()):
+            position = bisect_left(self._keys, (token, customer_id))
+            if position < len(self._keys) and self._keys[position] == (token, customer_id):
+                del self._keys[position]
+        self._entries.pop(customer_id, None)
+
+    def _prefix_ids(self, prefix: str) -> Iterator[str]:
+        """Ids with a token starting with prefix, in token order - lazy so search stops at limit"""
+        position = bisect_left(self._keys, (prefix, ""))
+        while position < len(self._keys) and self._keys[position][0].startswith(prefix):
+            yield self._keys[position][1]
+            position += 1
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Customers matching every term by token prefix, at most limit"""
+        terms = [term for term in _NON_ALNUM.split(fold(query)) if term]
+        if not terms:
+            return []
+
+        # Scan the most selective (longest) term, check the rest against each candidate's tokens
+        terms.sort(key=len, reverse=True)
+        first, rest = terms[0], terms[1:]
+        results, seen = [], set()
+        for customer_id in self._prefix_ids(first):
+            if customer_id in seen:
+                continue
+            seen.add(customer_id)
+            tokens = self._tokens.get(customer_id, ())
+            if all(any(token.startswith(term) for token in tokens) for term in rest):
+                results.append(self._entries[customer_id])
+                if len(results) >= limit:
+                    break
+        return results
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                # Picks up writes made by other server processes
+                await self.build()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error rebuilding customer prefix index: {e}")
+
+    async def start(self):
+        await self.build()
+        self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,412 @@
+"""
+Customer Summaries - Materialized per-customer transaction metrics
+One small read-model document per customer, updated incrementally per sale/DAO/card change and rebuildable with $merge
+"""
+
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from outbox import RetryLater
+from purge import NOT_DELETED
+
+logger = logging.getLogger(__name__)
+
+SALE_TYPE = "BILL_SALE"
+DEFAULT_DAO_TYPE = "CREDIT_DAO_POS"
+REBUILD_STATE_ID = "rebuild"
+REBUILD_LEASE_SECONDS = 600  # Events are held back while a rebuild runs - a crashed rebuild frees them after this
+REBUILD_RETRY_SECONDS = 5
+
+# Lifetime transaction value thresholds (VND), highest first
+TIER_THRESHOLDS = (
+    ("VIP", 50_000_000),
+    ("Premium", 20_000_000),
+    ("Regular", 5_000_000),
+)
+DEFAULT_TIER = "New"
+
+# Summary tier as the customer document's CustomerTier
+CUSTOMER_TIERS = {
+    "VIP": "PLATINUM",
+    "Premium": "GOLD",
+    "Regular": "SILVER",
+    DEFAULT_TIER: "BRONZE",
+}
+
+
+class RebuildInProgress(Exception):
+    """Another rebuild holds the lease"""
+
+
+def customer_tier(total_value: float) -> str:
+    for tier, threshold in TIER_THRESHOLDS:
+        if total_value >= threshold:
+            return tier
+    return DEFAULT_TIER
+
+
+def tier_expression(value: str) -> Dict[str, Any]:
+    """customer_tier() as an aggregation expression"""
+    return {"$switch": {
+        "branches": [{"case": {"$gte": [value, threshold]}, "then": tier} for tier, threshold in TIER_THRESHOLDS],
+        "default": DEFAULT_TIER
+    }}
+
+
+def month_key(moment: datetime) -> str:
+    """UTC calendar month - same bucketing as $dateToString in the rebuild"""
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y-%m")
+
+
+def as_date(value: str) -> Dict[str, Any]:
+    """Aggregation expression coercing a date or ISO string to a date - null when it does not parse"""
+    return {"$convert": {"input": value, "to": "date", "onError": None, "onNull": None}}
+
+
+def empty_summary(customer_id: str) -> Dict[str, Any]:
+    """Summary of a customer with no transactions yet"""
+    return {
+        "customer_id": customer_id,
+        "total_value": 0,
+        "total_profit": 0,
+        "total_transactions": 0,
+        "by_type": {},
+        "months": {},
+        "last_transaction_at": None,
+        "tier": DEFAULT_TIER,
+    }
+
+
+def customer_totals(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary as the customer document's total_* fields and tier
+
+    total_cards is left out until the customer's cards have been counted into the summary.
+    """
+    dao_buckets = [bucket for kind, bucket in summary["by_type"].items() if kind != SALE_TYPE]
+    totals = {
+        "tier": CUSTOMER_TIERS.get(summary["tier"], CUSTOMER_TIERS[DEFAULT_TIER]),
+        "total_transactions": summary["total_transactions"],
+        "total_spent": summary["total_value"],
+        "total_profit_generated": summary["total_profit"],
+        "total_dao_amount": sum(bucket["value"] for bucket in dao_buckets),
+        "total_dao_transactions": sum(bucket["count"] for bucket in dao_buckets),
+        "total_dao_profit": sum(bucket["profit"] for bucket in dao_buckets),
+    }
+    if "total_cards" in summary:
+        totals["total_cards"] = summary["total_cards"]
+    return totals
+
+
+def _rollup(rows: str, key: str) -> Dict[str, Any]:
+    """{key value: {count, value, profit}} from the grouped rows of one customer"""
+    def total(field: str) -> Dict[str, Any]:
+        return {"$sum": {"$map": {
+            "input": {"$filter": {"input": rows, "as": "row", "cond": {"$eq": [f"$$row.{key}", "$$bucket"]}}},
+            "as": "row",
+            "in": f"$$row.{field}"
+        }}}
+
+    return {"$arrayToObject": {"$map": {
+        # Rows without a bucket (undated transactions in the month rollup) count in the totals only
+        "input": {"$setDifference": [{"$setUnion": [f"{rows}.{key}"]}, [None]]},
+        "as": "bucket",
+        "in": {"k": "$$bucket", "v": {"count": total("count"), "value": total("value"), "profit": total("profit")}}
+    }}}
+
+
+class CustomerSummaries:
+    """customer_summaries read model - written by outbox handlers, read by customer endpoints
+
+    Every applied sale/DAO has a ledger entry keyed by its transaction id - redelivered events
+    and events for transactions a rebuild already counted find their entry and do nothing.
+    Card counts are recounted from credit_cards on every card change instead.
+    """
+
+    def __init__(self, db, collection_name: str = "customer_summaries"):
+        self.db = db
+        self.collection_name = collection_name
+        self.collection = db[collection_name]
+        self.ledger_name = f"{collection_name}_ledger"
+        self.ledger = db[self.ledger_name]
+        self.state = db[f"{collection_name}_state"]
+
+    async def ensure_indexes(self):
+        # Unique key backs the idempotent upsert and the $merge "on" field
+        await self.collection.create_index("customer_id", unique=True)
+        await self.ledger.create_index("customer_id")
+
+    async def _generation(self) -> int:
+        """Current rebuild generation - RetryLater while a rebuild runs"""
+        state = await self.state.find_one({"_id": REBUILD_STATE_ID}) or {}
+        locked_until = state.get("locked_until")
+        if locked_until:
+            if not locked_until.tzinfo:
+                locked_until = locked_until.replace(tzinfo=timezone.utc)
+            if locked_until > datetime.now(timezone.utc):
+                raise RetryLater(REBUILD_RETRY_SECONDS, "customer summaries are being rebuilt")
+        return state.get("generation", 0)
+
+    async def record(
+        self,
+        transaction_id: str,
+        customer_id: str,
+        transaction_type: str,
+        value: float,
+        profit: float,
+        created_at: datetime,
+        session=None,
+    ):
+        """Apply one sale/DAO - keyed by transaction id so redelivery is a no-op
+
+        Pass the session of outbox.transaction() so the ledger entry and the summary update
+        commit together; unsessioned, a crash between them leaves the sale uncounted until a rebuild.
+        """
+        generation = await self._generation()
+        entry = await self.ledger.update_one(
+            {"_id": transaction_id},
+            {"$setOnInsert": {
+                "customer_id": customer_id,
+                "type": transaction_type,
+                "value": value,
+                "profit": profit,
+                "created_at": created_at,
+                "applied_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+            session=session
+        )
+        if entry.upserted_id is None:
+            return  # Applied before, or counted by a rebuild
+
+        prefix = f"months.{month_key(created_at)}"
+        update = {
+            "$inc": {
+                "total_value": value,
+                "total_profit": profit,
+                "total_transactions": 1,
+                f"by_type.{transaction_type}.count": 1,
+                f"by_type.{transaction_type}.value": value,
+                f"by_type.{transaction_type}.profit": profit,
+                f"{prefix}.count": 1,
+                f"{prefix}.value": value,
+                f"{prefix}.profit": profit,
+            },
+            "$max": {"last_transaction_at": created_at},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        }
+        # A rebuild that started after the generation was read has counted this transaction already
+        query = {"customer_id": customer_id, "generation": {"$not": {"$gt": generation}}}
+
+        try:
+            summary = await self.collection.find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.AFTER, session=session
+            )
+        except DuplicateKeyError:
+            # Either a newer rebuild wrote the document, or a concurrent first write created it
+            summary = await self.collection.find_one_and_update(
+                query, update, return_document=ReturnDocument.AFTER, session=session
+            )
+        if not summary:
+            return
+
+        tier = customer_tier(summary.get("total_value") or 0)
+        if summary.get("tier") != tier:
+            await self.collection.update_one({"customer_id": customer_id}, {"$set": {"tier": tier}}, session=session)
+
+    async def record_cards(self, customer_id: str):
+        """Recount a customer's live cards - a recount, so redelivered and reordered events are harmless"""
+        generation = await self._generation()
+        counted_at = datetime.now(timezone.utc)
+        total_cards = await self.db.credit_cards.count_documents({"customer_id": customer_id, **NOT_DELETED})
+
+        # A recount that read the cards earlier must not overwrite a later one
+        query = {
+            "customer_id": customer_id,
+            "generation": {"$not": {"$gt": generation}},
+            "cards_counted_at": {"$not": {"$gt": counted_at}},
+        }
+        update = {"$set": {"total_cards": total_cards, "cards_counted_at": counted_at, "updated_at": counted_at}}
+        try:
+            await self.collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # A later recount or a rebuild wrote the document first
+            pass
+
+    async def get(self, customer_id: str) -> Dict[str, Any]:
+        return (await self.get_many([customer_id]))[customer_id]
+
+    async def get_many(self, customer_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Summaries by customer id - customers without transactions get an empty one"""
+        customer_ids = list(customer_ids)
+        stored = await self._stored(customer_ids)
+        return {customer_id: stored.get(customer_id) or empty_summary(customer_id) for customer_id in customer_ids}
+
+    async def _stored(self, customer_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Summary documents that exist, missing fields filled from empty_summary"""
+        return {
+            summary["customer_id"]: {**empty_summary(summary["customer_id"]), **summary}
+            async for summary in self.collection.find({"customer_id": {"$in": customer_ids}}, {"_id": 0})
+        }
+
+    async def overlay(self, customers: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Replace customer total_* fields with summary values in place - returns the summaries by id
+
+        Customers without a summary document keep their stored totals - the read model may not
+        have been built yet, and zeros would be worse than the last stored figures.
+        """
+        customers = [customer for customer in customers if customer]
+        customer_ids = [customer["id"] for customer in customers]
+        stored = await self._stored(customer_ids)
+        for customer in customers:
+            if customer["id"] in stored:
+                customer.update(customer_totals(stored[customer["id"]]))
+        return {customer_id: stored.get(customer_id) or empty_summary(customer_id) for customer_id in customer_ids}
+
+    async def is_empty(self) -> bool:
+        return await self.collection.count_documents({}, limit=1) == 0
+
+    async def _lock(self) -> int:
+        """Take the rebuild lease - returns the new generation"""
+        now = datetime.now(timezone.utc)
+        try:
+            state = await self.state.find_one_and_update(
+                {"_id": REBUILD_STATE_ID, "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}]},
+                {
+                    "$set": {"locked_until": now + timedelta(seconds=REBUILD_LEASE_SECONDS)},
+                    "$inc": {"generation": 1}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise RebuildInProgress()
+        return state["generation"]
+
+    async def _unlock(self, generation: int):
+        await self.state.update_one(
+            {"_id": REBUILD_STATE_ID, "generation": generation}, {"$set": {"locked_until": None}}
+        )
+
+    async def rebuild(self, customer_id: Optional[str] = None) -> int:
+        """Recompute summaries from sales + DAO transactions and live cards and $merge them in
+
+        Holds a lease for the duration - sale/DAO events are deferred meanwhile. The ledger is
+        refreshed from the sources first and the summaries are computed from it, so every event
+        still in the outbox for a counted transaction finds its ledger entry and is skipped.
+        Events already being handled when the lease was taken either land before the $merge
+        (and are overwritten by it) or are turned away by the generation check.
+        Transactions whose created_at is not a date (legacy string rows that do not parse) count
+        in the totals but in no month.
+        Returns the number of summaries left over from customers with no transactions or cards (deleted).
+        Raises RebuildInProgress when another rebuild holds the lease.
+        """
+        generation = await self._lock()
+        try:
+            started = datetime.now(timezone.utc)
+            scope = {"customer_id": customer_id} if customer_id else {"customer_id": {"$ne": None}}
+            match = {"$match": scope}
+
+            # Ledger entry per transaction, stamped with this generation
+            await self.db.sales.aggregate([
+                match,
+                {"$project": {
+                    "_id": "$id", "customer_id": 1, "created_at": as_date("$created_at"),
+                    "type": {"$literal": SALE_TYPE},
+                    "value": {"$ifNull": ["$total", 0]},
+                    "profit": {"$ifNull": ["$profit_value", 0]},
+                    "generation": {"$literal": generation},
+                }},
+                {"$unionWith": {"coll": "dao_transactions", "pipeline": [
+                    match,
+                    {"$project": {
+                        "_id": "$id", "customer_id": 1, "created_at": as_date("$created_at"),
+                        "type": {"$ifNull": ["$transaction_type", DEFAULT_DAO_TYPE]},
+                        "value": {"$ifNull": ["$amount", 0]},
+                        "profit": {"$ifNull": ["$profit_value", 0]},
+                        "generation": {"$literal": generation},
+                    }}
+                ]}},
+                {"$merge": {"into": self.ledger_name, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+            ]).to_list(None)
+            # Entries of transactions that no longer exist
+            await self.ledger.delete_many({**scope, "generation": {"$ne": generation}})
+
+            pipeline = [
+                {"$match": {**scope, "generation": generation}},
+                # One row per (customer, month, type) - per-customer arrays stay small
+                {"$group": {
+                    "_id": {
+                        "customer_id": "$customer_id",
+                        "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at", "onNull": None}},
+                        "type": "$type",
+                    },
+                    "count": {"$sum": 1},
+                    "value": {"$sum": "$value"},
+                    "profit": {"$sum": "$profit"},
+                    "last_transaction_at": {"$max": "$created_at"},
+                }},
+                {"$group": {
+                    "_id": "$_id.customer_id",
+                    "rows": {"$push": {
+                        "month": "$_id.month", "type": "$_id.type",
+                        "count": "$count", "value": "$value", "profit": "$profit",
+                    }},
+                    "total_value": {"$sum": "$value"},
+                    "total_profit": {"$sum": "$profit"},
+                    "total_transactions": {"$sum": "$count"},
+                    "last_transaction_at": {"$max": "$last_transaction_at"},
+                }},
+                # Live card count per customer, joined to the transaction rollup
+                {"$unionWith": {"coll": "credit_cards", "pipeline": [
+                    {"$match": {**scope, **NOT_DELETED}},
+                    {"$group": {"_id": "$customer_id", "total_cards": {"$sum": 1}}},
+                ]}},
+                {"$group": {
+                    "_id": "$_id",
+                    "rows": {"$max": "$rows"},
+                    "total_value": {"$sum": "$total_value"},
+                    "total_profit": {"$sum": "$total_profit"},
+                    "total_transactions": {"$sum": "$total_transactions"},
+                    "last_transaction_at": {"$max": "$last_transaction_at"},
+                    "total_cards": {"$sum": "$total_cards"},
+                }},
+                {"$set": {"rows": {"$ifNull": ["$rows", []]}}},
+                {"$project": {
+                    "_id": 0,
+                    "customer_id": "$_id",
+                    "total_value": 1,
+                    "total_profit": 1,
+                    "total_transactions": 1,
+                    "last_transaction_at": 1,
+                    "total_cards": 1,
+                    "cards_counted_at": {"$literal": started},
+                    "by_type": _rollup("$rows", "type"),
+                    "months": _rollup("$rows", "month"),
+                    "tier": tier_expression("$total_value"),
+                    "generation": {"$literal": generation},
+                    "updated_at": {"$literal": started},
+                }},
+                {"$merge": {
+                    "into": self.collection_name,
+                    "on": "customer_id",
+                    "whenMatched": "merge",
+                    "whenNotMatched": "insert",
+                }},
+            ]
+            await self.ledger.aggregate(pipeline).to_list(None)
+
+            # Summaries not touched by this rebuild belong to customers without transactions or cards
+            stale = {"updated_at": {"$lt": started}}
+            if customer_id:
+                stale["customer_id"] = customer_id
+            result = await self.collection.delete_many(stale)
+        finally:
+            await self._unlock(generation)
+        logger.info(f"Customer summaries rebuilt{f' for {customer_id}' if customer_id else ''}")
+        return result.deleted_count
@@ -0,0 +1,124 @@
+"""
+Delta Sync - changes?since=<token> feeds for client-side caches
+Changed ids come from (updated_at, id) keyset scans over one or more sources; hard deletes leave tombstones
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+TOMBSTONE_RETENTION_SECONDS = 30 * 24 * 60 * 60  # Older tokens get reset=true and must reload in full
+SETTLE_SECONDS = 2.0  # Writes this recent are left for the next poll - in-flight writes may carry earlier timestamps
+
+Watermark = Tuple[datetime, str]
+
+
+class InvalidSyncToken(ValueError):
+    """Sync token that does not decode"""
+
+
+class ChangeSource(NamedTuple):
+    """A collection whose (time_field, id_field) keyset yields changed ids"""
+    collection: Any
+    query: Dict[str, Any]
+    time_field: str = "updated_at"
+    id_field: str = "id"
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Mongo returns naive UTC datetimes unless tz_aware is set"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def encode_sync_token(watermarks: Dict[str, Watermark]) -> str:
+    payload = {name: [_as_utc(moment).isoformat(), last_id] for name, (moment, last_id) in watermarks.items()}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_sync_token(token: Optional[str]) -> Dict[str, Watermark]:
+    """Watermarks per source - an absent token means from the beginning"""
+    if not token:
+        return {}
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return {name: (datetime.fromisoformat(moment), str(last_id)) for name, (moment, last_id) in payload.items()}
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise InvalidSyncToken("Invalid sync token")
+
+
+def token_expired(watermarks: Dict[str, Watermark]) -> bool:
+    """Tombstones behind the oldest watermark may be gone - the client has to reload in full"""
+    if not watermarks:
+        return False
+    oldest = min(_as_utc(moment) for moment, _ in watermarks.values())
+    return oldest < datetime.now(timezone.utc) - timedelta(seconds=TOMBSTONE_RETENTION_SECONDS)
+
+
+async def collect_changes(
+    sources: Dict[str, ChangeSource],
+    watermarks: Dict[str, Watermark],
+    limit: int,
+) -> Tuple[List[str], Dict[str, Watermark], bool]:
+    """Ids changed after each source's watermark, oldest first
+
+    Returns (ids, advanced watermarks, has_more). Each source contributes at most limit ids per call.
+    """
+    settled = datetime.now(timezone.utc) - timedelta(seconds=SETTLE_SECONDS)
+    ids: List[str] = []
+    advanced = dict(watermarks)
+    has_more = False
+
+    for name, source in sources.items():
+        window: Dict[str, Any] = {source.time_field: {"$lte": settled}}
+        if name in watermarks:
+            moment, last_id = watermarks[name]
+            window = {"$and": [window, {"$or": [
+                {source.time_field: {"$gt": moment}},
+                {source.time_field: moment, source.id_field: {"$gt": last_id}},
+            ]}]}
+        else:
+            window[source.time_field]["$ne"] = None
+
+        rows = await source.collection.find(
+            {**source.query, **window}, {"_id": 0, source.time_field: 1, source.id_field: 1}
+        ).sort([(source.time_field, 1), (source.id_field, 1)]).limit(limit + 1).to_list(limit + 1)
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            has_more = True
+            advanced[name] = (rows[-1][source.time_field], rows[-1][source.id_field])
+        else:
+            # Source drained up to the settle point - idle sources still move forward
+            advanced[name] = (settled, "")
+        ids.extend(row[source.id_field] for row in rows)
+
+    return list(dict.fromkeys(ids)), advanced, has_more
+
+
+class Tombstones:
+    """Deleted ids per collection, kept long enough for clients to sync the deletion"""
+
+    def __init__(self, collection, tracked: Iterable[str]):
+        self.collection = collection
+        self.tracked = set(tracked)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("collection", 1), ("deleted_at", 1), ("id", 1)])
+        await self.collection.create_index("deleted_at", expireAfterSeconds=TOMBSTONE_RETENTION_SECONDS)
+
+    async def record(self, collection: str, ids: Iterable[str], session=None):
+        """Tombstone hard-deleted documents - untracked collections are ignored"""
+        ids = [doc_id for doc_id in ids if doc_id]
+        if collection not in self.tracked or not ids:
+            return
+        now = datetime.now(timezone.utc)
+        await self.collection.insert_many(
+            [{"collection": collection, "id": doc_id, "deleted_at": now} for doc_id in ids],
+            session=session
+        )
+
+    def source(self, collection: str) -> ChangeSource:
+        """Change source yielding a collection's deleted ids"""
+        return ChangeSource(self.collection, {"collection": collection}, time_field="deleted_at")
@@ -0,0 +1,160 @@
+"""
+Idempotency Utilities - Replay-safe handling for money-moving POST endpoints
+First response per Idempotency-Key is stored and replayed for client retries
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60  # Keep stored responses for 24h
+IDEMPOTENCY_LEASE_SECONDS = 60  # In-progress records older than this can be taken over
+IDEMPOTENCY_WAIT_SECONDS = 30  # How long a duplicate waits for the first request
+IDEMPOTENCY_POLL_SECONDS = 0.1
+MAX_KEY_LENGTH = 255
+
+STATUS_IN_PROGRESS = "IN_PROGRESS"
+STATUS_COMPLETED = "COMPLETED"
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a request payload - detects key reuse with a different body"""
+    canonical = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Idempotency records backed by a MongoDB collection with a TTL index"""
+
+    def __init__(self, collection, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        # Futures for keys executing in this process - local duplicates wait on them
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def ensure_indexes(self):
+        """TTL index so stored responses expire on their own"""
+        await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    async def execute(
+        self,
+        key: Optional[str],
+        scope: str,
+        payload: Any,
+        handler: Callable[[], Awaitable[Any]],
+    ):
+        """Run handler once per (scope, key); replay the stored response for duplicates"""
+        if not key:
+            return await handler()
+
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} too long")
+
+        record_id = f"{scope}:{key}"
+        fingerprint = request_fingerprint(payload)
+
+        # Same-process duplicate: wait for the first request instead of polling
+        inflight = self._inflight.get(record_id)
+        if inflight:
+            await asyncio.shield(inflight)
+
+        while not await self._acquire(record_id, scope, key, fingerprint):
+            record = await self._wait_for_completion(record_id)
+            if record:
+                return self._replay(record, fingerprint)
+            # First request failed and released the key - run this one instead
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[record_id] = future
+        try:
+            result = await handler()
+            body = jsonable_encoder(result)
+            await self.collection.update_one(
+                {"_id": record_id},
+                {"$set": {
+                    "status": STATUS_COMPLETED,
+                    "status_code": 200,
+                    "response_body": body,
+                    "completed_at": datetime.now(timezone.utc)
+                }}
+            )
+            return JSONResponse(content=body, status_code=200)
+        except BaseException:
+            # Failed requests are not stored - release the key so a retry can re-execute
+            await self.collection.delete_one({"_id": record_id, "status": STATUS_IN_PROGRESS})
+            raise
+        finally:
+            self._inflight.pop(record_id, None)
+            future.set_result(None)
+
+    async def _acquire(self, record_id: str, scope: str, key: str, fingerprint: str) -> bool:
+        """Claim the key - True if this request should execute the handler"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                "_id": record_id,
+                "scope": scope,
+                "key": key,
+                "fingerprint": fingerprint,
+                "status": STATUS_IN_PROGRESS,
+                "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                "created_at": now
+            })
+            return True
+        except DuplicateKeyError:
+            pass
+
+        # Take over records abandoned by a crashed worker
+        taken = await self.collection.find_one_and_update(
+            {
+                "_id": record_id,
+                "status": STATUS_IN_PROGRESS,
+                "fingerprint": fingerprint,
+                "locked_until": {"$lt": now}
+            },
+            {"$set": {"locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}}
+        )
+        if taken:
+            logger.warning(f"Taking over abandoned idempotency record {record_id}")
+            return True
+        return False
+
+    async def _wait_for_completion(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Poll the stored record until the first request finishes"""
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = await self.collection.find_one({"_id": record_id})
+            if not record or record.get("status") == STATUS_COMPLETED:
+                return record
+            if asyncio.get_running_loop().time() >= deadline:
+                return record
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+    def _replay(self, record: Dict[str, Any], fingerprint: str) -> JSONResponse:
+        """Return the stored response or explain why it cannot be replayed"""
+        if record.get("fingerprint") != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail=f"{IDEMPOTENCY_HEADER} was already used with a different request body"
+            )
+        if record.get("status") != STATUS_COMPLETED:
+            raise HTTPException(
+                status_code=409,
+                detail=f"A request with this {IDEMPOTENCY_HEADER} is still being processed"
+            )
+        return JSONResponse(
+            content=record["response_body"],
+            status_code=record.get("status_code", 200),
+            headers={"Idempotent-Replayed": "true"}
+        )
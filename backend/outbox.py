@@ -0,0 +1,265 @@
+"""
+Transactional Outbox - Side effects applied off the request path
+Write paths record event documents; a background processor delivers them to handlers in batches
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from uuid_utils import generate_uuid
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "PENDING"
+STATUS_PROCESSING = "PROCESSING"
+STATUS_DONE = "DONE"
+STATUS_FAILED = "FAILED"
+
+DONE_RETENTION_SECONDS = 7 * 24 * 60 * 60  # Delivered events are kept a week for debugging
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class RetryLater(Exception):
+    """Raised by a handler that cannot apply the event yet - rescheduled without using up an attempt"""
+
+    def __init__(self, delay: float, reason: str = ""):
+        super().__init__(reason or f"retry in {delay}s")
+        self.delay = delay
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Mongo returns naive UTC datetimes unless tz_aware is set"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class Outbox:
+    """Event outbox with at-least-once delivery - handlers must be idempotent"""
+
+    def __init__(
+        self,
+        client,
+        collection,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        lease_seconds: int = 60,
+        max_attempts: int = 10,
+    ):
+        self.client = client
+        self.collection = collection
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.supports_transactions = False
+        self._handlers: Dict[str, List[EventHandler]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stats = {
+            "processed_total": 0,
+            "failed_attempts_total": 0,
+            "deferred_total": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": 0.0,
+            "last_batch_at": None,
+        }
+
+    def handler(self, event_type: str):
+        """Decorator registering an idempotent handler for an event type"""
+        def register(fn: EventHandler) -> EventHandler:
+            self._handlers.setdefault(event_type, []).append(fn)
+            return fn
+        return register
+
+    async def ensure_indexes(self):
+        """Indexes for claiming due events and expiring delivered ones"""
+        await self.collection.create_index([("status", 1), ("available_at", 1)])
+        await self.collection.create_index("processed_at", expireAfterSeconds=DONE_RETENTION_SECONDS)
+
+    async def detect_transactions(self):
+        """Multi-document transactions need a replica set or sharded cluster"""
+        try:
+            hello = await self.client.admin.command("hello")
+            self.supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logger.warning(f"Could not detect transaction support: {e}")
+            self.supports_transactions = False
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Session for writing a primary document and its events atomically
+
+        Yields None on standalone servers - writes then run unsessioned, in order.
+        """
+        if not self.supports_transactions:
+            yield None
+            return
+        async with await self.client.start_session() as session:
+            async with session.start_transaction():
+                yield session
+
+    async def record(self, event_type: str, payload: Dict[str, Any], session=None) -> str:
+        """Record an event alongside the write that produced it"""
+        now = datetime.now(timezone.utc)
+        event_id = generate_uuid()
+        await self.collection.insert_one({
+            "_id": event_id,
+            "type": event_type,
+            "payload": payload,
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now
+        }, session=session)
+        self._wakeup.set()
+        return event_id
+
+    async def process_batch(self) -> int:
+        """Claim and deliver one batch of due events - returns events claimed"""
+        started = datetime.now(timezone.utc)
+        due = {
+            "$or": [
+                {"status": STATUS_PENDING, "available_at": {"$lte": started}},
+                # Lease expired - the worker that claimed it died mid-batch
+                {"status": STATUS_PROCESSING, "locked_until": {"$lt": started}}
+            ]
+        }
+        candidates = await self.collection.find(due, {"_id": 1}).sort(
+            "created_at", 1
+        ).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return 0
+
+        claim_id = generate_uuid()
+        await self.collection.update_many(
+            {"_id": {"$in": [event["_id"] for event in candidates]}, **due},
+            {
+                "$set": {
+                    "status": STATUS_PROCESSING,
+                    "claim_id": claim_id,
+                    "locked_until": started + timedelta(seconds=self.lease_seconds)
+                },
+                "$inc": {"attempts": 1}
+            }
+        )
+        events = await self.collection.find({"claim_id": claim_id}).sort("created_at", 1).to_list(None)
+
+        delivered = []
+        for event in events:
+            try:
+                for handle in self._handlers.get(event["type"], []):
+                    await handle(event)
+                delivered.append(event["_id"])
+            except RetryLater as e:
+                await self._defer(event, e.delay)
+            except Exception as e:
+                await self._record_failure(event, e)
+
+        if delivered:
+            await self.collection.update_many(
+                {"_id": {"$in": delivered}, "claim_id": claim_id},
+                {
+                    "$set": {"status": STATUS_DONE, "processed_at": datetime.now(timezone.utc)},
+                    "$unset": {"locked_until": "", "claim_id": ""}
+                }
+            )
+
+        self._stats["processed_total"] += len(delivered)
+        self._stats["last_batch_size"] = len(events)
+        self._stats["last_batch_ms"] = round((datetime.now(timezone.utc) - started).total_seconds() * 1000, 2)
+        self._stats["last_batch_at"] = started
+        return len(events)
+
+    async def _defer(self, event: Dict[str, Any], delay: float):
+        """Back to PENDING after delay - the claim's attempt is given back"""
+        self._stats["deferred_total"] += 1
+        await self.collection.update_one(
+            {"_id": event["_id"], "claim_id": event.get("claim_id")},
+            {
+                "$set": {"status": STATUS_PENDING, "available_at": datetime.now(timezone.utc) + timedelta(seconds=delay)},
+                "$inc": {"attempts": -1},
+                "$unset": {"locked_until": "", "claim_id": ""}
+            }
+        )
+
+    async def _record_failure(self, event: Dict[str, Any], error: Exception):
+        """Reschedule with exponential backoff, or park as FAILED after max_attempts"""
+        self._stats["failed_attempts_total"] += 1
+        attempts = event.get("attempts", 1)
+        logger.error(f"Outbox event {event['_id']} ({event['type']}) failed attempt {attempts}: {error}")
+
+        if attempts >= self.max_attempts:
+            update = {"status": STATUS_FAILED}
+        else:
+            backoff = min(2 ** attempts, 300)
+            update = {
+                "status": STATUS_PENDING,
+                "available_at": datetime.now(timezone.utc) + timedelta(seconds=backoff)
+            }
+        await self.collection.update_one(
+            {"_id": event["_id"], "claim_id": event.get("claim_id")},
+            {"$set": {**update, "last_error": str(error)}, "$unset": {"locked_until": "", "claim_id": ""}}
+        )
+
+    async def metrics(self) -> Dict[str, Any]:
+        """Backlog size and delivery lag"""
+        now = datetime.now(timezone.utc)
+        pending = await self.collection.count_documents({"status": STATUS_PENDING})
+        processing = await self.collection.count_documents({"status": STATUS_PROCESSING})
+        failed = await self.collection.count_documents({"status": STATUS_FAILED})
+        oldest = await self.collection.find_one(
+            {"status": {"$in": [STATUS_PENDING, STATUS_PROCESSING]}},
+            {"created_at": 1},
+            sort=[("created_at", 1)]
+        )
+        lag_seconds = (now - _as_utc(oldest["created_at"])).total_seconds() if oldest else 0.0
+
+        return {
+            "pending": pending,
+            "processing": processing,
+            "failed": failed,
+            "lag_seconds": round(lag_seconds, 3),
+            "transactions": self.supports_transactions,
+            "worker_running": bool(self._task and not self._task.done()),
+            **self._stats
+        }
+
+    async def _process_forever(self):
+        while True:
+            try:
+                # Drain the backlog before waiting
+                while await self.process_batch() >= self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error processing outbox: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def start(self):
+        """Detect transaction support and start the background processor"""
+        await self.detect_transactions()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._process_forever())
+
+    async def stop(self):
+        """Stop the background processor and deliver whatever is due"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            while await self.process_batch():
+                pass
+        except Exception as e:
+            logger.error(f"Error draining outbox on shutdown: {e}")
@@ -0,0 +1,97 @@
+"""
+Keyset Pagination - Opaque cursors over (sort key, id)
+Each page is one index range scan from the previous page's last key, so page cost does not grow with depth
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    """Cursor was not produced by encode_cursor (or belongs to another sort key)"""
+
+
+def keyset_sort(sort_field: str) -> List[Tuple[str, int]]:
+    """Newest first with id as tiebreaker - must match a compound index (sort_field, id)"""
+    return [(sort_field, -1), ("id", -1)]
+
+
+def encode_cursor(document: Dict[str, Any], sort_field: str) -> str:
+    """Opaque cursor pointing just past this document"""
+    value = document.get(sort_field)
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    raw = json.dumps({"f": sort_field, "v": value, "id": document["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str) -> Tuple[Any, str]:
+    """(sort value, id) of the last document of the previous page"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = data["v"]
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+        last_id = data["id"]
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if data.get("f") != sort_field or not isinstance(last_id, str):
+        raise InvalidCursor("Cursor does not belong to this listing")
+    return value, last_id
+
+
+def keyset_filter(sort_field: str, value: Any, last_id: str) -> Dict[str, Any]:
+    """Documents strictly after (value, last_id) in keyset_sort order - nulls sort last"""
+    if value is None:
+        return {sort_field: None, "id": {"$lt": last_id}}
+    return {"$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "id": {"$lt": last_id}},
+        {sort_field: None}
+    ]}
+
+
+def find_page(
+    collection,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    sort_field: str = "created_at",
+    projection: Optional[Dict[str, Any]] = None,
+):
+    """Unread Motor cursor over one page - for callers that iterate instead of to_list
+
+    With a cursor, skip is ignored; without one, skip/limit behave as before.
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_field)
+        query = {"$and": [query, keyset_filter(sort_field, value, last_id)]}
+        skip = 0
+    return collection.find(query, projection).sort(keyset_sort(sort_field)).skip(skip).limit(limit)
+
+
+async def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    sort_field: str = "created_at",
+    projection: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page plus the cursor for the next one (None on the last page)"""
+    # One extra document tells us whether another page exists
+    documents = await find_page(
+        collection, query, limit + 1, cursor=cursor, skip=skip, sort_field=sort_field, projection=projection
+    ).to_list(limit + 1)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+    return documents, next_cursor
@@ -0,0 +1,67 @@
+"""
+Field Projection - fields= parameter for list and detail endpoints
+Requested fields and named presets become a Mongo projection; projected responses skip full model validation
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+# Always returned so rows stay addressable
+ALWAYS_INCLUDED = ("id",)
+
+# Named presets per resource - what the table views actually display
+FIELD_PRESETS: Dict[str, Dict[str, List[str]]] = {
+    "customers": {
+        "summary": ["name", "phone", "type", "tier", "is_active", "total_transactions", "total_spent", "created_at"],
+    },
+    "bills": {
+        "summary": ["customer_code", "customer_name", "amount", "cycle", "provider_region", "status", "is_in_inventory", "created_at"],
+    },
+    "credit_cards": {
+        # No card_number / ccv - tables show the last 4 only
+        "summary": ["customer_id", "customer_name", "bank_name", "card_type", "card_last4", "credit_limit",
+                    "available_credit", "status", "next_due_date", "days_until_due", "created_at"],
+    },
+    "sales": {
+        "summary": ["customer_id", "bill_ids", "total", "profit_value", "status", "created_at"],
+    },
+    "dao_transactions": {
+        "summary": ["transaction_id", "customer_id", "bank_name", "amount", "profit_value", "transaction_type", "status", "created_at"],
+    },
+}
+
+
+class InvalidFields(ValueError):
+    """fields= names something the resource does not expose"""
+
+
+def parse_fields(fields: Optional[str], resource: str, allowed: Iterable[str]) -> Optional[List[str]]:
+    """Field list from 'a,b,summary' - None means the full document"""
+    if not fields:
+        return None
+    allowed = set(allowed)
+    presets = FIELD_PRESETS.get(resource, {})
+
+    selected: List[str] = list(ALWAYS_INCLUDED)
+    for name in (part.strip() for part in fields.split(",")):
+        if not name:
+            continue
+        if name in presets:
+            expanded = presets[name]
+        elif name in allowed:
+            expanded = [name]
+        else:
+            raise InvalidFields(
+                f"Unknown field '{name}' for {resource} - allowed: {', '.join(sorted(allowed | set(presets)))}"
+            )
+        selected.extend(field for field in expanded if field not in selected)
+    return selected
+
+
+def mongo_projection(selected: List[str], extra: Iterable[str] = ()) -> Dict[str, Any]:
+    """Inclusion projection - extra fields are fetched for server use (e.g. cursor keys) but not returned"""
+    return {"_id": 0, **{field: 1 for field in [*selected, *extra]}}
+
+
+def project(document: Dict[str, Any], selected: List[str]) -> Dict[str, Any]:
+    """Keep only selected fields - drops server-side extras and overlaid values"""
+    return {field: document[field] for field in selected if field in document}
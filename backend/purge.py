@@ -0,0 +1,181 @@
+"""
+Customer Purge - Background cascade deletion for soft-deleted customers
+Related documents are removed in throttled batches; job progress is persisted so purges resume after restarts
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from uuid_utils import generate_uuid
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "PENDING"
+STATUS_RUNNING = "RUNNING"
+STATUS_DONE = "DONE"
+
+# Soft-deleted documents carry deleted_at; every customer read filters on this
+NOT_DELETED = {"deleted_at": None}
+
+
+class CustomerPurger:
+    """Purge jobs for tombstoned customers, run by a background worker"""
+
+    def __init__(
+        self,
+        db,
+        collections: List[str],
+        batch_size: int = 500,
+        pause_seconds: float = 0.2,
+        poll_interval: float = 5.0,
+        lease_seconds: int = 120,
+        tombstones=None,
+        hidden: Iterable[str] = (),
+    ):
+        self.db = db
+        self.jobs = db.purge_jobs
+        self.collections = collections  # Collections holding documents keyed by customer_id
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.tombstones = tombstones  # Records deleted ids for delta-sync clients
+        self.hidden = list(hidden)  # Listed collections - marked deleted_at at enqueue, before the purge reaches them
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._current_job_id: Optional[str] = None
+
+    async def ensure_indexes(self):
+        await self.jobs.create_index([("status", 1), ("created_at", 1)])
+        await self.jobs.create_index("customer_id")
+
+    async def hide_related(self, customer_id: str):
+        """Mark the customer's documents in listed collections deleted - list views filter on NOT_DELETED"""
+        now = datetime.now(timezone.utc)
+        for collection in self.hidden:
+            await self.db[collection].update_many(
+                {"customer_id": customer_id, **NOT_DELETED},
+                {"$set": {"deleted_at": now, "updated_at": now}, "$inc": {"version": 1}}
+            )
+
+    async def enqueue(self, customer_id: str) -> Dict[str, Any]:
+        """Hide related documents and queue a purge for a tombstoned customer"""
+        await self.hide_related(customer_id)
+        job = {
+            "id": generate_uuid(),
+            "customer_id": customer_id,
+            "status": STATUS_PENDING,
+            "progress": {collection: 0 for collection in self.collections},
+            "created_at": datetime.now(timezone.utc)
+        }
+        await self.jobs.insert_one(job)
+        job.pop("_id", None)
+        self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.jobs.find_one({"id": job_id}, {"_id": 0})
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Next pending job, or a running one whose worker stopped renewing its lease"""
+        now = datetime.now(timezone.utc)
+        return await self.jobs.find_one_and_update(
+            {"$or": [
+                {"status": STATUS_PENDING},
+                {"status": STATUS_RUNNING, "locked_until": {"$lt": now}}
+            ]},
+            {"$set": {
+                "status": STATUS_RUNNING,
+                "started_at": now,
+                "locked_until": now + timedelta(seconds=self.lease_seconds)
+            }},
+            sort=[("created_at", 1)],
+            projection={"_id": 0}
+        )
+
+    async def run_job(self, job: Dict[str, Any]):
+        """Delete related documents batch by batch, then the customer tombstone itself
+
+        A final sweep over every collection catches documents written after the first pass got past
+        them (in-flight requests, outbox handlers that checked the customer just before the tombstone).
+        """
+        customer_id = job["customer_id"]
+
+        for collection in self.collections * 2:  # Second pass is the final sweep
+            while True:
+                batch = await self.db[collection].find(
+                    {"customer_id": customer_id}, {"_id": 1, "id": 1}
+                ).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+
+                result = await self.db[collection].delete_many(
+                    {"_id": {"$in": [doc["_id"] for doc in batch]}}
+                )
+                if self.tombstones:
+                    await self.tombstones.record(collection, [doc.get("id") for doc in batch])
+                # Progress + lease renewal in one write
+                await self.jobs.update_one(
+                    {"id": job["id"]},
+                    {
+                        "$inc": {f"progress.{collection}": result.deleted_count},
+                        "$set": {"locked_until": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}
+                    }
+                )
+                # Throttle so a large purge does not starve foreground traffic
+                await asyncio.sleep(self.pause_seconds)
+
+        result = await self.db.customers.delete_one({"id": customer_id, "deleted_at": {"$ne": None}})
+        if self.tombstones and result.deleted_count:
+            await self.tombstones.record("customers", [customer_id])
+        await self.jobs.update_one(
+            {"id": job["id"]},
+            {
+                "$set": {"status": STATUS_DONE, "finished_at": datetime.now(timezone.utc)},
+                "$unset": {"locked_until": ""}
+            }
+        )
+        logger.info(f"Purged customer {customer_id} (job {job['id']})")
+
+    async def _purge_forever(self):
+        while True:
+            try:
+                job = await self._claim()
+                if job:
+                    self._current_job_id = job["id"]
+                    await self.run_job(job)
+                    self._current_job_id = None
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Job keeps its lease and is retried once it expires
+                logger.error(f"Error purging customer data: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._purge_forever())
+
+    async def stop(self):
+        """Stop the worker - an interrupted job resumes on the next start"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._current_job_id:
+            # Hand the interrupted job straight back instead of waiting out its lease
+            await self.jobs.update_one(
+                {"id": self._current_job_id, "status": STATUS_RUNNING},
+                {"$set": {"status": STATUS_PENDING}, "$unset": {"locked_until": ""}}
+            )
+            self._current_job_id = None
@@ -0,0 +1,91 @@
+"""
+Quick Search - Query shape classification and time-budgeted federated lookups
+One search box for phones, card last-4, bill codes, DAO business ids and names; each source runs concurrently under its own budget
+"""
+
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Dict, List, Set, Tuple
+
+from search_tokens import fold
+from uuid_utils import is_valid_uuid, is_valid_composite_bill_id
+
+logger = logging.getLogger(__name__)
+
+# Query shapes - a query can have several
+SHAPE_UUID = "uuid"
+SHAPE_PHONE = "phone"              # 4+ digits - 4 digits is also a card last4
+SHAPE_CARD_LAST4 = "card_last4"    # exactly 4 digits
+SHAPE_DAO_ID = "dao_id"            # D + digits, e.g. D98550509
+SHAPE_BILL_ID = "bill_id"          # customer_code + MMYY
+SHAPE_CUSTOMER_CODE = "customer_code"  # letters + digits, e.g. PA22040444645
+SHAPE_TEXT = "text"                # names and anything else
+
+# Hit scores - exact id matches rank above prefix and token matches
+SCORE_EXACT = 100
+SCORE_PREFIX = 50
+SCORE_TOKEN = 25
+
+_DAO_ID = re.compile(r"^d\d{3,}$")
+_CUSTOMER_CODE = re.compile(r"^[a-z]{1,4}\d{4,}$")
+
+
+def classify(query: str) -> Set[str]:
+    """Shapes the query could be - decides which sources are worth asking"""
+    compact = re.sub(r"[\s.\-]", "", query.strip())
+    lowered = compact.lower()
+    shapes: Set[str] = set()
+
+    if is_valid_uuid(query.strip()):
+        return {SHAPE_UUID}
+    if compact.isdigit():
+        if len(compact) == 4:
+            shapes.add(SHAPE_CARD_LAST4)
+        if len(compact) >= 4:
+            shapes.add(SHAPE_PHONE)
+    if _DAO_ID.match(lowered):
+        shapes.add(SHAPE_DAO_ID)
+    if _CUSTOMER_CODE.match(lowered) or (compact.isalnum() and any(ch.isdigit() for ch in compact) and len(compact) >= 6):
+        shapes.add(SHAPE_CUSTOMER_CODE)
+        if is_valid_composite_bill_id(compact.upper()):
+            shapes.add(SHAPE_BILL_ID)
+    if not compact.isdigit() and any(ch.isalpha() for ch in fold(query)):
+        shapes.add(SHAPE_TEXT)
+    return shapes
+
+
+async def run_sources(
+    sources: Dict[str, Awaitable[List[Dict[str, Any]]]],
+    budget_seconds: float,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Run source lookups concurrently - a source over budget is dropped, not awaited
+
+    Returns (hits, names of sources that timed out or failed).
+    """
+    names = list(sources)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(sources[name], timeout=budget_seconds) for name in names),
+        return_exceptions=True
+    )
+
+    hits: List[Dict[str, Any]] = []
+    skipped: List[str] = []
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, asyncio.TimeoutError):
+                logger.error(f"Quick search source {name} failed: {result}")
+            skipped.append(name)
+            continue
+        hits.extend(result)
+    return hits, skipped
+
+
+def rank(hits: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Highest score first, one hit per (type, id)"""
+    best: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for hit in hits:
+        key = (hit["type"], hit["id"])
+        if key not in best or hit["score"] > best[key]["score"]:
+            best[key] = hit
+    return sorted(best.values(), key=lambda hit: -hit["score"])[:limit]
@@ -0,0 +1,104 @@
+"""
+Repository Layer - Single round-trip CRUD over Motor collections
+Writes return the post-image from the write itself - no existence pre-read, no re-read
+
+Every document carries a 'version' counter bumped by each repository update;
+callers pass expected_version for optimistic concurrency (HTTP If-Match)
+
+Round trips per endpoint (write path, before -> after):
+    POST   /api/customers             2 -> 1
+    PUT    /api/customers/{id}        3 -> 1
+    DELETE /api/customers/{id}        4 -> 5  (1 update, 3 hide_related update_many, purge job insert)
+    POST   /api/bills                 2 -> 1
+    PUT    /api/bills/{id}            3 -> 1
+    DELETE /api/bills/{id}            3 -> 2
+    POST   /api/credit-cards          4 -> 3
+    PUT    /api/credit-cards/{id}     3 -> 1
+    DELETE /api/credit-cards/{id}     3 -> 2
+    POST   /api/sales                 N+5 -> 5  (N = bills in the sale)
+    POST   /api/inventory/add/{id}    2 -> 1
+    DELETE /api/inventory/remove/{id} 2 -> 1
+"""
+
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+
+# Never hand Mongo's ObjectId back to callers
+NO_OBJECT_ID = {"_id": 0}
+
+
+class VersionConflict(Exception):
+    """Document exists but its version no longer matches the expected one"""
+
+
+def version_filter(expected_version: int) -> Dict[str, Any]:
+    """Match an expected version - legacy documents without the field are version 0"""
+    if expected_version == 0:
+        return {"version": {"$in": [None, 0]}}
+    return {"version": expected_version}
+
+
+class Repository:
+    """CRUD helpers for one collection keyed by the UUID/composite 'id' field"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(
+        self,
+        filter_query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        expected_version: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Single document or None - raises VersionConflict when it exists at another expected_version"""
+        document = await self.collection.find_one(filter_query, projection or NO_OBJECT_ID)
+        if document is not None and expected_version is not None:
+            if (document.get("version") or 0) != expected_version:
+                raise VersionConflict(f"Expected version {expected_version}")
+        return document
+
+    async def insert(self, document: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """Insert and return the stored document - the document we sent is the post-image"""
+        document.setdefault("version", 1)
+        await self.collection.insert_one(document, session=session)
+        document.pop("_id", None)
+        return document
+
+    async def update(
+        self,
+        filter_query: Dict[str, Any],
+        update: Dict[str, Any],
+        expected_version: Optional[int] = None,
+        upsert: bool = False,
+        session=None,
+    ) -> Optional[Dict[str, Any]]:
+        """Conditional update returning the post-image - None when nothing matched
+
+        With expected_version the update only applies to that version and raises
+        VersionConflict when the document exists at another version.
+        """
+        query = dict(filter_query)
+        if expected_version is not None:
+            query.update(version_filter(expected_version))
+        update = {**update, "$inc": {**update.get("$inc", {}), "version": 1}}
+
+        document = await self.collection.find_one_and_update(
+            query,
+            update,
+            projection=NO_OBJECT_ID,
+            return_document=ReturnDocument.AFTER,
+            upsert=upsert,
+            session=session
+        )
+        if document is None and expected_version is not None:
+            # Failure path only: tell a stale version apart from a missing document
+            if await self.collection.find_one(filter_query, {"_id": 1}, session=session):
+                raise VersionConflict(f"Expected version {expected_version}")
+        return document
+
+    async def delete(self, filter_query: Dict[str, Any], session=None) -> Optional[Dict[str, Any]]:
+        """Conditional delete returning the deleted document - None when nothing matched"""
+        return await self.collection.find_one_and_delete(
+            filter_query, projection=NO_OBJECT_ID, session=session
+        )
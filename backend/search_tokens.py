@@ -0,0 +1,85 @@
+"""
+Search Tokens - Write-time normalized tokens for transaction search
+Accent-folded Vietnamese names, phone digits, bill ids, business ids and card last-4, matched by indexed prefix
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+SEARCH_TOKENS_FIELD = "search_tokens"
+MIN_TERM_LENGTH = 2  # Shorter prefixes match too much to be worth an index scan
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip Vietnamese diacritics - 'Nguyễn Đức' -> 'nguyen duc'"""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def _words(value: Optional[str]) -> List[str]:
+    return [word for word in _NON_ALNUM.split(fold(value or "")) if word]
+
+
+def _identifier(value: Optional[str]) -> List[str]:
+    """Whole id plus its alphanumeric parts - 'PA22040444645_0825' matches either way"""
+    if not value:
+        return []
+    whole = fold(str(value)).strip()
+    return [whole, *_words(whole)]
+
+
+def _digits(value: Optional[str]) -> str:
+    return re.sub(r"\D", "", str(value or ""))
+
+
+def build_tokens(
+    customer: Optional[Dict[str, Any]] = None,
+    identifiers: Iterable[Optional[str]] = (),
+    card_number: Optional[str] = None,
+    words: Iterable[Optional[str]] = (),
+) -> List[str]:
+    """Deduplicated token list stored on the document"""
+    tokens: List[str] = []
+    if customer:
+        tokens += _words(customer.get("name"))
+        phone = _digits(customer.get("phone"))
+        if phone:
+            tokens.append(phone)
+    for identifier in identifiers:
+        tokens += _identifier(identifier)
+    card_digits = _digits(card_number)
+    if len(card_digits) >= 4:
+        tokens.append(card_digits[-4:])
+    for value in words:
+        tokens += _words(value)
+    return sorted(set(tokens))
+
+
+def sale_tokens(sale: Dict[str, Any], customer: Optional[Dict[str, Any]]) -> List[str]:
+    return build_tokens(customer, identifiers=[sale.get("id"), *(sale.get("bill_ids") or [])])
+
+
+def dao_tokens(dao: Dict[str, Any], customer: Optional[Dict[str, Any]]) -> List[str]:
+    return build_tokens(
+        customer,
+        identifiers=[dao.get("transaction_id"), dao.get("pos_code"), dao.get("bill_code"), *(dao.get("bill_ids") or [])],
+        card_number=dao.get("card_number"),
+        words=[dao.get("bank_name")]
+    )
+
+
+def search_filter(search: str) -> Optional[Dict[str, Any]]:
+    """Every search term must prefix-match a token - anchored regexes use the multikey index
+
+    Returns None when the search has no usable terms.
+    """
+    terms = [term for term in (fold(part).strip() for part in search.split()) if len(term) >= MIN_TERM_LENGTH]
+    if not terms:
+        return None
+    return {"$and": [
+        {SEARCH_TOKENS_FIELD: {"$regex": f"^{re.escape(term)}"}} for term in terms
+    ]}
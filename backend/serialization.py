@@ -0,0 +1,112 @@
+"""
+Trusted Serialization - Fast path for documents read straight from the database
+Rows are shaped to the response model's fields and encoded with orjson - no per-row model validation
+"""
+
+import json
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+try:
+    import orjson
+except ImportError:  # Encoding falls back to jsonable_encoder + json
+    orjson = None
+
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def model_defaults(model) -> Dict[str, Any]:
+    """Static field defaults - what model validation would fill in for missing fields"""
+    return {
+        name: field.default for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+
+@lru_cache(maxsize=None)
+def _field_plan(model) -> Tuple[Tuple[str, Any], ...]:
+    """(field, default or _MISSING) pairs in model order - computed once per model"""
+    defaults = model_defaults(model)
+    return tuple((name, defaults.get(name, _MISSING)) for name in model.model_fields)
+
+
+def shape(document: Dict[str, Any], model, selected: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Model-shaped dict: only the model's (or selected) fields, static defaults for missing ones"""
+    if selected:
+        defaults = model_defaults(model)
+        plan = [(name, defaults.get(name, _MISSING)) for name in selected]
+    else:
+        plan = _field_plan(model)
+    row = {}
+    for name, default in plan:
+        value = document.get(name, default)
+        if value is not _MISSING:
+            row[name] = value
+    return row
+
+
+def shape_many(documents: Iterable[Dict[str, Any]], model, selected: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    return [shape(document, model, selected) for document in documents]
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not know - Decimal128/ObjectId leftovers and nested models"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "to_decimal"):
+        return float(value.to_decimal())
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class TrustedJSONResponse(JSONResponse):
+    """JSON response for already-shaped database rows - encoded once, without response_model validation"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def ndjson_lines(rows: Iterable[Any]) -> bytes:
+    """One JSON document per line, each terminated by a newline"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        return b"".join(orjson.dumps(row, default=_default, option=option) for row in rows)
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+async def ndjson_chunks(
+    cursor,
+    transform: Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]],
+    batch_size: int,
+) -> AsyncIterator[bytes]:
+    """Encode a database cursor batch by batch - only one batch of documents is held at a time
+
+    transform shapes a batch of raw documents into response rows (overlays, projection, model fields).
+    """
+    batch: List[Dict[str, Any]] = []
+    try:
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield ndjson_lines(await transform(batch))
+                batch = []
+        if batch:
+            yield ndjson_lines(await transform(batch))
+    finally:
+        # Client went away mid-stream - release the server-side cursor now
+        await cursor.close()
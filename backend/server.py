@@ -6,6 +6,7 @@ Clean architecture with UUID-only entity identification
 """
 
 import os
+import re
 import sys
 import asyncio
 import logging
@@ -15,13 +16,14 @@ from enum import Enum
 import uuid
 
 # FastAPI imports
-from fastapi import FastAPI, HTTPException, status, Depends, Query
+from fastapi import FastAPI, HTTPException, status, Depends, Query, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 # Database imports
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.errors import DuplicateKeyError
 
 # Pydantic imports
@@ -35,6 +37,60 @@ from datetime import timedelta
 # UUID utilities
 from uuid_utils import generate_uuid, is_valid_uuid, uuid_processor, is_valid_composite_bill_id, generate_composite_bill_id
 
+# Idempotency keys for money-moving endpoints
+from idempotency import IdempotencyStore, IDEMPOTENCY_HEADER
+
+# Contention-free customer totals
+
+# Transactional outbox for write side effects
+from outbox import Outbox
+
+# Single round-trip CRUD repositories
+from repository import Repository, VersionConflict
+
+# Soft delete + background cascade purge for customers
+from purge import CustomerPurger, NOT_DELETED
+
+# Filtered server-side bulk updates
+from bulk_mutation import BulkMutator, BulkLimitExceeded, MAX_DOCUMENTS_HARD_CAP
+
+# Keyset (cursor) pagination for list endpoints
+from pagination import fetch_page, find_page, decode_cursor, encode_cursor, keyset_filter, InvalidCursor, NEXT_CURSOR_HEADER
+
+# Write-time search tokens for transaction search
+from search_tokens import sale_tokens, dao_tokens, search_filter, SEARCH_TOKENS_FIELD, MIN_TERM_LENGTH
+
+# In-process customer autocomplete
+from customer_index import CustomerPrefixIndex, ENTRY_FIELDS as INDEX_ENTRY_FIELDS
+
+# Federated quick-search
+import quick_search
+from quick_search import classify, run_sources, rank
+
+# fields= projection for list/detail endpoints
+from projection import parse_fields, mongo_projection, project, InvalidFields
+
+# Validation-free orjson responses for database rows
+from serialization import TrustedJSONResponse, NDJSON_MEDIA_TYPE, ndjson_chunks, shape, shape_many
+
+# Write-behind buffer for low-value touch fields
+from write_behind import WriteBehindBuffer
+
+# ETag / Last-Modified validators for conditional GETs
+from conditional import MarkerSource, change_marker, entity_etag, http_date, is_not_modified, latest
+
+# Negotiated gzip/brotli response compression
+from compression import CompressionMiddleware, CompressionStats
+
+# Per-customer transaction metrics read model
+from customer_summary import CustomerSummaries, RebuildInProgress, SALE_TYPE
+
+# changes?since= feeds + tombstones for client caches
+from delta_sync import (
+    ChangeSource, Tombstones, InvalidSyncToken,
+    collect_changes, decode_sync_token, encode_sync_token, token_expired
+)
+
 # HTTP client for external API calls
 import aiohttp
 import asyncio
@@ -173,6 +229,7 @@ class Customer(CustomerBase):
     total_dao_transactions: int = 0
     total_dao_profit: float = 0.0
     is_active: bool = True
+    version: int = 0  # Optimistic concurrency - bumped on every update
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -212,9 +269,53 @@ class Bill(BillBase):
     added_by_user: Optional[str] = None
     inventory_note: Optional[str] = None
     last_checked_at: Optional[datetime] = None
+    version: int = 0  # Optimistic concurrency - bumped on every update
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Bulk Mutation Models
+class BulkBillFilter(BaseModel):
+    status: Optional[BillStatus] = None
+    provider_region: Optional[str] = None
+    cycle: Optional[str] = None
+    batch_name: Optional[str] = None
+    is_in_inventory: Optional[bool] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+class BulkBillAction(str, Enum):
+    SET_STATUS = "SET_STATUS"
+    REMOVE_FROM_INVENTORY = "REMOVE_FROM_INVENTORY"
+
+class BulkBillMutation(BaseModel):
+    filter: BulkBillFilter
+    action: BulkBillAction
+    status: Optional[BillStatus] = None  # Target status for SET_STATUS
+    dry_run: bool = False
+    max_documents: int = Field(1000, ge=1, le=MAX_DOCUMENTS_HARD_CAP)
+
+class BulkCustomerFilter(BaseModel):
+    type: Optional[CustomerType] = None
+    is_active: Optional[bool] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    updated_before: Optional[datetime] = None  # Stale: no write since this date
+
+class BulkCustomerAction(str, Enum):
+    DEACTIVATE = "DEACTIVATE"
+    ACTIVATE = "ACTIVATE"
+
+class BulkCustomerMutation(BaseModel):
+    filter: BulkCustomerFilter
+    action: BulkCustomerAction
+    dry_run: bool = False
+    max_documents: int = Field(1000, ge=1, le=MAX_DOCUMENTS_HARD_CAP)
+
+# Batch Get Models
+class BatchGetRequest(BaseModel):
+    ids: List[str]
+    fields: Optional[str] = None  # Same fields= syntax as the single-item endpoints
+
 # Credit Card Models
 class CardType(str, Enum):
     VISA = "VISA"
@@ -269,13 +370,18 @@ class CreditCardUpdate(BaseModel):
     status: Optional[CardStatus] = None
     notes: Optional[str] = None
 
+class CardPaymentRequest(BaseModel):
+    amount: float = Field(..., gt=0)  # Paid towards the card balance - restores available credit
+
 class CreditCard(CreditCardBase):
     id: str = Field(default_factory=generate_uuid)
     customer_name: Optional[str] = None  # Denormalized
+    card_last4: Optional[str] = None  # Indexed for quick-search
     current_cycle_month: Optional[str] = None
     last_payment_date: Optional[datetime] = None
     cycle_payment_count: int = 0
     total_cycles: int = 0
+    version: int = 0  # Optimistic concurrency - bumped on every update
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -321,6 +427,55 @@ MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 client = AsyncIOMotorClient(MONGO_URL)
 db = client.crm_7ty_vn  # Use crm_7ty_vn database where user exists
 
+# Deleted ids of synced collections, for changes?since= clients
+tombstones = Tombstones(db.tombstones, tracked=("customers", "credit_cards", "bills"))
+
+# Purge worker for soft-deleted customers - related data removed in throttled batches
+customer_purger = CustomerPurger(
+    db,
+    [
+        "credit_cards", "sales", "dao_transactions", "activities",
+        "customer_summaries", "customer_summaries_ledger"
+    ],
+    tombstones=tombstones,
+    hidden=["credit_cards", "sales", "dao_transactions"]
+)
+
+# Repositories - writes return post-images, no pre-read/re-read
+customers_repo = Repository(db.customers)
+bills_repo = Repository(db.bills)
+credit_cards_repo = Repository(db.credit_cards)
+sales_repo = Repository(db.sales)
+
+# Stored responses for Idempotency-Key replays (sales + DAO)
+idempotency_store = IdempotencyStore(db.idempotency_keys)
+
+# Lifetime/monthly value, profit, transaction and card counts per customer - maintained by outbox handlers
+customer_summaries = CustomerSummaries(db)
+
+# Chunked filtered update_many with progress in bulk_jobs
+bulk_mutator = BulkMutator(db)
+
+# Phone/name prefix index for autocomplete - rebuilt periodically to pick up other workers' writes
+customer_index = CustomerPrefixIndex(
+    db.customers,
+    NOT_DELETED,
+    refresh_interval=float(os.environ.get('CUSTOMER_INDEX_REFRESH_SECONDS', '300'))
+)
+
+# last_login / last_checked_at style touches, coalesced off the request path
+touch_buffer = WriteBehindBuffer(
+    db,
+    flush_interval=float(os.environ.get('TOUCH_FLUSH_INTERVAL_SECONDS', '5'))
+)
+
+# Side effects of sales/DAOs (customer stats, card status, activity feed)
+outbox = Outbox(
+    client,
+    db.outbox_events,
+    poll_interval=float(os.environ.get('OUTBOX_POLL_INTERVAL_SECONDS', '1'))
+)
+
 async def ensure_uuid_indexes():
     """Create UUID-optimized indexes"""
     try:
@@ -339,6 +494,44 @@ async def ensure_uuid_indexes():
         await db.bills.create_index("is_in_inventory")
         await db.customers.create_index("phone")
         
+        # Idempotency records expire via TTL index
+        await idempotency_store.ensure_indexes()
+        await customer_summaries.ensure_indexes()
+        await tombstones.ensure_indexes()
+        await outbox.ensure_indexes()
+        await customer_purger.ensure_indexes()
+        await bulk_mutator.ensure_indexes()
+        await db.sales.create_index(SEARCH_TOKENS_FIELD)
+        await db.dao_transactions.create_index(SEARCH_TOKENS_FIELD)
+        await db.bills.create_index([("provider_region", 1), ("cycle", 1)])
+        await db.bills.create_index("batch_name")
+        # Keyset pagination - (filter, sort key, id) per list endpoint
+        await db.customers.create_index([("created_at", -1), ("id", -1)])
+        await db.bills.create_index([("created_at", -1), ("id", -1)])
+        await db.bills.create_index([("status", 1), ("created_at", -1), ("id", -1)])
+        await db.bills.create_index([("is_in_inventory", 1), ("added_to_inventory_at", -1), ("id", -1)])
+        await db.sales.create_index([("created_at", -1), ("id", -1)])
+        await db.sales.create_index([("customer_id", 1), ("created_at", -1), ("id", -1)])
+        await db.credit_cards.create_index([("created_at", -1), ("id", -1)])
+        await db.dao_transactions.create_index([("created_at", -1), ("id", -1)])
+        await db.dao_transactions.create_index([("customer_id", 1), ("created_at", -1), ("id", -1)])
+        await db.dao_transactions.create_index("customer_id")
+        await db.dao_transactions.create_index([("credit_card_id", 1), ("created_at", -1), ("id", -1)])
+        # Quick-search lookups
+        await db.credit_cards.create_index("card_last4")
+        await db.bills.create_index("customer_code")
+        await db.dao_transactions.create_index("transaction_id")
+        await db.activities.create_index("customer_id")
+        await db.activities.create_index("created_at")
+        # Delta sync - (updated_at, id) keyset per synced collection
+        await db.customers.create_index([("updated_at", 1), ("id", 1)])
+        await db.credit_cards.create_index([("updated_at", 1), ("id", 1)])
+        await db.bills.create_index([("updated_at", 1), ("id", 1)])
+        await db.customer_summaries.create_index([("updated_at", 1), ("customer_id", 1)])
+        # List ETags - newest updated_at per transaction collection
+        await db.sales.create_index("updated_at")
+        await db.dao_transactions.create_index("updated_at")
+        
         logger.info("✅ UUID indexes created successfully")
     except Exception as e:
         logger.error(f"❌ Error creating indexes: {e}")
@@ -360,14 +553,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", NEXT_CURSOR_HEADER],
+)
+
+# Response compression - outermost, so CORS headers are set before the body is encoded
+compression_stats = CompressionStats()
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MINIMUM_SIZE', '1024')),
+    offload_size=int(os.environ.get('COMPRESSION_OFFLOAD_SIZE', str(64 * 1024))),
+    gzip_level=int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6')),
+    brotli_quality=int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '4')),
+    stats=compression_stats,
 )
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     await ensure_uuid_indexes()
+    await backfill_available_credit()
+    await backfill_card_last4()
+    await backfill_updated_at()
+    await refresh_search_tokens({SEARCH_TOKENS_FIELD: {"$exists": False}})
+    await build_customer_summaries()
+    await outbox.start()
+    await customer_purger.start()
+    await bulk_mutator.start()
+    await touch_buffer.start()
+    await customer_index.start()
     logger.info("🚀 CRM 7ty.vn UUID-Only System Started")
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    await customer_index.stop()
+    await touch_buffer.stop()
+    await customer_purger.stop()
+    await bulk_mutator.stop()
+    await outbox.stop()
+
 # Health check
 @app.get("/")
 async def root():
@@ -440,36 +664,619 @@ async def generate_dao_transaction_id(card_number: str, date: datetime = None) -
     else:
         return f"{base_id}-{existing_count + 1}"  # D98550509-2, D98550509-3, etc.
 
-def update_card_after_dao(card_dict: dict, dao_amount: float) -> dict:
-    """Update card fields after DAO transaction - Simplified without current_balance"""
-    # Update available credit (decrease by DAO amount)
-    card_dict["available_credit"] = card_dict.get("credit_limit", 0) - dao_amount
+def card_dao_update(card: dict, dao_amount: float, dao_date: datetime) -> dict:
+    """Atomic card update for a DAO - credit is decremented server-side, never recomputed from a snapshot"""
+    # Calculate next due date if not set (statement/payment days are card config, not contended)
+    next_due_date = card.get("next_due_date") or calculate_next_due_date(
+        card.get("statement_date", 5),
+        card.get("payment_due_date", 15)
+    )
+    
+    # Calculate days until due
+    try:
+        due_date = datetime.fromisoformat(next_due_date).date()
+        days_until_due = (due_date - datetime.now(timezone.utc).date()).days
+    except:
+        days_until_due = 0
     
-    # Update last DAO date
-    card_dict["last_dao_date"] = datetime.now(timezone.utc)
+    return {
+        # Decrease available credit by DAO amount - concurrent DAOs on one card compose
+        "$inc": {"available_credit": -dao_amount, "version": 1},
+        "$set": {
+            "last_dao_date": dao_date,
+            "next_due_date": next_due_date,
+            "status": calculate_card_status(next_due_date, dao_date).value,
+            "days_until_due": days_until_due,
+            "updated_at": dao_date
+        },
+        "$unset": {
+            "current_balance": ""  # Remove current_balance field from existing records
+        }
+    }
+
+# Card fields a DAO sets - restored by release_card_credit when the DAO fails after reserving
+CARD_DAO_STATE_FIELDS = ("last_dao_date", "next_due_date", "status", "days_until_due")
+
+async def release_card_credit(card: dict, dao_amount: float, dao_date: datetime):
+    """Undo a DAO's card update where no transaction can roll it back
+
+    Credit always goes back. The DAO's status/due fields are restored to the pre-DAO snapshot only while
+    no later DAO has overwritten them (last_dao_date still ours). version is bumped again, never rewound.
+    """
+    now = datetime.now(timezone.utc)
+    restore = {field: card[field] for field in CARD_DAO_STATE_FIELDS if card.get(field) is not None}
+    unset = {field: "" for field in CARD_DAO_STATE_FIELDS if card.get(field) is None}
+    update = {"$inc": {"available_credit": dao_amount, "version": 1}, "$set": {**restore, "updated_at": now}}
+    if unset:
+        update["$unset"] = unset
+    stored_date = dao_date.replace(microsecond=dao_date.microsecond // 1000 * 1000)  # BSON dates keep milliseconds
+    result = await db.credit_cards.update_one({"id": card["id"], "last_dao_date": stored_date}, update)
+    if not result.matched_count:
+        await db.credit_cards.update_one(
+            {"id": card["id"]},
+            {"$inc": {"available_credit": dao_amount, "version": 1}, "$set": {"updated_at": now}}
+        )
+
+def card_last4(card_number: Optional[str]) -> Optional[str]:
+    """Last four digits, indexed for quick-search"""
+    digits = "".join(ch for ch in (card_number or "") if ch.isdigit())
+    return digits[-4:] if len(digits) >= 4 else None
+
+async def backfill_card_last4():
+    """Cards created before quick-search get their last-4 field"""
+    try:
+        updates = [
+            UpdateOne(
+                {"id": card["id"]},
+                {"$set": {"card_last4": card_last4(card.get("card_number"))}, "$inc": {"version": 1}}
+            )
+            async for card in db.credit_cards.find(
+                {"card_last4": {"$exists": False}}, {"_id": 0, "id": 1, "card_number": 1}
+            )
+        ]
+        if updates:
+            await db.credit_cards.bulk_write(updates, ordered=False)
+    except Exception as e:
+        logger.error(f"Error backfilling card_last4: {e}")
+
+async def backfill_updated_at():
+    """Delta sync and list ETags read updated_at - legacy documents without one start at created_at"""
+    for collection in (db.customers, db.credit_cards, db.bills, db.sales, db.dao_transactions):
+        try:
+            await collection.update_many(
+                {"updated_at": None},
+                [{"$set": {
+                    "updated_at": {"$ifNull": ["$created_at", "$$NOW"]},
+                    "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+                }}]
+            )
+        except Exception as e:
+            logger.error(f"Error backfilling updated_at on {collection.name}: {e}")
+
+async def backfill_available_credit():
+    """Cards created before credit accounting start with their full credit limit"""
+    try:
+        result = await db.credit_cards.update_many(
+            {"available_credit": None},
+            [{"$set": {
+                "available_credit": {"$ifNull": ["$credit_limit", 0]},
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+            }}]
+        )
+        if result.modified_count:
+            logger.info(f"Initialized available_credit on {result.modified_count} cards")
+    except Exception as e:
+        logger.error(f"Error backfilling available_credit: {e}")
+
+# ========================================
+# OUTBOX HANDLERS - SALE/DAO SIDE EFFECTS
+# ========================================
+
+def dao_event_payload(dao_transaction: dict) -> dict:
+    """Outbox payload for a created DAO transaction"""
+    return {
+        "dao_id": dao_transaction["id"],
+        "transaction_id": dao_transaction["transaction_id"],
+        "transaction_type": dao_transaction["transaction_type"],
+        "customer_id": dao_transaction["customer_id"],
+        "credit_card_id": dao_transaction.get("credit_card_id"),
+        "amount": dao_transaction.get("amount", 0),
+        "profit_value": dao_transaction.get("profit_value", 0),
+        "created_at": dao_transaction["created_at"]
+    }
+
+async def record_activity(event: dict, activity: dict):
+    """Insert activity feed entry - keyed by event id so redelivery is a no-op"""
+    customer = await db.customers.find_one({"id": activity["customer_id"]}, {"name": 1})
+    try:
+        await db.activities.insert_one({
+            "_id": event["_id"],
+            "id": event["_id"],
+            "customer_name": customer.get("name") if customer else None,
+            **activity
+        })
+    except DuplicateKeyError:
+        pass
+
+async def customer_is_live(customer_id: str) -> bool:
+    """Side effects for deleted customers would re-insert documents the purge already removed"""
+    return bool(await db.customers.find_one({"id": customer_id, **NOT_DELETED}, {"_id": 1}))
+
+@outbox.handler("sale.created")
+async def apply_sale_side_effects(event: dict):
+    """Customer summary + activity for a bill sale"""
+    payload = event["payload"]
+    if not await customer_is_live(payload["customer_id"]):
+        return
+    async with outbox.transaction() as session:
+        await customer_summaries.record(
+            payload["sale_id"], payload["customer_id"], SALE_TYPE,
+            payload["total"], payload["profit_value"], payload["created_at"], session=session
+        )
+    await record_activity(event, {
+        "type": "BILL_SALE",
+        "reference_id": payload["sale_id"],
+        "customer_id": payload["customer_id"],
+        "amount": payload["total"],
+        "profit": payload["profit_value"],
+        "description": f"Bán {len(payload.get('bill_ids', []))} bills",
+        "created_at": payload["created_at"]
+    })
+
+@outbox.handler("dao.created")
+async def apply_dao_side_effects(event: dict):
+    """Customer summary + activity for a DAO transaction"""
+    payload = event["payload"]
+    if not await customer_is_live(payload["customer_id"]):
+        return
     
-    # Calculate next due date if not set
-    if not card_dict.get("next_due_date"):
-        card_dict["next_due_date"] = calculate_next_due_date(
-            card_dict.get("statement_date", 5), 
-            card_dict.get("payment_due_date", 15)
+    # CRITICAL: DAO amounts count in the customer's total_spent (see customer_totals)
+    async with outbox.transaction() as session:
+        await customer_summaries.record(
+            payload["dao_id"], payload["customer_id"], payload["transaction_type"],
+            payload["amount"], payload["profit_value"], payload["created_at"], session=session
         )
+    await record_activity(event, {
+        "type": payload["transaction_type"],
+        "reference_id": payload["dao_id"],
+        "customer_id": payload["customer_id"],
+        "amount": payload["amount"],
+        "profit": payload["profit_value"],
+        "description": f"Đáo thẻ - {payload['transaction_id']}",
+        "transaction_id": payload["transaction_id"],
+        "created_at": payload["created_at"]
+    })
+
+@outbox.handler("customer.cards_changed")
+async def recount_customer_cards(event: dict):
+    """Customer summary total_cards after a card insert/delete"""
+    customer_id = event["payload"]["customer_id"]
+    if not await customer_is_live(customer_id):
+        return
+    await customer_summaries.record_cards(customer_id)
+
+async def build_customer_summaries():
+    """First start with the read model: materialize it from existing sales/DAOs"""
+    try:
+        if await customer_summaries.is_empty():
+            await customer_summaries.rebuild()
+    except RebuildInProgress:
+        logger.info("Customer summaries are being built by another process")
+    except Exception as e:
+        logger.error(f"Error building customer summaries: {e}")
+
+async def overlay_customer_totals(customers: List[dict]) -> Dict[str, dict]:
+    """Transaction and card totals from customer_summaries - returns the summaries by id"""
+    return await customer_summaries.overlay(customers)
+
+async def refresh_search_tokens(query: dict, batch_size: int = 500):
+    """Recompute search tokens for matching sales/DAOs - bulk_write per batch"""
+    for collection, tokenize in ((db.sales, sale_tokens), (db.dao_transactions, dao_tokens)):
+        last_id = None
+        while True:
+            page_query = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+            batch = await collection.find(page_query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+            
+            customers = {
+                customer["id"]: customer
+                async for customer in db.customers.find(
+                    {"id": {"$in": list({doc.get("customer_id") for doc in batch})}},
+                    {"_id": 0, "id": 1, "name": 1, "phone": 1}
+                )
+            }
+            await collection.bulk_write([
+                UpdateOne(
+                    {"_id": doc["_id"]},
+                    {
+                        "$set": {
+                            SEARCH_TOKENS_FIELD: tokenize(doc, customers.get(doc.get("customer_id"))),
+                            "updated_at": datetime.now(timezone.utc)
+                        },
+                        "$inc": {"version": 1}
+                    }
+                )
+                for doc in batch
+            ], ordered=False)
+
+@outbox.handler("customer.renamed")
+async def refresh_customer_search_tokens(event: dict):
+    """Re-tokenize a customer's transactions after a name/phone change"""
+    await refresh_search_tokens({"customer_id": event["payload"]["customer_id"]})
+
+# ========================================
+# CONCURRENCY CONTROL - ETAG / IF-MATCH
+# ========================================
+
+def document_etag(document: dict, *stamps, selected: Optional[List[str]] = None) -> str:
+    """Strong ETag from the document version, newest change time and fields= selection - legacy documents are version 0"""
+    return entity_etag(document.get("version") or 0, latest(document.get("updated_at"), *stamps), selected)
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Expected version from an If-Match header - None means unconditional"""
+    if not if_match or if_match.strip() == "*":
+        return None
     
-    # Calculate and update status
-    card_dict["status"] = calculate_card_status(
-        card_dict["next_due_date"],
-        card_dict["last_dao_date"]
-    ).value  # Get enum value
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
     
-    # Calculate days until due
+    # "v<version>" or "v<version>.<change time>" - only the version is compared
+    version = tag[1:].split(".", 1)[0]
+    if not tag.startswith("v") or not version.isdigit():
+        # Can never match a version ETag we issued
+        raise HTTPException(status_code=412, detail="Precondition Failed - unknown ETag")
+    return int(version)
+
+def version_conflict_error() -> HTTPException:
+    return HTTPException(
+        status_code=412,
+        detail="Precondition Failed - document was modified, reload and retry"
+    )
+
+# ========================================
+# CONDITIONAL GET - IF-NONE-MATCH / IF-MODIFIED-SINCE
+# ========================================
+
+# Change markers per list/stat endpoint - count + newest write time of every collection the body reads
+CUSTOMER_MARKERS = (MarkerSource(db.customers), MarkerSource(db.customer_summaries))
+BILL_MARKERS = (MarkerSource(db.bills),)
+CARD_MARKERS = (MarkerSource(db.credit_cards),)
+# Every writer bumps updated_at - edits and hide_related soft-deletes change the marker, not just inserts
+SALE_MARKERS = (MarkerSource(db.sales),)
+DAO_MARKERS = (MarkerSource(db.dao_transactions),)
+DASHBOARD_MARKERS = (MarkerSource(db.customers), *BILL_MARKERS, *SALE_MARKERS)
+
+def not_modified_response(etag: str, changed_at: Optional[datetime] = None) -> Response:
+    headers = {"ETag": etag}
+    if changed_at:
+        headers["Last-Modified"] = http_date(changed_at)
+    return Response(status_code=304, headers=headers)
+
+def set_validators(response: Response, document: dict, *stamps, selected: Optional[List[str]] = None):
+    """ETag + Last-Modified for an entity response"""
+    response.headers["ETag"] = document_etag(document, *stamps, selected=selected)
+    changed_at = latest(document.get("updated_at"), *stamps)
+    if changed_at:
+        response.headers["Last-Modified"] = http_date(changed_at)
+
+async def entity_not_modified(
+    request: Request, collection, query: dict, *stamps, selected: Optional[List[str]] = None
+) -> Optional[Response]:
+    """304 from a version/updated_at-only read - None when the full document has to be built"""
+    if_none_match = request.headers.get("If-None-Match")
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if not if_none_match and not if_modified_since:
+        return None
+    
+    probe = await collection.find_one(query, {"_id": 0, "version": 1, "updated_at": 1})
+    if not probe:
+        return None  # 404 comes from the normal path
+    etag = document_etag(probe, *stamps, selected=selected)
+    changed_at = latest(probe.get("updated_at"), *stamps)
+    if is_not_modified(if_none_match, if_modified_since, etag, changed_at):
+        return not_modified_response(etag, changed_at)
+    return None
+
+async def list_not_modified(request: Request, response: Response, markers) -> Optional[Response]:
+    """304 when no marked collection changed - otherwise sets the ETag and returns None"""
+    # Query string separates pages/filters; the date covers "today"-style figures
+    etag = await change_marker(markers, request.url.query, datetime.now(timezone.utc).date().isoformat())
+    if is_not_modified(request.headers.get("If-None-Match"), None, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+    return None
+
+async def customer_change_stamps(customer_id: str) -> list:
+    """Customer responses also change with its summary"""
+    summary = await db.customer_summaries.find_one({"customer_id": customer_id}, {"_id": 0, "updated_at": 1})
+    return [(summary or {}).get("updated_at")]
+
+# ========================================
+# PAGINATION - KEYSET CURSORS
+# ========================================
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    """Expose the keyset cursor for the next page - absent on the last page"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+# ========================================
+# FIELD PROJECTION - fields= PARAMETER
+# ========================================
+
+def projected_response(response: Response, documents, selected: List[str]) -> JSONResponse:
+    """Lightweight response for fields= requests - projected fields only, no model validation"""
+    if isinstance(documents, list):
+        content = [project(document, selected) for document in documents]
+    else:
+        content = project(documents, selected)
+    # Returning a Response directly drops headers set on the injected one - carry them over
+    return TrustedJSONResponse(content=content, headers=dict(response.headers))
+
+def trusted_response(response: Response, documents: List[dict], model) -> TrustedJSONResponse:
+    """Database rows shaped to the response model and encoded once - skips model construction,
+    uuid_processor.clean_response and response_model re-validation (ids come from our own writes)"""
+    return TrustedJSONResponse(content=shape_many(documents, model), headers=dict(response.headers))
+
+def fields_projection(selected: Optional[List[str]], *extra: str) -> Optional[dict]:
+    """Mongo projection for a fields= selection - None fetches the full document"""
+    return mongo_projection(selected, extra) if selected else None
+
+# ========================================
+# STREAMING - format=ndjson FOR LARGE RESULT SETS
+# ========================================
+
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '500'))
+
+def wants_ndjson(request: Request) -> bool:
+    """format=ndjson opts a list endpoint into streaming - anything else but json is a 400"""
+    requested = request.query_params.get("format")
+    if requested in (None, "", "json"):
+        return False
+    if requested != "ndjson":
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    return True
+
+def row_transform(model=None, selected: Optional[List[str]] = None, overlay=None):
+    """Per-batch shaping for streamed rows - same output as the buffered list response"""
+    async def transform(batch: List[dict]) -> List[dict]:
+        if overlay:
+            await overlay(batch)
+        if selected:
+            return [project(document, selected) for document in batch]
+        if model:
+            return shape_many(batch, model)
+        for document in batch:
+            document.pop("_id", None)
+        return batch
+    return transform
+
+def ndjson_response(response: Response, rows, transform) -> StreamingResponse:
+    """Stream a page cursor as NDJSON - memory holds one batch, first bytes leave after the first batch
+
+    No X-Next-Cursor: it is only known once the stream has ended.
+    """
+    rows.batch_size(STREAM_BATCH_SIZE)
+    return StreamingResponse(
+        ndjson_chunks(rows, transform, STREAM_BATCH_SIZE),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers=dict(response.headers)
+    )
+
+# ========================================
+# BATCH GET - ONE $in QUERY PER REQUEST
+# ========================================
+
+BATCH_GET_MAX_IDS = int(os.environ.get('BATCH_GET_MAX_IDS', '200'))
+
+async def fetch_documents(
+    collection,
+    ids: List[str],
+    model,
+    selected: Optional[List[str]] = None,
+    base_filter: Optional[dict] = None,
+    overlay=None
+) -> Dict[str, dict]:
+    """Documents by id in one $in query, projected to the model's fields (or a fields= selection)
+    
+    No per-item model validation; fields missing on older documents get the model's static default,
+    as the single-item endpoint would.
+    """
+    if not ids:
+        return {}
+    selected = selected or list(model.model_fields)
+    documents = await collection.find(
+        {"id": {"$in": ids}, **(base_filter or {})},
+        mongo_projection(selected)
+    ).to_list(len(ids))
+    if overlay:
+        await overlay(documents)
+    return {document["id"]: shape(document, model, selected) for document in documents}
+
+async def batch_get(
+    collection,
+    request: BatchGetRequest,
+    resource: str,
+    model,
+    is_valid_id=is_valid_uuid,
+    base_filter: Optional[dict] = None,
+    overlay=None
+) -> dict:
+    """Documents by id - every requested id gets an entry, null when not found"""
+    ids = list(dict.fromkeys(request.ids))  # dedupe, keep request order
+    if len(ids) > BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_GET_MAX_IDS} ids per batch")
+    
+    selected = parse_fields(request.fields, resource, model.model_fields)
+    found = await fetch_documents(
+        collection, [item_id for item_id in ids if is_valid_id(item_id)], model, selected,
+        base_filter=base_filter, overlay=overlay
+    )
+    return {
+        "items": {item_id: found.get(item_id) for item_id in ids},
+        "not_found": [item_id for item_id in ids if item_id not in found]
+    }
+
+@app.post("/api/customers/batch-get")
+async def batch_get_customers(request: BatchGetRequest):
+    """Customers by id - {items: {id: customer | null}, not_found: [...]}"""
     try:
-        due_date = datetime.fromisoformat(card_dict["next_due_date"]).date()
-        today = datetime.now(timezone.utc).date()
-        card_dict["days_until_due"] = (due_date - today).days
-    except:
-        card_dict["days_until_due"] = 0
+        return await batch_get(
+            db.customers, request, "customers", Customer,
+            base_filter=NOT_DELETED, overlay=overlay_customer_totals
+        )
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error batch fetching customers: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/credit-cards/batch-get")
+async def batch_get_credit_cards(request: BatchGetRequest):
+    """Credit cards by id - {items: {id: card | null}, not_found: [...]}"""
+    try:
+        return await batch_get(db.credit_cards, request, "credit_cards", CreditCard, base_filter=NOT_DELETED)
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error batch fetching credit cards: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/bills/batch-get")
+async def batch_get_bills(request: BatchGetRequest):
+    """Bills by composite id - {items: {id: bill | null}, not_found: [...]}"""
+    try:
+        return await batch_get(db.bills, request, "bills", Bill, is_valid_id=is_valid_composite_bill_id)
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error batch fetching bills: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/sales/batch-get")
+async def batch_get_sales(request: BatchGetRequest):
+    """Sales by id - {items: {id: sale | null}, not_found: [...]}"""
+    try:
+        return await batch_get(db.sales, request, "sales", Sale, base_filter=NOT_DELETED)
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error batch fetching sales: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ========================================
+# DELTA SYNC - changes?since=<token>
+# ========================================
+
+async def changes_response(
+    sources: Dict[str, ChangeSource],
+    collection,
+    model,
+    resource: str,
+    since: Optional[str],
+    limit: int,
+    fields: Optional[str],
+    base_filter: Optional[dict] = None,
+    overlay=None
+) -> dict:
+    """Documents changed since the token; changed ids no longer in the view are reported as deleted
+    
+    has_more=true means call again with next_token right away; reset=true means the token is too old
+    for tombstones and the client must reload the full list.
+    """
+    watermarks = decode_sync_token(since)
+    if token_expired(watermarks):
+        return {"changes": [], "deleted": [], "next_token": None, "has_more": False, "reset": True}
     
-    return card_dict
+    selected = parse_fields(fields, resource, model.model_fields)
+    ids, watermarks, has_more = await collect_changes(sources, watermarks, limit)
+    found = await fetch_documents(collection, ids, model, selected, base_filter=base_filter, overlay=overlay)
+    return {
+        "changes": [found[item_id] for item_id in ids if item_id in found],
+        "deleted": [item_id for item_id in ids if item_id not in found],
+        "next_token": encode_sync_token(watermarks),
+        "has_more": has_more,
+        "reset": False
+    }
+
+@app.get("/api/customers/changes")
+async def get_customer_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=2000),
+    fields: Optional[str] = None
+):
+    """Customers created/updated/deleted since the token - summary updates count as changes"""
+    try:
+        return await changes_response(
+            {
+                "customers": ChangeSource(db.customers, {}),
+                "summaries": ChangeSource(db.customer_summaries, {}, id_field="customer_id"),
+                "deleted": tombstones.source("customers"),
+            },
+            db.customers, Customer, "customers", since, limit, fields,
+            base_filter=NOT_DELETED, overlay=overlay_customer_totals
+        )
+    except (InvalidSyncToken, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching customer changes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/credit-cards/changes")
+async def get_credit_card_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=2000),
+    fields: Optional[str] = None
+):
+    """Credit cards created/updated/deleted since the token"""
+    try:
+        return await changes_response(
+            {
+                "credit_cards": ChangeSource(db.credit_cards, {}),
+                "deleted": tombstones.source("credit_cards"),
+            },
+            db.credit_cards, CreditCard, "credit_cards", since, limit, fields,
+            base_filter=NOT_DELETED
+        )
+    except (InvalidSyncToken, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching credit card changes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/inventory/changes")
+async def get_inventory_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=2000),
+    fields: Optional[str] = None
+):
+    """Inventory bills changed since the token - sold/removed/deleted bills come back in deleted"""
+    try:
+        return await changes_response(
+            {
+                "bills": ChangeSource(db.bills, {}),
+                "deleted": tombstones.source("bills"),
+            },
+            db.bills, Bill, "bills", since, limit, fields,
+            base_filter={"is_in_inventory": True}
+        )
+    except (InvalidSyncToken, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching inventory changes: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 # ========================================
 # CUSTOMERS API - UUID ONLY
@@ -483,13 +1290,9 @@ async def create_customer(customer_data: CustomerCreate):
         customer_dict = customer_data.dict()
         customer_dict = uuid_processor.prepare_document(customer_dict)
         
-        # Insert to database
-        result = await db.customers.insert_one(customer_dict)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Failed to create customer")
-        
-        # Return clean response
-        created_customer = await db.customers.find_one({"id": customer_dict["id"]})
+        # Insert to database - inserted document is the response
+        created_customer = await customers_repo.insert(customer_dict)
+        customer_index.upsert(created_customer)
         return Customer(**uuid_processor.clean_response(created_customer))
         
     except DuplicateKeyError:
@@ -499,25 +1302,56 @@ async def create_customer(customer_data: CustomerCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/customers", response_model=List[Customer])
-async def get_customers(skip: int = 0, limit: int = 100):
-    """Get all customers - UUID only responses"""
+async def get_customers(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get all customers - UUID only responses, next page cursor in X-Next-Cursor, fields= for a projection"""
     try:
-        cursor = db.customers.find({}).skip(skip).limit(limit).sort("created_at", -1)
-        customers = await cursor.to_list(length=limit)
+        not_modified = await list_not_modified(request, response, CUSTOMER_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        selected = parse_fields(fields, "customers", Customer.model_fields)
+        if wants_ndjson(request):
+            return ndjson_response(response, find_page(
+                db.customers, NOT_DELETED, limit, cursor=cursor, skip=skip,
+                projection=fields_projection(selected, "created_at")
+            ), row_transform(Customer, selected, overlay_customer_totals))
+        
+        customers, next_cursor = await fetch_page(
+            db.customers, NOT_DELETED, limit, cursor=cursor, skip=skip,
+            projection=fields_projection(selected, "created_at")
+        )
+        await overlay_customer_totals(customers)
+        set_next_cursor(response, next_cursor)
+        if selected:
+            return projected_response(response, customers, selected)
         
-        cleaned_customers = [uuid_processor.clean_response(customer) for customer in customers]
-        return [Customer(**customer) for customer in cleaned_customers]
+        return trusted_response(response, customers, Customer)
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching customers: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/customers/stats")
-async def get_customers_stats():
+async def get_customers_stats(request: Request, response: Response):
     """Customer stats for dashboard"""
     try:
-        total_customers = await db.customers.count_documents({})
-        active_customers = await db.customers.count_documents({"is_active": True})
+        not_modified = await list_not_modified(request, response, CUSTOMER_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        total_customers = await db.customers.count_documents(NOT_DELETED)
+        active_customers = await db.customers.count_documents({"is_active": True, **NOT_DELETED})
         
         return {
             "total": total_customers,
@@ -529,21 +1363,43 @@ async def get_customers_stats():
         logger.error(f"Error fetching customer stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/customers/autocomplete")
+async def autocomplete_customers(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    """Customer lookup by phone fragment or name prefix - served from the in-process index"""
+    return customer_index.search(q, limit)
+
 @app.get("/api/customers/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: str):
-    """Get customer by UUID only - NO ObjectId fallback"""
+async def get_customer(customer_id: str, request: Request, response: Response, fields: Optional[str] = None):
+    """Get customer by UUID only - NO ObjectId fallback, 304 for a matching If-None-Match/If-Modified-Since"""
     try:
         # Validate UUID format
         if not is_valid_uuid(customer_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
+        selected = parse_fields(fields, "customers", Customer.model_fields)
+        
+        stamps = await customer_change_stamps(customer_id)
+        not_modified = await entity_not_modified(
+            request, db.customers, {"id": customer_id, **NOT_DELETED}, *stamps, selected=selected
+        )
+        if not_modified:
+            return not_modified
         
         # Single lookup - no dual strategy
-        customer = await db.customers.find_one({"id": customer_id})
+        customer = await db.customers.find_one(
+            {"id": customer_id, **NOT_DELETED},
+            fields_projection(selected, "version", "updated_at")
+        )
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
+        await overlay_customer_totals([customer])
         
+        set_validators(response, customer, *stamps, selected=selected)
+        if selected:
+            return projected_response(response, customer, selected)
         return Customer(**uuid_processor.clean_response(customer))
         
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -551,28 +1407,49 @@ async def get_customer(customer_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/customers/{customer_id}", response_model=Customer)
-async def update_customer(customer_id: str, customer_data: CustomerUpdate):
-    """Update customer by UUID only - NO ObjectId handling"""
+async def update_customer(
+    customer_id: str,
+    customer_data: CustomerUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
+):
+    """Update customer by UUID only - If-Match makes it conditional on the ETag version"""
     try:
         # Validate UUID format
         if not is_valid_uuid(customer_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
-        
-        # Check if customer exists
-        existing_customer = await db.customers.find_one({"id": customer_id})
-        if not existing_customer:
-            raise HTTPException(status_code=404, detail="Customer not found")
+        expected_version = parse_if_match(if_match)
         
         # Prepare update data
         update_data = customer_data.dict(exclude_unset=True)
+        renamed = "name" in update_data or "phone" in update_data
         if update_data:
             update_data["updated_at"] = datetime.now(timezone.utc)
-            await db.customers.update_one({"id": customer_id}, {"$set": update_data})
+            # Customer and its customer.renamed event are written together
+            async with outbox.transaction() as session:
+                updated_customer = await customers_repo.update(
+                    {"id": customer_id, **NOT_DELETED}, {"$set": update_data},
+                    expected_version=expected_version, session=session
+                )
+                if updated_customer and renamed:
+                    # Transaction search tokens embed name/phone - re-tokenized off the request path
+                    await outbox.record("customer.renamed", {"customer_id": customer_id}, session=session)
+        else:
+            updated_customer = await customers_repo.get({"id": customer_id, **NOT_DELETED}, expected_version=expected_version)
+        
+        # Not found comes from the write result itself
+        if not updated_customer:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        await overlay_customer_totals([updated_customer])
+        
+        if any(field in update_data for field in INDEX_ENTRY_FIELDS):
+            customer_index.upsert(updated_customer)
         
-        # Return updated customer
-        updated_customer = await db.customers.find_one({"id": customer_id})
+        response.headers["ETag"] = document_etag(updated_customer)
         return Customer(**uuid_processor.clean_response(updated_customer))
         
+    except VersionConflict:
+        raise version_conflict_error()
     except HTTPException:
         raise
     except Exception as e:
@@ -581,28 +1458,31 @@ async def update_customer(customer_id: str, customer_data: CustomerUpdate):
 
 @app.delete("/api/customers/{customer_id}")
 async def delete_customer(customer_id: str):
-    """Delete customer by UUID only with cascade deletion"""
+    """Soft delete customer - cards, sales and DAO transactions are purged in the background"""
     try:
         # Validate UUID format
         if not is_valid_uuid(customer_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
         
-        # Check if customer exists
-        customer = await db.customers.find_one({"id": customer_id})
+        # Tombstone immediately - hidden from every customer read from now on
+        now = datetime.now(timezone.utc)
+        customer = await customers_repo.update(
+            {"id": customer_id, **NOT_DELETED},
+            {"$set": {"deleted_at": now, "is_active": False, "updated_at": now}}
+        )
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         
-        # Cascade delete related data - UUID only references
-        await db.credit_cards.delete_many({"customer_id": customer_id})
-        await db.sales.delete_many({"customer_id": customer_id})
-        
-        # Delete customer
-        result = await db.customers.delete_one({"id": customer_id})
+        customer_index.remove(customer_id)
         
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=500, detail="Failed to delete customer")
+        # Cascade delete related data - UUID only references
+        purge_job = await customer_purger.enqueue(customer_id)
         
-        return {"success": True, "message": "Customer deleted successfully"}
+        return {
+            "success": True,
+            "message": "Customer deleted successfully",
+            "purge_job_id": purge_job["id"]
+        }
         
     except HTTPException:
         raise
@@ -610,6 +1490,20 @@ async def delete_customer(customer_id: str):
         logger.error(f"Error deleting customer {customer_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/customers/purge-jobs/{job_id}")
+async def get_customer_purge_job(job_id: str):
+    """Progress of a background customer purge"""
+    try:
+        job = await customer_purger.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Purge job not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching purge job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ========================================
 # BILLS API - UUID ONLY WITH UNIFIED INVENTORY
 # ========================================
@@ -622,13 +1516,8 @@ async def create_bill(bill_data: BillCreate):
         bill_dict = bill_data.dict()
         bill_dict = uuid_processor.prepare_document(bill_dict)
         
-        # Insert to database
-        result = await db.bills.insert_one(bill_dict)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Failed to create bill")
-        
-        # Return clean response
-        created_bill = await db.bills.find_one({"id": bill_dict["id"]})
+        # Insert to database - inserted document is the response
+        created_bill = await bills_repo.insert(bill_dict)
         return Bill(**uuid_processor.clean_response(created_bill))
         
     except DuplicateKeyError:
@@ -639,13 +1528,23 @@ async def create_bill(bill_data: BillCreate):
 
 @app.get("/api/bills", response_model=List[Bill])
 async def get_bills(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
     status: Optional[BillStatus] = None,
-    is_in_inventory: Optional[bool] = None
+    is_in_inventory: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    """Get bills with optional filtering - UUID only"""
+    """Get bills with optional filtering - UUID only, next page cursor in X-Next-Cursor, fields= for a projection"""
     try:
+        not_modified = await list_not_modified(request, response, BILL_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        selected = parse_fields(fields, "bills", Bill.model_fields)
+        
         # Build filter
         filter_dict = {}
         if status:
@@ -653,38 +1552,56 @@ async def get_bills(
         if is_in_inventory is not None:
             filter_dict["is_in_inventory"] = is_in_inventory
         
-        # Query bills
-        cursor = db.bills.find(filter_dict).skip(skip).limit(limit).sort("created_at", -1)
-        bills = await cursor.to_list(length=limit)
+        if wants_ndjson(request):
+            return ndjson_response(response, find_page(
+                db.bills, filter_dict, limit, cursor=cursor, skip=skip,
+                projection=fields_projection(selected, "created_at")
+            ), row_transform(Bill, selected))
         
-        # Clean responses - SPECIAL: Bills use composite IDs, not UUID processing
-        cleaned_bills = []
-        for bill in bills:
-            bill_dict = dict(bill)
-            bill_dict.pop("_id", None)  # Remove ObjectId only
-            cleaned_bills.append(bill_dict)
+        # Query bills
+        bills, next_cursor = await fetch_page(
+            db.bills, filter_dict, limit, cursor=cursor, skip=skip,
+            projection=fields_projection(selected, "created_at")
+        )
+        set_next_cursor(response, next_cursor)
+        if selected:
+            return projected_response(response, bills, selected)
         
-        return [Bill(**bill) for bill in cleaned_bills]
+        return trusted_response(response, bills, Bill)
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching bills: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/bills/{bill_id}", response_model=Bill)
-async def get_bill(bill_id: str):
-    """Get bill by UUID only"""
+async def get_bill(bill_id: str, request: Request, response: Response, fields: Optional[str] = None):
+    """Get bill by UUID only - 304 for a matching If-None-Match/If-Modified-Since"""
     try:
         # Validate composite bill_id format
         if not is_valid_composite_bill_id(bill_id):
             raise HTTPException(status_code=400, detail="Invalid composite bill_id format")
+        selected = parse_fields(fields, "bills", Bill.model_fields)
+        
+        not_modified = await entity_not_modified(request, db.bills, {"id": bill_id}, selected=selected)
+        if not_modified:
+            return not_modified
         
         # Single lookup - no dual strategy
-        bill = await db.bills.find_one({"id": bill_id})
+        bill = await db.bills.find_one({"id": bill_id}, fields_projection(selected, "version", "updated_at"))
         if not bill:
             raise HTTPException(status_code=404, detail="Bill not found")
         
+        set_validators(response, bill, selected=selected)
+        if selected:
+            return projected_response(response, bill, selected)
         return Bill(**uuid_processor.clean_response(bill))
         
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -692,28 +1609,38 @@ async def get_bill(bill_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/bills/{bill_id}", response_model=Bill)
-async def update_bill(bill_id: str, bill_data: BillUpdate):
-    """Update bill by UUID only"""
+async def update_bill(
+    bill_id: str,
+    bill_data: BillUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
+):
+    """Update bill by composite id - If-Match makes it conditional on the ETag version"""
     try:
         # Validate composite bill_id format
         if not is_valid_composite_bill_id(bill_id):
             raise HTTPException(status_code=400, detail="Invalid composite bill_id format")
-        
-        # Check if bill exists
-        existing_bill = await db.bills.find_one({"id": bill_id})
-        if not existing_bill:
-            raise HTTPException(status_code=404, detail="Bill not found")
+        expected_version = parse_if_match(if_match)
         
         # Prepare update data
         update_data = bill_data.dict(exclude_unset=True)
         if update_data:
             update_data["updated_at"] = datetime.now(timezone.utc)
-            await db.bills.update_one({"id": bill_id}, {"$set": update_data})
+            updated_bill = await bills_repo.update(
+                {"id": bill_id}, {"$set": update_data}, expected_version=expected_version
+            )
+        else:
+            updated_bill = await bills_repo.get({"id": bill_id}, expected_version=expected_version)
         
-        # Return updated bill
-        updated_bill = await db.bills.find_one({"id": bill_id})
+        # Not found comes from the write result itself
+        if not updated_bill:
+            raise HTTPException(status_code=404, detail="Bill not found")
+        
+        response.headers["ETag"] = document_etag(updated_bill)
         return Bill(**uuid_processor.clean_response(updated_bill))
         
+    except VersionConflict:
+        raise version_conflict_error()
     except HTTPException:
         raise
     except Exception as e:
@@ -728,24 +1655,19 @@ async def delete_bill(bill_id: str):
         if not is_valid_composite_bill_id(bill_id):
             raise HTTPException(status_code=400, detail="Invalid composite bill_id format")
         
-        # Check if bill exists
-        bill = await db.bills.find_one({"id": bill_id})
-        if not bill:
-            raise HTTPException(status_code=404, detail="Bill not found")
-        
         # Check if bill is referenced in any sales
-        sales_using_bill = await db.sales.find_one({"bill_ids": bill_id})
+        sales_using_bill = await db.sales.find_one({"bill_ids": bill_id}, {"_id": 1})
         if sales_using_bill:
             raise HTTPException(
                 status_code=400,
                 detail="Cannot delete bill - it is referenced in sales transactions"
             )
         
-        # Delete bill
-        result = await db.bills.delete_one({"id": bill_id})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=500, detail="Failed to delete bill")
+        # Delete bill - not found comes from the delete result
+        bill = await bills_repo.delete({"id": bill_id})
+        if not bill:
+            raise HTTPException(status_code=404, detail="Bill not found")
+        await tombstones.record("bills", [bill_id])
         
         return {"success": True, "message": "Bill deleted successfully"}
         
@@ -761,31 +1683,48 @@ async def delete_bill(bill_id: str):
 
 @app.get("/api/inventory", response_model=List[Bill])
 async def get_inventory(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100, 
-    status: Optional[BillStatus] = None
+    status: Optional[BillStatus] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    """Get inventory items (bills marked as in_inventory) - UUID only"""
+    """Get inventory items (bills marked as in_inventory) - UUID only, next page cursor in X-Next-Cursor, fields= for a projection"""
     try:
+        not_modified = await list_not_modified(request, response, BILL_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        selected = parse_fields(fields, "bills", Bill.model_fields)
+        
         # Build filter for inventory items
         filter_dict = {"is_in_inventory": True}
         if status:
             filter_dict["status"] = status
         
-        # Query bills in inventory
-        cursor = db.bills.find(filter_dict).skip(skip).limit(limit).sort("added_to_inventory_at", -1)
-        bills = await cursor.to_list(length=limit)
+        if wants_ndjson(request):
+            return ndjson_response(response, find_page(
+                db.bills, filter_dict, limit, cursor=cursor, skip=skip, sort_field="added_to_inventory_at",
+                projection=fields_projection(selected, "added_to_inventory_at")
+            ), row_transform(Bill, selected))
         
-        # Clean responses - bypass UUID processor for composite bill_ids
-        cleaned_bills = []
-        for bill in bills:
-            # Remove ObjectId _id field if present
-            bill_dict = dict(bill)
-            bill_dict.pop("_id", None)
-            cleaned_bills.append(bill_dict)
+        # Query bills in inventory
+        bills, next_cursor = await fetch_page(
+            db.bills, filter_dict, limit, cursor=cursor, skip=skip, sort_field="added_to_inventory_at",
+            projection=fields_projection(selected, "added_to_inventory_at")
+        )
+        set_next_cursor(response, next_cursor)
+        if selected:
+            return projected_response(response, bills, selected)
         
-        return [Bill(**bill) for bill in cleaned_bills]
+        return trusted_response(response, bills, Bill)
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching inventory: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -798,15 +1737,7 @@ async def add_to_inventory(bill_id: str, note: Optional[str] = None):
         if not is_valid_composite_bill_id(bill_id):
             raise HTTPException(status_code=400, detail="Invalid composite bill_id format")
         
-        # Check if bill exists and is available
-        bill = await db.bills.find_one({"id": bill_id})
-        if not bill:
-            raise HTTPException(status_code=404, detail="Bill not found")
-        
-        if bill.get("is_in_inventory"):
-            raise HTTPException(status_code=400, detail="Bill already in inventory")
-        
-        # Add to inventory
+        # Add to inventory - conditional on not already being there
         update_data = {
             "is_in_inventory": True,
             "inventory_status": InventoryStatus.IN_INVENTORY,
@@ -815,7 +1746,14 @@ async def add_to_inventory(bill_id: str, note: Optional[str] = None):
             "updated_at": datetime.now(timezone.utc)
         }
         
-        await db.bills.update_one({"id": bill_id}, {"$set": update_data})
+        updated_bill = await bills_repo.update(
+            {"id": bill_id, "is_in_inventory": {"$ne": True}}, {"$set": update_data}
+        )
+        if not updated_bill:
+            # Failure path only: tell missing apart from already-in-inventory
+            if not await db.bills.find_one({"id": bill_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Bill not found")
+            raise HTTPException(status_code=400, detail="Bill already in inventory")
         
         return {"success": True, "message": "Bill added to inventory successfully"}
         
@@ -833,15 +1771,7 @@ async def remove_from_inventory(bill_id: str):
         if not is_valid_composite_bill_id(bill_id):
             raise HTTPException(status_code=400, detail="Invalid composite bill_id format")
         
-        # Check if bill exists and is in inventory
-        bill = await db.bills.find_one({"id": bill_id})
-        if not bill:
-            raise HTTPException(status_code=404, detail="Bill not found")
-        
-        if not bill.get("is_in_inventory"):
-            raise HTTPException(status_code=400, detail="Bill not in inventory")
-        
-        # Remove from inventory
+        # Remove from inventory - conditional on being there
         update_data = {
             "is_in_inventory": False,
             "inventory_status": InventoryStatus.NOT_IN_INVENTORY,
@@ -850,7 +1780,14 @@ async def remove_from_inventory(bill_id: str):
             "updated_at": datetime.now(timezone.utc)
         }
         
-        await db.bills.update_one({"id": bill_id}, {"$set": update_data})
+        updated_bill = await bills_repo.update(
+            {"id": bill_id, "is_in_inventory": True}, {"$set": update_data}
+        )
+        if not updated_bill:
+            # Failure path only: tell missing apart from not-in-inventory
+            if not await db.bills.find_one({"id": bill_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Bill not found")
+            raise HTTPException(status_code=400, detail="Bill not in inventory")
         
         return {"success": True, "message": "Bill removed from inventory successfully"}
         
@@ -860,9 +1797,11 @@ async def remove_from_inventory(bill_id: str):
         logger.error(f"Error removing bill {bill_id} from inventory: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+INVENTORY_INTAKE_CHUNK_SIZE = 1000  # Ids per $in query / update_many
+
 @app.post("/api/inventory/add")
 async def add_bills_to_inventory(request_data: dict):
-    """Add multiple bills to inventory - UUID only"""
+    """Add multiple bills to inventory - one prefetch + one update_many per chunk"""
     try:
         bill_ids = request_data.get("bill_ids", [])
         note = request_data.get("note", "")
@@ -873,68 +1812,247 @@ async def add_bills_to_inventory(request_data: dict):
         
         added_count = 0
         errors = []
+        skipped = []  # {bill_id, reason} per bill not added
+        
+        def skip(bill_id, reason: str, message: str):
+            skipped.append({"bill_id": bill_id, "reason": reason})
+            errors.append(f"{message}: {bill_id}")
         
+        # Validate composite bill_id format in memory
+        valid_ids = []
         for bill_id in bill_ids:
-            try:
-                # Validate composite bill_id format
-                if not is_valid_composite_bill_id(bill_id):
-                    errors.append(f"Invalid composite bill_id format: {bill_id}")
-                    continue
-                
-                # Check if bill exists
-                bill = await db.bills.find_one({"id": bill_id})
-                if not bill:
-                    errors.append(f"Bill not found: {bill_id}")
-                    continue
-                
-                if bill.get("is_in_inventory"):
-                    errors.append(f"Bill already in inventory: {bill_id}")
-                    continue
-                
-                # Add to inventory
-                await db.bills.update_one(
-                    {"id": bill_id},
-                    {"$set": {
+            if not isinstance(bill_id, str) or not is_valid_composite_bill_id(bill_id):
+                skip(bill_id, "INVALID_ID", "Invalid composite bill_id format")
+            else:
+                valid_ids.append(bill_id)
+        
+        # Prefetch existing bills - projection only, one $in query per chunk
+        existing = {}
+        for start in range(0, len(valid_ids), INVENTORY_INTAKE_CHUNK_SIZE):
+            chunk = valid_ids[start:start + INVENTORY_INTAKE_CHUNK_SIZE]
+            async for bill in db.bills.find(
+                {"id": {"$in": chunk}}, {"_id": 0, "id": 1, "is_in_inventory": 1}
+            ):
+                existing[bill["id"]] = bill
+        
+        # Classify missing / already in inventory / to add
+        to_add = []
+        queued = set()
+        for bill_id in valid_ids:
+            bill = existing.get(bill_id)
+            if not bill:
+                skip(bill_id, "NOT_FOUND", "Bill not found")
+            elif bill.get("is_in_inventory") or bill_id in queued:
+                skip(bill_id, "ALREADY_IN_INVENTORY", "Bill already in inventory")
+            else:
+                to_add.append(bill_id)
+                queued.add(bill_id)
+        
+        # Add to inventory - conditional update_many per chunk, tagged so a shortfall can be traced per bill
+        now = datetime.now(timezone.utc)
+        intake_id = generate_uuid()
+        for start in range(0, len(to_add), INVENTORY_INTAKE_CHUNK_SIZE):
+            chunk = to_add[start:start + INVENTORY_INTAKE_CHUNK_SIZE]
+            result = await db.bills.update_many(
+                {"id": {"$in": chunk}, "is_in_inventory": {"$ne": True}},
+                {
+                    "$set": {
                         "is_in_inventory": True,
                         "inventory_status": "IN_INVENTORY",
-                        "added_to_inventory_at": datetime.now(timezone.utc),
+                        "added_to_inventory_at": now,
                         "inventory_note": note,
-                        "batch_name": batch_name
-                    }}
-                )
-                added_count += 1
-                
-            except Exception as e:
-                errors.append(f"Error processing {bill_id}: {str(e)}")
+                        "batch_name": batch_name,
+                        "inventory_intake_id": intake_id,
+                        "updated_at": now
+                    },
+                    "$inc": {"version": 1}
+                }
+            )
+            added_count += result.modified_count
+            if result.modified_count < len(chunk):
+                # Changed between prefetch and update - only the shortfall path pays for this read
+                current = {
+                    bill["id"]: bill
+                    async for bill in db.bills.find(
+                        {"id": {"$in": chunk}}, {"_id": 0, "id": 1, "inventory_intake_id": 1}
+                    )
+                }
+                for bill_id in chunk:
+                    bill = current.get(bill_id)
+                    if not bill:
+                        skip(bill_id, "DELETED_CONCURRENTLY", "Bill deleted concurrently")
+                    elif bill.get("inventory_intake_id") != intake_id:
+                        skip(bill_id, "ADDED_CONCURRENTLY", "Bill added to inventory concurrently")
         
         return {
             "success": True,
             "message": f"Added {added_count} bills to inventory",
             "added_count": added_count,
+            "skipped": skipped,
             "errors": errors
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error adding bills to inventory: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ========================================
+# BULK MUTATION API - FILTERED SERVER-SIDE UPDATES
+# ========================================
+
+def date_range_filter(field: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Inclusive date range on one field - empty when neither bound is set"""
+    bounds = {}
+    if start:
+        bounds["$gte"] = start
+    if end:
+        bounds["$lte"] = end
+    return {field: bounds} if bounds else {}
+
+async def run_bulk_mutation(collection, query: dict, update: dict, mutation, description: dict) -> dict:
+    """Dry-run count, or start the chunked update as a background job - shared by the bulk endpoints"""
+    if mutation.dry_run:
+        return await bulk_mutator.dry_run(collection, query, mutation.max_documents)
+    try:
+        job = await bulk_mutator.submit(collection, query, update, mutation.max_documents, description)
+    except BulkLimitExceeded as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Filter matches {e.matched} documents, more than max_documents={e.cap} - narrow the filter or raise the cap"
+        )
+    # Runs in the background - progress at GET /api/bulk-jobs/{job_id}
+    return {"success": True, "dry_run": False, "job_id": job["id"], "status": job["status"], "job": job}
+
+@app.post("/api/bills/bulk-update")
+async def bulk_update_bills(mutation: BulkBillMutation):
+    """Set status / remove from inventory for every bill matching a filter"""
+    try:
+        criteria = mutation.filter.dict(exclude_none=True, exclude={"created_from", "created_to"})
+        query = {
+            **criteria,
+            **date_range_filter("created_at", mutation.filter.created_from, mutation.filter.created_to)
+        }
+        if not query:
+            raise HTTPException(status_code=400, detail="At least one filter criterion is required")
+        
+        now = datetime.now(timezone.utc)
+        if mutation.action == BulkBillAction.SET_STATUS:
+            if not mutation.status:
+                raise HTTPException(status_code=400, detail="status is required for SET_STATUS")
+            if mutation.status == BillStatus.SOLD:
+                raise HTTPException(status_code=400, detail="Bills can only become SOLD through a sale")
+            # Sold bills belong to a sale - never re-status them in bulk
+            if query.get("status") == BillStatus.SOLD:
+                raise HTTPException(status_code=400, detail="Sold bills cannot be bulk updated")
+            query.setdefault("status", {"$ne": BillStatus.SOLD})
+            query = {"$and": [query, {"status": {"$ne": mutation.status}}]}
+            update = {"$set": {"status": mutation.status, "updated_at": now}}
+        else:
+            if mutation.filter.is_in_inventory is False:
+                raise HTTPException(status_code=400, detail="Filter excludes inventory bills")
+            query["is_in_inventory"] = True
+            update = {"$set": {
+                "is_in_inventory": False,
+                "inventory_status": InventoryStatus.NOT_IN_INVENTORY,
+                "added_to_inventory_at": None,
+                "inventory_note": None,
+                "updated_at": now
+            }}
+        update["$inc"] = {"version": 1}
+        
+        return await run_bulk_mutation(
+            db.bills, query, update, mutation,
+            {"action": mutation.action, "status": mutation.status, "filter": criteria}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk updating bills: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/customers/bulk-update")
+async def bulk_update_customers(mutation: BulkCustomerMutation):
+    """Activate / deactivate every customer matching a filter"""
+    try:
+        criteria = mutation.filter.dict(
+            exclude_none=True, exclude={"created_from", "created_to", "updated_before"}
+        )
+        query = {
+            **criteria,
+            **date_range_filter("created_at", mutation.filter.created_from, mutation.filter.created_to),
+            **date_range_filter("updated_at", None, mutation.filter.updated_before)
+        }
+        if not query:
+            raise HTTPException(status_code=400, detail="At least one filter criterion is required")
+        
+        is_active = mutation.action == BulkCustomerAction.ACTIVATE
+        query = {"$and": [query, {"is_active": {"$ne": is_active}}, NOT_DELETED]}
+        update = {
+            "$set": {"is_active": is_active, "updated_at": datetime.now(timezone.utc)},
+            "$inc": {"version": 1}
+        }
+        
+        return await run_bulk_mutation(
+            db.customers, query, update, mutation,
+            {"action": mutation.action, "filter": criteria}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk updating customers: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/bulk-jobs/{job_id}")
+async def get_bulk_job(job_id: str):
+    """Progress of a bulk mutation"""
+    try:
+        job = await bulk_mutator.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Bulk job not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching bulk job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ========================================
 # SALES API - UUID ONLY
 # ========================================
 
 @app.post("/api/sales", response_model=Sale)
-async def create_sale(sale_data: SaleCreate):
+async def create_sale(
+    sale_data: SaleCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
+):
+    """Create sale transaction - retries with the same Idempotency-Key replay the first response"""
+    return await idempotency_store.execute(
+        idempotency_key, "sales", sale_data.dict(), lambda: _create_sale(sale_data)
+    )
+
+async def _create_sale(sale_data: SaleCreate):
     """Create sale transaction - UUID only system"""
     try:
         # Validate customer exists
-        customer = await db.customers.find_one({"id": sale_data.customer_id})
+        customer = await db.customers.find_one(
+            {"id": sale_data.customer_id, **NOT_DELETED}, {"_id": 0, "name": 1, "phone": 1}
+        )
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         
-        # Validate bills exist and are available
+        # Validate bills exist and are available - one $in query for all bills
+        available_bills = await db.bills.find(
+            {"id": {"$in": sale_data.bill_ids}, "status": BillStatus.AVAILABLE},
+            {"_id": 0, "id": 1, "amount": 1}
+        ).to_list(None)
+        bills_by_id = {bill["id"]: bill for bill in available_bills}
         bills = []
         for bill_id in sale_data.bill_ids:
-            bill = await db.bills.find_one({"id": bill_id, "status": BillStatus.AVAILABLE})
+            bill = bills_by_id.get(bill_id)
             if not bill:
                 raise HTTPException(
                     status_code=404, 
@@ -957,35 +2075,36 @@ async def create_sale(sale_data: SaleCreate):
             "status": "COMPLETED"
         })
         sale_dict = uuid_processor.prepare_document(sale_dict)
+        sale_dict[SEARCH_TOKENS_FIELD] = sale_tokens(sale_dict, customer)
         
-        # Create sale
-        result = await db.sales.insert_one(sale_dict)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Failed to create sale")
-        
-        # Update bills to SOLD status
-        await db.bills.update_many(
-            {"id": {"$in": sale_data.bill_ids}},
-            {"$set": {
-                "status": BillStatus.SOLD,
-                "is_in_inventory": False,
-                "inventory_status": InventoryStatus.SOLD_FROM_INVENTORY,
-                "updated_at": datetime.now(timezone.utc)
-            }}
-        )
-        
-        # Update customer stats
-        await db.customers.update_one(
-            {"id": sale_data.customer_id},
-            {"$inc": {
-                "total_transactions": 1,
-                "total_spent": total,
-                "total_profit_generated": profit_value
-            }}
-        )
-        
-        # Return created sale
-        created_sale = await db.sales.find_one({"id": sale_dict["id"]})
+        # Sale, SOLD bills and the outbox event are written together
+        async with outbox.transaction() as session:
+            # Create sale
+            created_sale = await sales_repo.insert(sale_dict, session=session)
+            
+            # Update bills to SOLD status
+            await db.bills.update_many(
+                {"id": {"$in": sale_data.bill_ids}},
+                {"$set": {
+                    "status": BillStatus.SOLD,
+                    "is_in_inventory": False,
+                    "inventory_status": InventoryStatus.SOLD_FROM_INVENTORY,
+                    "updated_at": datetime.now(timezone.utc)
+                }, "$inc": {"version": 1}},
+                session=session
+            )
+            
+            # Customer stats + activity feed are applied by the outbox processor
+            await outbox.record("sale.created", {
+                "sale_id": sale_dict["id"],
+                "customer_id": sale_data.customer_id,
+                "total": total,
+                "profit_value": profit_value,
+                "bill_ids": sale_data.bill_ids,
+                "created_at": sale_dict["created_at"]
+            }, session=session)
+        
+        # Return created sale - inserted document is the response
         return Sale(**uuid_processor.clean_response(created_sale))
         
     except HTTPException:
@@ -995,24 +2114,49 @@ async def create_sale(sale_data: SaleCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sales", response_model=List[Sale])
-async def get_sales(skip: int = 0, limit: int = 100, customer_id: Optional[str] = None):
-    """Get sales transactions - UUID only"""
+async def get_sales(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    customer_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get sales transactions - UUID only, next page cursor in X-Next-Cursor, fields= for a projection"""
     try:
-        # Build filter
-        filter_dict = {}
+        not_modified = await list_not_modified(request, response, SALE_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        selected = parse_fields(fields, "sales", Sale.model_fields)
+        
+        # Build filter - a deleted customer's sales are hidden until the purge removes them
+        filter_dict = dict(NOT_DELETED)
         if customer_id:
             if not is_valid_uuid(customer_id):
                 raise HTTPException(status_code=400, detail="Invalid customer UUID format")
             filter_dict["customer_id"] = customer_id
         
+        if wants_ndjson(request):
+            return ndjson_response(response, find_page(
+                db.sales, filter_dict, limit, cursor=cursor, skip=skip,
+                projection=fields_projection(selected, "created_at")
+            ), row_transform(Sale, selected))
+        
         # Query sales
-        cursor = db.sales.find(filter_dict).skip(skip).limit(limit).sort("created_at", -1)
-        sales = await cursor.to_list(length=limit)
+        sales, next_cursor = await fetch_page(
+            db.sales, filter_dict, limit, cursor=cursor, skip=skip,
+            projection=fields_projection(selected, "created_at")
+        )
+        set_next_cursor(response, next_cursor)
+        if selected:
+            return projected_response(response, sales, selected)
         
-        # Clean responses
-        cleaned_sales = [uuid_processor.clean_response(sale) for sale in sales]
-        return [Sale(**sale) for sale in cleaned_sales]
+        return trusted_response(response, sales, Sale)
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -1020,20 +2164,30 @@ async def get_sales(skip: int = 0, limit: int = 100, customer_id: Optional[str]
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sales/{sale_id}", response_model=Sale)
-async def get_sale(sale_id: str):
-    """Get sale by UUID only"""
+async def get_sale(sale_id: str, request: Request, response: Response, fields: Optional[str] = None):
+    """Get sale by UUID only - 304 for a matching If-None-Match/If-Modified-Since"""
     try:
         # Validate UUID format
         if not is_valid_uuid(sale_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
+        selected = parse_fields(fields, "sales", Sale.model_fields)
+        
+        not_modified = await entity_not_modified(request, db.sales, {"id": sale_id, **NOT_DELETED}, selected=selected)
+        if not_modified:
+            return not_modified
         
         # Single lookup
-        sale = await db.sales.find_one({"id": sale_id})
+        sale = await db.sales.find_one({"id": sale_id, **NOT_DELETED}, fields_projection(selected, "updated_at"))
         if not sale:
             raise HTTPException(status_code=404, detail="Sale not found")
         
+        set_validators(response, sale, selected=selected)
+        if selected:
+            return projected_response(response, sale, selected)
         return Sale(**uuid_processor.clean_response(sale))
         
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -1045,12 +2199,16 @@ async def get_sale(sale_id: str):
 # ========================================
 
 @app.get("/api/stats/dashboard")
-async def get_dashboard_stats():
-    """Get dashboard statistics - UUID only system"""
+async def get_dashboard_stats(request: Request, response: Response):
+    """Get dashboard statistics - UUID only system, 304 while nothing changed"""
     try:
+        not_modified = await list_not_modified(request, response, DASHBOARD_MARKERS)
+        if not_modified:
+            return not_modified
+        
         # Customer stats
-        total_customers = await db.customers.count_documents({})
-        active_customers = await db.customers.count_documents({"is_active": True})
+        total_customers = await db.customers.count_documents(NOT_DELETED)
+        active_customers = await db.customers.count_documents({"is_active": True, **NOT_DELETED})
         
         # Bill stats
         total_bills = await db.bills.count_documents({})
@@ -1058,11 +2216,12 @@ async def get_dashboard_stats():
         inventory_bills = await db.bills.count_documents({"is_in_inventory": True})
         sold_bills = await db.bills.count_documents({"status": BillStatus.SOLD})
         
-        # Sales stats
-        total_sales = await db.sales.count_documents({})
+        # Sales stats - sales hidden with a deleted customer are left out, as in the lists
+        total_sales = await db.sales.count_documents(NOT_DELETED)
         
         # Calculate revenue and profit
         sales_pipeline = [
+            {"$match": NOT_DELETED},
             {"$group": {
                 "_id": None,
                 "total_revenue": {"$sum": "$total"},
@@ -1141,11 +2300,8 @@ async def login_user(login_data: UserLogin):
                 detail="Account is deactivated"
             )
         
-        # Update last login
-        await db.users.update_one(
-            {"username": user["username"]},
-            {"$set": {"last_login": datetime.now(timezone.utc)}}
-        )
+        # Update last login - buffered, flushed in bulk by the write-behind worker
+        touch_buffer.touch("users", user["username"], {"last_login": datetime.now(timezone.utc)}, key_field="username")
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -1237,16 +2393,20 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(H
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/dashboard/stats") 
-async def get_dashboard_stats_redirect():
+async def get_dashboard_stats_redirect(request: Request, response: Response):
     """Redirect old dashboard stats endpoint to new one"""
-    return await get_dashboard_stats()
+    return await get_dashboard_stats(request, response)
 
 @app.get("/api/credit-cards/stats")
-async def get_credit_cards_stats():
+async def get_credit_cards_stats(request: Request, response: Response):
     """Credit cards stats for dashboard (placeholder)"""
     try:
-        total_cards = await db.credit_cards.count_documents({})
-        active_cards = await db.credit_cards.count_documents({"status": {"$ne": "Hết hạn"}})
+        not_modified = await list_not_modified(request, response, CARD_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        total_cards = await db.credit_cards.count_documents(NOT_DELETED)
+        active_cards = await db.credit_cards.count_documents({"status": {"$ne": "Hết hạn"}, **NOT_DELETED})
         
         return {
             "total": total_cards,
@@ -1260,27 +2420,45 @@ async def get_credit_cards_stats():
 
 @app.get("/api/credit-cards", response_model=List[CreditCard])
 async def get_credit_cards(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
-    page_size: int = Query(100, alias="page_size")
+    page_size: int = Query(100, alias="page_size"),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    """Get all credit cards - UUID only responses"""
+    """Get all credit cards - UUID only responses, next page cursor in X-Next-Cursor, fields= for a projection"""
     try:
+        not_modified = await list_not_modified(request, response, CARD_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        selected = parse_fields(fields, "credit_cards", CreditCard.model_fields)
+
         # Use page_size if provided, otherwise use limit
         actual_limit = page_size if page_size != 100 or limit == 100 else limit
         
-        cursor = db.credit_cards.find({}).skip(skip).limit(actual_limit).sort("created_at", -1)
-        credit_cards = await cursor.to_list(length=actual_limit)
+        if wants_ndjson(request):
+            return ndjson_response(response, find_page(
+                db.credit_cards, NOT_DELETED, actual_limit, cursor=cursor, skip=skip,
+                projection=fields_projection(selected, "created_at")
+            ), row_transform(CreditCard, selected))
         
-        # Clean responses - UUID only system
-        cleaned_cards = []
-        for card in credit_cards:
-            card_dict = dict(card)
-            card_dict.pop("_id", None)  # Remove ObjectId
-            cleaned_cards.append(card_dict)
+        credit_cards, next_cursor = await fetch_page(
+            db.credit_cards, NOT_DELETED, actual_limit, cursor=cursor, skip=skip,
+            projection=fields_projection(selected, "created_at")
+        )
+        set_next_cursor(response, next_cursor)
+        if selected:
+            return projected_response(response, credit_cards, selected)
         
-        return [CreditCard(**card) for card in cleaned_cards]
+        return trusted_response(response, credit_cards, CreditCard)
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching credit cards: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1290,7 +2468,7 @@ async def create_credit_card(card_data: CreditCardCreate):
     """Create credit card with UUID only"""
     try:
         # Validate customer exists
-        customer = await db.customers.find_one({"id": card_data.customer_id})
+        customer = await db.customers.find_one({"id": card_data.customer_id, **NOT_DELETED}, {"_id": 0, "name": 1})
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         
@@ -1300,23 +2478,20 @@ async def create_credit_card(card_data: CreditCardCreate):
         
         # Add customer name for denormalization
         card_dict["customer_name"] = customer.get("name")
+        card_dict["card_last4"] = card_last4(card_dict.get("card_number"))
         
-        # Insert to database
-        result = await db.credit_cards.insert_one(card_dict)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Failed to create credit card")
+        # Credit accounting starts from the full limit
+        if card_dict.get("available_credit") is None:
+            card_dict["available_credit"] = card_dict["credit_limit"]
         
-        # Update customer total cards count
-        await db.customers.update_one(
-            {"id": card_data.customer_id},
-            {"$inc": {"total_cards": 1}}
-        )
+        # Insert to database - inserted document is the response
+        # Card and its customer.cards_changed event are written together
+        async with outbox.transaction() as session:
+            created_card = await credit_cards_repo.insert(card_dict, session=session)
+            # Customer total_cards is recounted into customer_summaries off the request path
+            await outbox.record("customer.cards_changed", {"customer_id": card_data.customer_id}, session=session)
         
-        # Return clean response
-        created_card = await db.credit_cards.find_one({"id": card_dict["id"]})
-        card_response = dict(created_card)
-        card_response.pop("_id", None)
-        return CreditCard(**card_response)
+        return CreditCard(**created_card)
         
     except HTTPException:
         raise
@@ -1324,36 +2499,58 @@ async def create_credit_card(card_data: CreditCardCreate):
         logger.error(f"Error creating credit card: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def card_transaction_summary(card_id: str) -> dict:
+    """Lifetime DAO totals for a card - one $group over the (credit_card_id, created_at) index"""
+    groups = await db.dao_transactions.aggregate([
+        {"$match": {"credit_card_id": card_id}},
+        {"$group": {
+            "_id": None,
+            "total_transactions": {"$sum": 1},
+            "total_amount": {"$sum": {"$ifNull": ["$amount", 0]}},
+            "total_profit": {"$sum": {"$ifNull": ["$profit_value", 0]}},
+            "last_transaction_at": {"$max": "$created_at"}
+        }},
+        {"$project": {"_id": 0}}
+    ]).to_list(1)
+    return groups[0] if groups else {
+        "total_transactions": 0,
+        "total_amount": 0,
+        "total_profit": 0,
+        "last_transaction_at": None
+    }
+
+async def card_transaction_page(card_id: str, limit: int, cursor: Optional[str], skip: int = 0):
+    """Newest-first DAO history page for a card plus the next cursor"""
+    return await fetch_page(
+        db.dao_transactions, {"credit_card_id": card_id}, limit, cursor=cursor, skip=skip,
+        projection={"_id": 0, SEARCH_TOKENS_FIELD: 0}
+    )
+
 @app.get("/api/credit-cards/{card_id}/detail")
-async def get_credit_card_detail(card_id: str):
-    """Get credit card detail with transactions - UUID only"""
+async def get_credit_card_detail(
+    card_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """Get credit card detail with transactions - UUID only, older history via X-Next-Cursor"""
     try:
         # Validate UUID format
         if not is_valid_uuid(card_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
         
         # Get credit card
-        card = await db.credit_cards.find_one({"id": card_id})
+        card = await db.credit_cards.find_one({"id": card_id, **NOT_DELETED})
         if not card:
             raise HTTPException(status_code=404, detail="Credit card not found")
         
-        # Get customer info
-        customer = await db.customers.find_one({"id": card.get("customer_id")})
-        
-        # Get DAO transactions for this credit card - UUID only
-        dao_transactions = await db.dao_transactions.find({"credit_card_id": card_id}).to_list(100)
-        
-        # Clean DAO transactions - remove ObjectId
-        cleaned_transactions = []
-        for dao in dao_transactions:
-            dao_dict = dict(dao)
-            dao_dict.pop("_id", None)  # Remove ObjectId
-            cleaned_transactions.append(dao_dict)
-        
-        # Calculate summary
-        total_transactions = len(cleaned_transactions)
-        total_amount = sum(dao.get("amount", 0) for dao in cleaned_transactions)
-        total_profit = sum(dao.get("profit_value", 0) for dao in cleaned_transactions)
+        # Customer, first history page and lifetime summary are independent reads
+        customer, (transactions, next_cursor), summary = await asyncio.gather(
+            db.customers.find_one({"id": card.get("customer_id"), **NOT_DELETED}),
+            card_transaction_page(card_id, limit, cursor),
+            card_transaction_summary(card_id)
+        )
+        set_next_cursor(response, next_cursor)
         
         # Clean card response
         card_dict = dict(card)
@@ -1367,68 +2564,145 @@ async def get_credit_card_detail(card_id: str):
             "success": True,
             "credit_card": card_dict,
             "customer": customer_dict,
-            "transactions": cleaned_transactions,  # DAO transactions
-            "summary": {
-                "total_transactions": total_transactions,
-                "total_amount": total_amount,
-                "total_profit": total_profit
-            }
+            "transactions": transactions,  # DAO transactions, newest first
+            "summary": summary
         }
         
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching credit card detail {card_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/credit-cards/{card_id}/transactions")
+async def get_credit_card_transactions(
+    card_id: str,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """Paginated DAO history for a card - newest first, next page cursor in X-Next-Cursor"""
+    try:
+        if not is_valid_uuid(card_id):
+            raise HTTPException(status_code=400, detail="Invalid UUID format")
+        if not await db.credit_cards.find_one({"id": card_id, **NOT_DELETED}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Credit card not found")
+        
+        transactions, next_cursor = await card_transaction_page(card_id, limit, cursor, skip=skip)
+        set_next_cursor(response, next_cursor)
+        return transactions
+        
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching credit card transactions {card_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/credit-cards/{card_id}", response_model=CreditCard)
-async def get_credit_card(card_id: str):
-    """Get credit card by UUID only"""
+async def get_credit_card(card_id: str, request: Request, response: Response, fields: Optional[str] = None):
+    """Get credit card by UUID only - 304 for a matching If-None-Match/If-Modified-Since"""
     try:
         # Validate UUID format
         if not is_valid_uuid(card_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
+        selected = parse_fields(fields, "credit_cards", CreditCard.model_fields)
+        
+        not_modified = await entity_not_modified(
+            request, db.credit_cards, {"id": card_id, **NOT_DELETED}, selected=selected
+        )
+        if not_modified:
+            return not_modified
         
         # Single lookup - no dual strategy
-        card = await db.credit_cards.find_one({"id": card_id})
+        card = await db.credit_cards.find_one({"id": card_id, **NOT_DELETED}, fields_projection(selected, "version", "updated_at"))
         if not card:
             raise HTTPException(status_code=404, detail="Credit card not found")
         
         card_dict = dict(card)
         card_dict.pop("_id", None)
+        set_validators(response, card_dict, selected=selected)
+        if selected:
+            return projected_response(response, card_dict, selected)
         return CreditCard(**card_dict)
         
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching credit card {card_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+CREDIT_LIMIT_UPDATE_ATTEMPTS = 3
+
+async def update_credit_limit(card_id: str, update_data: dict, expected_version: Optional[int]) -> Optional[dict]:
+    """Card update that changes credit_limit - available_credit moves by the same delta
+
+    Applied against the version just read; a concurrent DAO or edit makes it retry (or 412 under If-Match).
+    """
+    for _ in range(CREDIT_LIMIT_UPDATE_ATTEMPTS):
+        current = await db.credit_cards.find_one({"id": card_id}, {"_id": 0, "credit_limit": 1, "version": 1})
+        if not current:
+            return None
+        version = current.get("version") or 0
+        if expected_version is not None and version != expected_version:
+            raise VersionConflict(f"Expected version {expected_version}")
+        delta = update_data["credit_limit"] - (current.get("credit_limit") or 0)
+        try:
+            updated_card = await credit_cards_repo.update(
+                {"id": card_id},
+                {"$set": update_data, "$inc": {"available_credit": delta}},
+                expected_version=version
+            )
+        except VersionConflict:
+            continue
+        if updated_card:
+            return updated_card
+    raise HTTPException(status_code=409, detail="Credit card is being modified concurrently, retry")
+
 @app.put("/api/credit-cards/{card_id}", response_model=CreditCard)
-async def update_credit_card(card_id: str, card_data: CreditCardUpdate):
-    """Update credit card by UUID only"""
+async def update_credit_card(
+    card_id: str,
+    card_data: CreditCardUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match")
+):
+    """Update credit card by UUID only - If-Match makes it conditional on the ETag version"""
     try:
         # Validate UUID format
         if not is_valid_uuid(card_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
-        
-        # Check if card exists
-        existing_card = await db.credit_cards.find_one({"id": card_id})
-        if not existing_card:
-            raise HTTPException(status_code=404, detail="Credit card not found")
+        expected_version = parse_if_match(if_match)
         
         # Prepare update data
         update_data = card_data.dict(exclude_unset=True)
         if update_data:
             update_data["updated_at"] = datetime.now(timezone.utc)
-            await db.credit_cards.update_one({"id": card_id}, {"$set": update_data})
+            if "card_number" in update_data:
+                update_data["card_last4"] = card_last4(update_data["card_number"])
+            if "credit_limit" in update_data:
+                updated_card = await update_credit_limit(card_id, update_data, expected_version)
+            else:
+                updated_card = await credit_cards_repo.update(
+                    {"id": card_id}, {"$set": update_data}, expected_version=expected_version
+                )
+        else:
+            updated_card = await credit_cards_repo.get({"id": card_id}, expected_version=expected_version)
         
-        # Return updated card
-        updated_card = await db.credit_cards.find_one({"id": card_id})
-        card_dict = dict(updated_card)
-        card_dict.pop("_id", None)
-        return CreditCard(**card_dict)
+        # Not found comes from the write result itself
+        if not updated_card:
+            raise HTTPException(status_code=404, detail="Credit card not found")
         
+        response.headers["ETag"] = document_etag(updated_card)
+        return CreditCard(**updated_card)
+        
+    except VersionConflict:
+        raise version_conflict_error()
     except HTTPException:
         raise
     except Exception as e:
@@ -1443,33 +2717,88 @@ async def delete_credit_card(card_id: str):
         if not is_valid_uuid(card_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
         
-        # Check if card exists
-        card = await db.credit_cards.find_one({"id": card_id})
+        # Delete card - not found comes from the delete result
+        async with outbox.transaction() as session:
+            card = await credit_cards_repo.delete({"id": card_id}, session=session)
+            if card:
+                # Customer total_cards is recounted into customer_summaries off the request path
+                await outbox.record("customer.cards_changed", {"customer_id": card.get("customer_id")}, session=session)
         if not card:
             raise HTTPException(status_code=404, detail="Credit card not found")
+        await tombstones.record("credit_cards", [card_id])
         
-        # Delete card
-        result = await db.credit_cards.delete_one({"id": card_id})
+        return {"success": True, "message": "Credit card deleted successfully"}
         
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=500, detail="Failed to delete credit card")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting credit card {card_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/credit-cards/{card_id}/payments")
+async def record_card_payment(
+    card_id: str,
+    payment: CardPaymentRequest,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
+):
+    """Payment on the card balance - available credit goes back up, capped at the credit limit"""
+    return await idempotency_store.execute(
+        idempotency_key,
+        "card_payment",
+        {"card_id": card_id, "amount": payment.amount},
+        lambda: _record_card_payment(card_id, payment.amount)
+    )
+
+async def _record_card_payment(card_id: str, amount: float):
+    try:
+        if not is_valid_uuid(card_id):
+            raise HTTPException(status_code=400, detail="Invalid UUID format")
         
-        # Update customer total cards count
-        await db.customers.update_one(
-            {"id": card.get("customer_id")},
-            {"$inc": {"total_cards": -1}}
+        # One atomic pipeline update - concurrent DAOs and payments compose
+        card = await db.credit_cards.find_one_and_update(
+            {"id": card_id, **NOT_DELETED},
+            [{"$set": {
+                "available_credit": {"$min": [
+                    {"$ifNull": ["$credit_limit", 0]},
+                    {"$add": [{"$ifNull": ["$available_credit", 0]}, amount]}
+                ]},
+                "last_payment_date": datetime.now(timezone.utc),
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                "updated_at": datetime.now(timezone.utc)
+            }}],
+            projection={"_id": 0, "available_credit": 1, "credit_limit": 1},
+            return_document=ReturnDocument.AFTER
         )
+        if not card:
+            raise HTTPException(status_code=404, detail="Credit card not found")
         
-        return {"success": True, "message": "Credit card deleted successfully"}
+        return {
+            "success": True,
+            "available_credit": card["available_credit"],
+            "credit_limit": card.get("credit_limit")
+        }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting credit card {card_id}: {e}")
+        logger.error(f"Error recording payment for card {card_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/credit-cards/{card_id}/dao")
-async def dao_credit_card_by_id(card_id: str, dao_data: dict):
+async def dao_credit_card_by_id(
+    card_id: str,
+    dao_data: dict,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
+):
+    """DAO transaction by card ID - retries with the same Idempotency-Key replay the first response"""
+    return await idempotency_store.execute(
+        idempotency_key,
+        "card_dao",
+        {"card_id": card_id, **dao_data},
+        lambda: _dao_credit_card_by_id(card_id, dao_data)
+    )
+
+async def _dao_credit_card_by_id(card_id: str, dao_data: dict):
     """DAO (Credit Card Advance) transaction by specific card ID - UUID only"""
     try:
         # Validate UUID format
@@ -1477,15 +2806,19 @@ async def dao_credit_card_by_id(card_id: str, dao_data: dict):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
         
         # Get credit card info
-        card = await db.credit_cards.find_one({"id": card_id})
+        card = await db.credit_cards.find_one({"id": card_id, **NOT_DELETED})
         if not card:
             raise HTTPException(status_code=404, detail="Credit card not found")
         
         # Get customer info
-        customer = await db.customers.find_one({"id": card.get("customer_id")})
+        customer = await db.customers.find_one({"id": card.get("customer_id"), **NOT_DELETED})
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         
+        dao_amount = dao_data.get("amount", 0)
+        if not isinstance(dao_amount, (int, float)) or dao_amount <= 0:
+            raise HTTPException(status_code=400, detail="DAO amount must be a positive number")
+        
         # Generate business transaction ID
         transaction_id = await generate_dao_transaction_id(card.get("card_number", ""))
         
@@ -1511,59 +2844,43 @@ async def dao_credit_card_by_id(card_id: str, dao_data: dict):
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
         }
-        
-        # Insert DAO transaction
-        result = await db.dao_transactions.insert_one(dao_transaction)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Failed to create DAO transaction")
-        
-        # CRITICAL: Update credit card status and business logic after DAO
-        card_dict = dict(card)
-        card_dict = update_card_after_dao(card_dict, dao_data.get("amount", 0))
-        
-        # Update the credit card in database with new business logic (NO current_balance)
-        await db.credit_cards.update_one(
-            {"id": card_id},
-            {
-                "$set": {
-                    "available_credit": card_dict["available_credit"],
-                    "last_dao_date": card_dict["last_dao_date"],
-                    "next_due_date": card_dict["next_due_date"],
-                    "status": card_dict["status"],
-                    "days_until_due": card_dict["days_until_due"],
-                    "updated_at": datetime.now(timezone.utc)
-                },
-                "$unset": {
-                    "current_balance": ""  # Remove current_balance field from existing records
-                }
-            }
-        )
-        await db.customers.update_one(
-            {"id": card.get("customer_id")},
-            {
-                "$inc": {
-                    "total_dao_amount": dao_data.get("amount", 0),
-                    "total_dao_transactions": 1,
-                    "total_dao_profit": dao_data.get("profit_value", 0),
-                    # CRITICAL: Update main customer totals for customer list display
-                    "total_spent": dao_data.get("amount", 0),
-                    "total_profit_generated": dao_data.get("profit_value", 0),
-                    "total_transactions": 1
-                },
-                "$set": {
-                    "updated_at": datetime.now(timezone.utc)
-                }
-            }
-        )
+        dao_transaction[SEARCH_TOKENS_FIELD] = dao_tokens(dao_transaction, customer)
+        
+        # Card credit, DAO transaction and its outbox event are written together
+        async with outbox.transaction() as session:
+            # CRITICAL: Reserve credit and update card status in one guarded atomic update
+            updated_card = await db.credit_cards.find_one_and_update(
+                {"id": card_id, "available_credit": {"$gte": dao_amount}},
+                card_dao_update(card, dao_amount, dao_transaction["created_at"]),
+                projection={"_id": 0, "available_credit": 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if not updated_card:
+                raise HTTPException(status_code=400, detail="Insufficient available credit on card")
+            
+            try:
+                # Insert DAO transaction
+                await db.dao_transactions.insert_one(dao_transaction, session=session)
+                
+                # Customer stats + activity run in the outbox processor
+                await outbox.record("dao.created", dao_event_payload(dao_transaction), session=session)
+            except Exception:
+                if session is None:
+                    # No transaction to roll back - release the credit and the DAO's card state
+                    await release_card_credit(card, dao_amount, dao_transaction["created_at"])
+                raise
         
         # Clean response
         dao_response = dict(dao_transaction)
         dao_response.pop("_id", None)
+        dao_response.pop(SEARCH_TOKENS_FIELD, None)
         
         return {
             "success": True,
             "message": "Đáo thẻ thành công",
-            "dao_transaction": dao_response
+            "dao_transaction": dao_response,
+            "available_credit": updated_card["available_credit"]
         }
         
     except HTTPException:
@@ -1573,7 +2890,16 @@ async def dao_credit_card_by_id(card_id: str, dao_data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/credit-cards/dao")
-async def dao_credit_card_general(dao_data: dict):
+async def dao_credit_card_general(
+    dao_data: dict,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
+):
+    """General DAO transaction - retries with the same Idempotency-Key replay the first response"""
+    return await idempotency_store.execute(
+        idempotency_key, "dao", dao_data, lambda: _dao_credit_card_general(dao_data)
+    )
+
+async def _dao_credit_card_general(dao_data: dict):
     """DAO (Credit Card Advance) transaction - General endpoint - UUID only"""
     try:
         # Validate required fields
@@ -1582,7 +2908,7 @@ async def dao_credit_card_general(dao_data: dict):
             raise HTTPException(status_code=400, detail="Valid customer_id (UUID) is required")
         
         # Get customer info
-        customer = await db.customers.find_one({"id": customer_id})
+        customer = await db.customers.find_one({"id": customer_id, **NOT_DELETED})
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         
@@ -1595,7 +2921,7 @@ async def dao_credit_card_general(dao_data: dict):
         card_number = "0000"  # Default for non-card DAO
         
         if dao_data.get("card_id"):
-            card = await db.credit_cards.find_one({"id": dao_data["card_id"]})
+            card = await db.credit_cards.find_one({"id": dao_data["card_id"], **NOT_DELETED})
             if card:
                 card_info = {
                     "credit_card_id": card["id"],
@@ -1631,19 +2957,6 @@ async def dao_credit_card_general(dao_data: dict):
                 selected_bills.append(bill)
                 total_bills_amount += bill.get("amount", 0)
             
-            # Update bills status: AVAILABLE → SOLD
-            for bill in selected_bills:
-                await db.bills.update_one(
-                    {"id": bill["id"]},
-                    {
-                        "$set": {
-                            "status": "SOLD",
-                            "sold_at": datetime.now(timezone.utc),
-                            "updated_at": datetime.now(timezone.utc)
-                        }
-                    }
-                )
-            
             # For CREDIT_DAO_BILL, amount should match total bills amount
             if dao_data.get("amount") and dao_data["amount"] != total_bills_amount:
                 logger.warning(f"DAO amount {dao_data['amount']} != bills total {total_bills_amount}")
@@ -1670,34 +2983,37 @@ async def dao_credit_card_general(dao_data: dict):
             "updated_at": datetime.now(timezone.utc),
             **card_info  # Add credit card info if available
         }
+        dao_transaction[SEARCH_TOKENS_FIELD] = dao_tokens(dao_transaction, customer)
         
-        # Insert DAO transaction
-        result = await db.dao_transactions.insert_one(dao_transaction)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Failed to create DAO transaction")
-        
-        # Update customer stats - CRITICAL: Include DAO in total_spent and total_profit_generated  
-        await db.customers.update_one(
-            {"id": customer_id},
-            {
-                "$inc": {
-                    "total_dao_amount": dao_data.get("amount", 0),
-                    "total_dao_transactions": 1,
-                    "total_dao_profit": dao_data.get("profit_value", 0),
-                    # CRITICAL: Update main customer totals for customer list display
-                    "total_spent": dao_data.get("amount", 0),
-                    "total_profit_generated": dao_data.get("profit_value", 0),
-                    "total_transactions": 1
-                },
-                "$set": {
-                    "updated_at": datetime.now(timezone.utc)
-                }
-            }
-        )
+        # SOLD bills, DAO transaction and the outbox event are written together
+        async with outbox.transaction() as session:
+            # Update bills status: AVAILABLE → SOLD
+            for bill in selected_bills:
+                await db.bills.update_one(
+                    {"id": bill["id"]},
+                    {
+                        "$set": {
+                            "status": "SOLD",
+                            "sold_at": datetime.now(timezone.utc),
+                            "updated_at": datetime.now(timezone.utc)
+                        },
+                        "$inc": {"version": 1}
+                    },
+                    session=session
+                )
+            
+            # Insert DAO transaction
+            result = await db.dao_transactions.insert_one(dao_transaction, session=session)
+            if not result.inserted_id:
+                raise HTTPException(status_code=500, detail="Failed to create DAO transaction")
+            
+            # Customer stats (CRITICAL: DAO counts in total_spent) + activity run in the outbox processor
+            await outbox.record("dao.created", dao_event_payload(dao_transaction), session=session)
         
         # Clean response
         dao_response = dict(dao_transaction)
         dao_response.pop("_id", None)
+        dao_response.pop(SEARCH_TOKENS_FIELD, None)
         
         return {
             "success": True,
@@ -1713,34 +3029,62 @@ async def dao_credit_card_general(dao_data: dict):
         logger.error(f"Error processing general DAO: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# DAO transactions have no response model - fields= is checked against the stored shape
+DAO_TRANSACTION_FIELDS = (
+    "id", "transaction_id", "customer_id", "credit_card_id", "card_number", "bank_name", "amount",
+    "profit_value", "fee_rate", "payment_method", "bill_ids", "pos_code", "transaction_code",
+    "notes", "status", "transaction_type", "created_at", "updated_at"
+)
+
 @app.get("/api/dao-transactions", response_model=List[dict])
 async def get_dao_transactions(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100,
-    customer_id: Optional[str] = None
+    customer_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    """Get DAO transactions - UUID only responses"""
+    """Get DAO transactions - UUID only responses, next page cursor in X-Next-Cursor, fields= for a projection"""
     try:
-        # Build query filter
-        filter_query = {}
+        not_modified = await list_not_modified(request, response, DAO_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        selected = parse_fields(fields, "dao_transactions", DAO_TRANSACTION_FIELDS)
+
+        # Build query filter - a deleted customer's DAOs are hidden until the purge removes them
+        filter_query = dict(NOT_DELETED)
         if customer_id:
             if not is_valid_uuid(customer_id):
                 raise HTTPException(status_code=400, detail="Invalid customer_id UUID format")
             filter_query["customer_id"] = customer_id
         
+        if wants_ndjson(request):
+            return ndjson_response(response, find_page(
+                db.dao_transactions, filter_query, limit, cursor=cursor, skip=skip,
+                projection=fields_projection(selected, "created_at") or {SEARCH_TOKENS_FIELD: 0}
+            ), row_transform(selected=selected))
+        
         # Get DAO transactions
-        cursor = db.dao_transactions.find(filter_query).skip(skip).limit(limit).sort("created_at", -1)
-        dao_transactions = await cursor.to_list(length=limit)
+        dao_transactions, next_cursor = await fetch_page(
+            db.dao_transactions, filter_query, limit, cursor=cursor, skip=skip,
+            projection=fields_projection(selected, "created_at") or {SEARCH_TOKENS_FIELD: 0}
+        )
+        set_next_cursor(response, next_cursor)
+        if selected:
+            return projected_response(response, dao_transactions, selected)
         
-        # Clean responses - UUID only system
-        cleaned_transactions = []
+        # No model for DAO rows - the documents are the response
         for transaction in dao_transactions:
-            transaction_dict = dict(transaction)
-            transaction_dict.pop("_id", None)  # Remove ObjectId
-            cleaned_transactions.append(transaction_dict)
-        
-        return cleaned_transactions
+            transaction.pop("_id", None)
+        return TrustedJSONResponse(content=dao_transactions, headers=dict(response.headers))
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching DAO transactions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1757,15 +3101,20 @@ async def get_customer_transactions_summary(
             raise HTTPException(status_code=400, detail="Invalid UUID format")
         
         # Get customer info
-        customer = await db.customers.find_one({"id": customer_id})
+        customer = await db.customers.find_one({"id": customer_id, **NOT_DELETED})
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
+        summary = (await overlay_customer_totals([customer]))[customer_id]
         
-        # Get bill sales for this customer (limited)
-        sales = await db.sales.find({"customer_id": customer_id}).limit(limit).to_list(limit)
+        # Get newest bill sales for this customer (limited)
+        sales = await db.sales.find(
+            {"customer_id": customer_id}, {SEARCH_TOKENS_FIELD: 0}
+        ).sort("created_at", -1).limit(limit).to_list(limit)
         
-        # Get DAO transactions for this customer (limited)
-        dao_transactions = await db.dao_transactions.find({"customer_id": customer_id}).limit(limit).to_list(limit)
+        # Get newest DAO transactions for this customer (limited)
+        dao_transactions = await db.dao_transactions.find(
+            {"customer_id": customer_id}, {SEARCH_TOKENS_FIELD: 0}
+        ).sort("created_at", -1).limit(limit).to_list(limit)
         
         # Combine all transactions
         all_transactions = []
@@ -1790,25 +3139,21 @@ async def get_customer_transactions_summary(
         # Sort by created_at descending
         all_transactions.sort(key=lambda x: x.get("created_at", datetime.min), reverse=True)
         
-        # Calculate summary
-        total_transactions = len(all_transactions)
-        total_amount = sum(tx.get("total", 0) + tx.get("amount", 0) for tx in all_transactions)
-        total_profit = sum(tx.get("profit_value", 0) for tx in all_transactions)
-        
-        # Clean customer response
+        # Lifetime totals come from the customer summary, not the limited lists
         customer_dict = dict(customer)
         customer_dict.pop("_id", None)
+        bill_sales = summary["by_type"].get(SALE_TYPE, {}).get("count", 0)
         
         return {
             "success": True,
             "customer": customer_dict,
             "transactions": all_transactions[:limit],  # Apply limit
             "summary": {
-                "total_transactions": total_transactions,
-                "total_amount": total_amount,
-                "total_profit": total_profit,
-                "bill_sales": len(sales),
-                "dao_transactions": len(dao_transactions)
+                "total_transactions": summary["total_transactions"],
+                "total_amount": summary["total_value"],
+                "total_profit": summary["total_profit"],
+                "bill_sales": bill_sales,
+                "dao_transactions": summary["total_transactions"] - bill_sales
             }
         }
         
@@ -1820,10 +3165,13 @@ async def get_customer_transactions_summary(
 
 @app.get("/api/activities/recent")
 async def get_recent_activities(days: int = 3, limit: int = 20):
-    """Recent activities for dashboard (placeholder)"""
+    """Recent activities for dashboard - written by the outbox processor"""
     try:
-        # For now, return empty activities - to be implemented  
-        return []
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        cursor = db.activities.find(
+            {"created_at": {"$gte": since}}, {"_id": 0}
+        ).sort("created_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
     except Exception as e:
         logger.error(f"Error fetching recent activities: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1990,12 +3338,15 @@ async def check_single_bill(customer_code: str = Query(...), provider_region: st
                                     "is_in_inventory": False,
                                     "external_bill_id": bill.get("billId"),
                                     "gateway": "FPT_N8N",
+                                    "last_checked_at": datetime.now(timezone.utc),
                                     "created_at": datetime.now(timezone.utc)
                                 }
                                 
                                 # Save to database - check for duplicates
                                 existing_bill = await db.bills.find_one({"id": composite_bill_id})
                                 if existing_bill:
+                                    # Re-check of a known bill - buffered, flushed in bulk by the write-behind worker
+                                    touch_buffer.touch("bills", composite_bill_id, {"last_checked_at": datetime.now(timezone.utc)})
                                     return {
                                         "success": True,
                                         "status": "OK",  # Change to OK since bill data is valid
@@ -2138,9 +3489,13 @@ async def check_single_bill(customer_code: str = Query(...), provider_region: st
             "bill": None
         }
 @app.get("/api/inventory/stats")
-async def get_inventory_stats():
+async def get_inventory_stats(request: Request, response: Response):
     """Inventory stats for dashboard"""
     try:
+        not_modified = await list_not_modified(request, response, BILL_MARKERS)
+        if not_modified:
+            return not_modified
+        
         # Count bills in inventory
         available_count = await db.bills.count_documents({"status": BillStatus.AVAILABLE, "is_in_inventory": True})
         sold_count = await db.bills.count_documents({"status": BillStatus.SOLD, "is_in_inventory": False})
@@ -2167,15 +3522,20 @@ async def create_bill_from_frontend(bill_data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/transactions/stats")
-async def get_transactions_stats():
+async def get_transactions_stats(request: Request, response: Response):
     """Transaction stats for dashboard"""
     try:
-        total_sales = await db.sales.count_documents({})
+        not_modified = await list_not_modified(request, response, SALE_MARKERS)
+        if not_modified:
+            return not_modified
+        
+        total_sales = await db.sales.count_documents(NOT_DELETED)
         total_revenue = 0
         total_profit = 0
         
         # Calculate revenue and profit
         pipeline = [
+            {"$match": NOT_DELETED},
             {"$group": {
                 "_id": None,
                 "total_revenue": {"$sum": "$total"},
@@ -2207,83 +3567,94 @@ async def get_customer_detailed_profile(customer_id: str):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
         
         # Get customer info
-        customer = await db.customers.find_one({"id": customer_id})
+        customer = await db.customers.find_one({"id": customer_id, **NOT_DELETED})
         if not customer:
             raise HTTPException(status_code=404, detail="Không tìm thấy khách hàng")
         
-        # Get customer's credit cards (UUID only system)
-        cards_cursor = db.credit_cards.find({"customer_id": customer_id})
-        cards = await cards_cursor.to_list(None)
-        
-        # Get customer's bill sales (UUID only)
-        sales_pipeline = [
-            {"$match": {"customer_id": customer_id}},
-            {
-                "$lookup": {
-                    "from": "bills",
-                    "localField": "bill_ids", 
-                    "foreignField": "id",
-                    "as": "bills"
-                }
-            },
-            {"$sort": {"created_at": -1}}
+        # Lifetime totals and tier are materialized in customer_summaries
+        summary = await customer_summaries.get(customer_id)
+        
+        # One aggregation for the rest: recent sales/DAOs + cards streamed through $facet
+        # Each transaction branch is sorted and limited on its (customer_id, created_at, id) index
+        # before the union - cost stays flat however long the customer's history is
+        customer_match = {"$match": {"customer_id": customer_id}}
+        recent = [{"$sort": {"created_at": -1, "id": -1}}, {"$limit": 5}]
+        profile_pipeline = [
+            customer_match,
+            *recent,
+            {"$project": {
+                "_id": 0, "source": {"$literal": "SALE"}, "id": 1, "created_at": 1,
+                "amount": "$total", "profit": "$profit_value",
+                "bills_count": {"$size": {"$ifNull": ["$bill_ids", []]}}
+            }},
+            {"$unionWith": {"coll": "dao_transactions", "pipeline": [
+                customer_match,
+                *recent,
+                {"$project": {
+                    "_id": 0, "source": {"$literal": "DAO"}, "id": 1, "created_at": 1,
+                    "amount": 1, "profit": "$profit_value",
+                    "transaction_type": 1, "transaction_id": 1, "card_number": 1
+                }}
+            ]}},
+            {"$unionWith": {"coll": "credit_cards", "pipeline": [
+                customer_match,
+                {"$project": {
+                    "_id": 0, "source": {"$literal": "CARD"}, "id": 1, "card_number": 1, "bank_name": 1,
+                    "card_type": 1, "credit_limit": 1, "status": 1, "expiry_date": 1
+                }}
+            ]}},
+            {"$facet": {
+                "recent_sales": [{"$match": {"source": "SALE"}}],
+                "recent_daos": [{"$match": {"source": "DAO"}}],
+                "cards": [
+                    {"$match": {"source": "CARD"}}
+                ]
+            }}
         ]
-        sales_cursor = db.sales.aggregate(sales_pipeline)
-        sales = await sales_cursor.to_list(None)
+        profile = (await db.sales.aggregate(profile_pipeline).to_list(1))[0]
         
-        # Get customer's DAO transactions (UUID only system)
-        dao_transactions_cursor = db.dao_transactions.find({"customer_id": customer_id})
-        dao_transactions = await dao_transactions_cursor.to_list(None)
+        cards = profile["cards"]
         
-        # Calculate customer metrics
-        total_sales_value = sum(sale.get("total", 0) for sale in sales)
-        total_sales_profit = sum(sale.get("profit_value", 0) for sale in sales)
-        total_dao_value = sum(dao.get("amount", 0) for dao in dao_transactions)
-        total_dao_profit = sum(dao.get("profit_value", 0) for dao in dao_transactions)
-        
-        total_transaction_value = total_sales_value + total_dao_value
-        total_profit = total_sales_profit + total_dao_profit
-        total_transactions = len(sales) + len(dao_transactions)
+        # Customer metrics
+        sales_totals = summary["by_type"].get(SALE_TYPE, {})
+        total_sales_value = sales_totals.get("value", 0)
+        sales_count = sales_totals.get("count", 0)
+        total_transaction_value = summary["total_value"]
+        total_profit = summary["total_profit"]
+        total_transactions = summary["total_transactions"]
+        total_dao_value = total_transaction_value - total_sales_value
+        dao_count = total_transactions - sales_count
         
         avg_transaction_value = total_transaction_value / total_transactions if total_transactions > 0 else 0
         profit_margin = (total_profit / total_transaction_value * 100) if total_transaction_value > 0 else 0
-        
-        # Customer tier calculation
-        if total_transaction_value >= 50000000:  # 50M VND
-            tier = "VIP"
-        elif total_transaction_value >= 20000000:  # 20M VND  
-            tier = "Premium"
-        elif total_transaction_value >= 5000000:   # 5M VND
-            tier = "Regular"
-        else:
-            tier = "New"
+        tier = summary["tier"]
         
         # Calculate credit cards metrics
         total_credit_limit = sum(card.get("credit_limit", 0) for card in cards)
         active_cards = [card for card in cards if card.get("status") != "Hết hạn"]
         
-        # Recent activity (last 10 transactions) - with proper datetime handling
+        # Recent activity (last 10 transactions) - 5 newest of each kind, already sorted by the database
         recent_activities = []
         
         # Add recent sales
-        for sale in sales[:5]:
+        for sale in profile["recent_sales"]:
             recent_activities.append({
                 "id": sale["id"],
                 "type": "BILL_SALE",
-                "amount": sale.get("total", 0),
-                "profit": sale.get("profit_value", 0),
+                "amount": sale.get("amount", 0),
+                "profit": sale.get("profit", 0),
                 "created_at": sale["created_at"],
-                "description": f"Bán {len(sale.get('bills', []))} bills",
-                "bills_count": len(sale.get("bills", []))
+                "description": f"Bán {sale.get('bills_count', 0)} bills",
+                "bills_count": sale.get("bills_count", 0)
             })
         
         # Add recent DAO transactions
-        for dao in dao_transactions[:5]:
+        for dao in profile["recent_daos"]:
             recent_activities.append({
                 "id": dao["id"],
                 "type": dao.get("transaction_type", "CREDIT_DAO_POS"),
                 "amount": dao.get("amount", 0),
-                "profit": dao.get("profit_value", 0),
+                "profit": dao.get("profit", 0),
                 "created_at": dao["created_at"],
                 "description": f"Đáo thẻ - {dao.get('transaction_id', '')}",
                 "transaction_id": dao.get("transaction_id", ""),
@@ -2317,7 +3688,6 @@ async def get_customer_detailed_profile(customer_id: str):
             return created_at
         
         recent_activities.sort(key=safe_activity_sort_key, reverse=True)
-        recent_activities = recent_activities[:10]
         
         # Clean customer response
         customer_dict = dict(customer)
@@ -2343,8 +3713,8 @@ async def get_customer_detailed_profile(customer_id: str):
                 "total_transactions": total_transactions,
                 "avg_transaction_value": avg_transaction_value,
                 "profit_margin": round(profit_margin, 1),
-                "sales_transactions": len(sales),
-                "dao_transactions": len(dao_transactions),
+                "sales_transactions": sales_count,
+                "dao_transactions": dao_count,
                 "sales_value": total_sales_value,
                 "dao_value": total_dao_value
             },
@@ -2385,13 +3755,15 @@ async def get_customer_transactions(customer_id: str):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
         
         # Get customer info
-        customer = await db.customers.find_one({"id": customer_id})
+        customer = await db.customers.find_one({"id": customer_id, **NOT_DELETED})
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
+        summary = (await overlay_customer_totals([customer]))[customer_id]
         
         # Get sales for this customer with bill details
         sales_pipeline = [
             {"$match": {"customer_id": customer_id}},
+            {"$project": {SEARCH_TOKENS_FIELD: 0}},
             {
                 "$lookup": {
                     "from": "bills",
@@ -2432,7 +3804,9 @@ async def get_customer_transactions(customer_id: str):
             cleaned_transactions.append(sale_dict)
         
         # CRITICAL: Add DAO transactions for this customer
-        dao_transactions = await db.dao_transactions.find({"customer_id": customer_id}).to_list(100)
+        dao_transactions = await db.dao_transactions.find(
+            {"customer_id": customer_id}, {SEARCH_TOKENS_FIELD: 0}
+        ).sort("created_at", -1).to_list(100)
         for dao in dao_transactions:
             dao_dict = dict(dao)
             dao_dict.pop("_id", None)  # Remove ObjectId
@@ -2468,10 +3842,10 @@ async def get_customer_transactions(customer_id: str):
         #     cc_transaction["bill_codes"] = card_codes  # Reuse bill_codes field for consistency
         #     cleaned_transactions.append(cc_transaction)
         
-        # Calculate summary
-        total_transactions = len(cleaned_transactions)
-        total_spent = sum(transaction.get("total", 0) for transaction in cleaned_transactions)
-        total_profit = sum(transaction.get("profit_value", 0) for transaction in cleaned_transactions)
+        # Lifetime totals from the customer summary
+        total_transactions = summary["total_transactions"]
+        total_spent = summary["total_value"]
+        total_profit = summary["total_profit"]
         
         # Clean customer response
         customer_dict = dict(customer)
@@ -2527,6 +3901,41 @@ async def export_inventory():
 # SYSTEM HEALTH API
 # ========================================
 
+@app.get("/api/outbox/metrics")
+async def get_outbox_metrics():
+    """Outbox backlog and side-effect delivery lag"""
+    try:
+        return await outbox.metrics()
+    except Exception as e:
+        logger.error(f"Error fetching outbox metrics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/write-behind/metrics")
+async def get_write_behind_metrics():
+    """Buffered touch updates awaiting flush"""
+    return touch_buffer.metrics()
+
+@app.get("/api/compression/metrics")
+async def get_compression_metrics():
+    """Response bytes before/after compression per route"""
+    return compression_stats.metrics()
+
+@app.post("/api/customer-summaries/rebuild")
+async def rebuild_customer_summaries(customer_id: Optional[str] = None):
+    """Recompute customer_summaries from sales + DAO transactions - one customer or all"""
+    try:
+        if customer_id and not is_valid_uuid(customer_id):
+            raise HTTPException(status_code=400, detail="Invalid UUID format")
+        removed = await customer_summaries.rebuild(customer_id)
+        return {"success": True, "customer_id": customer_id, "removed_stale": removed}
+    except RebuildInProgress:
+        raise HTTPException(status_code=409, detail="A customer summary rebuild is already running")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rebuilding customer summaries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/health")
 async def health_check():
     """System health check - UUID only"""
@@ -2599,22 +4008,123 @@ class UnifiedTransaction(BaseModel):
 # UNIFIED TRANSACTIONS API - UUID ONLY
 # ========================================
 
+def sale_to_unified(sale: dict) -> dict:
+    """Unified feed row for a sale joined with its customer and bills"""
+    # Safe array access for customer
+    customer_data = sale.get("customer", [])
+    customer = customer_data[0] if customer_data else {}
+    
+    # Safe array access for bills
+    bills = sale.get("bills", [])
+    
+    # Create bill codes display
+    bill_codes = [bill.get("id", "N/A") for bill in bills]  # Use composite bill_id
+    item_display = ", ".join(bill_codes[:3])
+    if len(bill_codes) > 3:
+        item_display += f" (+{len(bill_codes)-3} khác)"
+    
+    # Plain dict in UnifiedTransaction shape - served through the trusted (validation-free) path
+    return {
+        "id": sale["id"],
+        "transaction_id": None,
+        "type": TransactionType.BILL_SALE,
+        "customer_id": sale["customer_id"],
+        "customer_name": customer.get("name", "N/A"),
+        "customer_phone": customer.get("phone"),
+        "total_amount": sale.get("total", 0),
+        "profit_amount": sale.get("profit_value", 0),
+        "profit_percentage": sale.get("profit_pct", 0),
+        "payback": sale.get("payback"),
+        "items": [{
+            "id": bill["id"],
+            "code": bill.get("id"),  # Use composite bill_id as code
+            "amount": bill.get("amount", 0),
+            "type": "BILL"
+        } for bill in bills],
+        "item_codes": bill_codes,
+        "item_display": item_display,
+        "payment_method": sale.get("payment_method", "CASH"),
+        "status": sale.get("status", "COMPLETED"),
+        "notes": sale.get("notes"),
+        "created_at": sale["created_at"]
+    }
+
+def dao_to_unified(dao: dict) -> dict:
+    """Unified feed row for a DAO transaction joined with its customer"""
+    # Safe array access for customer
+    customer_data = dao.get("customer", [])
+    customer = customer_data[0] if customer_data else {}
+    
+    # Create item display for DAO based on type
+    card_info = ""
+    dao_type = dao.get("transaction_type", "CREDIT_DAO_POS")
+    
+    if dao_type == "CREDIT_DAO_POS":
+        # POS transaction
+        if dao.get("card_number"):
+            card_info = f"{dao.get('bank_name', '')} {dao.get('card_number')}"
+        elif dao.get("pos_code"):
+            card_info = f"POS: {dao.get('pos_code')}"
+        else:
+            card_info = "Đáo Thẻ POS"
+    elif dao_type == "CREDIT_DAO_BILL":
+        # Bill transaction  
+        if dao.get("bill_code"):
+            card_info = dao.get("bill_code")
+        else:
+            card_info = "Đáo Thẻ Bill"
+    else:
+        card_info = "Đáo Thẻ"
+    
+    # Determine correct TransactionType enum
+    transaction_type_enum = TransactionType.CREDIT_DAO_POS
+    if dao_type == "CREDIT_DAO_BILL":
+        transaction_type_enum = TransactionType.CREDIT_DAO_BILL
+    
+    return {
+        "id": dao["id"],  # Technical UUID
+        "transaction_id": dao.get("transaction_id", dao["id"]),  # Business ID: D98550509
+        "type": transaction_type_enum,
+        "customer_id": dao["customer_id"],
+        "customer_name": customer.get("name", "N/A"),
+        "customer_phone": customer.get("phone"),
+        "total_amount": dao.get("amount", 0),
+        "profit_amount": dao.get("profit_value", 0),
+        "profit_percentage": dao.get("fee_rate", 3.0),
+        "payback": dao.get("amount", 0) - dao.get("profit_value", 0),
+        "items": [{
+            "id": dao["id"],
+            "code": card_info,
+            "amount": dao.get("amount", 0),
+            "type": dao_type
+        }],
+        "item_codes": [card_info],
+        "item_display": card_info,
+        "payment_method": dao.get("payment_method", "CASH"),
+        "status": dao.get("status", "COMPLETED"),
+        "notes": dao.get("notes"),
+        "created_at": dao["created_at"]
+    }
+
 @app.get("/api/transactions/unified", response_model=List[UnifiedTransaction])
 async def get_unified_transactions(
+    request: Request,
+    response: Response,
     limit: int = 50,
     offset: int = 0,
     transaction_type: Optional[str] = None,
     customer_id: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """Get unified transactions from Sales (UUID only system)"""
+    """Get unified transactions - one $unionWith aggregation, joins run on the final page only"""
     try:
-        unified_transactions = []
+        streaming = wants_ndjson(request)
         
-        # Query filters
-        match_filters = {}
+        # Query filters - a deleted customer's transactions are hidden until the purge removes them
+        match_filters = dict(NOT_DELETED)
         if date_from or date_to:
             date_filter = {}
             if date_from:
@@ -2626,188 +4136,219 @@ async def get_unified_transactions(
         if customer_id and is_valid_uuid(customer_id):
             match_filters["customer_id"] = customer_id
         
-        # Get Bill Sales (UUID only)
-        if not transaction_type or transaction_type == "BILL_SALE":
-            sales_pipeline = [
-                {"$match": match_filters},
-                {
-                    "$lookup": {
-                        "from": "customers",
-                        "localField": "customer_id", 
-                        "foreignField": "id",
-                        "as": "customer"
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "bills",
-                        "localField": "bill_ids",
-                        "foreignField": "id", 
-                        "as": "bills"
-                    }
-                },
-                {"$sort": {"created_at": -1}},
-                {"$limit": limit + offset},
-                {"$skip": offset}
-            ]
-            
-            sales_cursor = db.sales.aggregate(sales_pipeline)
-            sales_results = await sales_cursor.to_list(length=None)
-            
-            for sale in sales_results:
-                # Safe array access for customer
-                customer_data = sale.get("customer", [])
-                customer = customer_data[0] if customer_data else {}
-                
-                # Safe array access for bills
-                bills = sale.get("bills", [])
-                
-                # Create bill codes display
-                bill_codes = [bill.get("id", "N/A") for bill in bills]  # Use composite bill_id
-                item_display = ", ".join(bill_codes[:3])
-                if len(bill_codes) > 3:
-                    item_display += f" (+{len(bill_codes)-3} khác)"
-                
-                transaction = UnifiedTransaction(
-                    id=sale["id"],
-                    type=TransactionType.BILL_SALE,
-                    customer_id=sale["customer_id"],
-                    customer_name=customer.get("name", "N/A"),
-                    customer_phone=customer.get("phone"),
-                    total_amount=sale.get("total", 0),
-                    profit_amount=sale.get("profit_value", 0),
-                    profit_percentage=sale.get("profit_pct", 0),
-                    payback=sale.get("payback"),
-                    items=[TransactionItem(
-                        id=bill["id"],
-                        code=bill.get("id"),  # Use composite bill_id as code
-                        amount=bill.get("amount", 0),
-                        type="BILL"
-                    ) for bill in bills],
-                    item_codes=bill_codes,
-                    item_display=item_display,
-                    payment_method=sale.get("payment_method", "CASH"),
-                    status=sale.get("status", "COMPLETED"),
-                    notes=sale.get("notes"),
-                    created_at=sale["created_at"]
+        # Keyset cursor replaces offset - each branch starts at the cursor via its (created_at, id) index
+        if cursor:
+            value, last_id = decode_cursor(cursor, "created_at")
+            match_filters = {"$and": [match_filters, keyset_filter("created_at", value, last_id)]}
+            offset = 0
+        
+        # Indexed prefix match on write-time tokens - applied before pagination
+        search_match = None
+        if search and search.strip():
+            search_match = search_filter(search)
+            if not search_match:
+                # Dropping the clause would return the unfiltered feed as "matches"
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"search needs at least one term of {MIN_TERM_LENGTH} or more characters"
                 )
-                unified_transactions.append(transaction)
         
-        # Get DAO Transactions (UUID only) - Both POS and BILL types
-        if not transaction_type or transaction_type in ["CREDIT_DAO_POS", "CREDIT_DAO_BILL"]:
-            dao_pipeline = [
-                {"$match": match_filters},
-                {
-                    "$lookup": {
-                        "from": "customers",
-                        "localField": "customer_id", 
-                        "foreignField": "id",
-                        "as": "customer"
-                    }
-                },
-                {"$sort": {"created_at": -1}},
-                {"$limit": limit + offset},
-                {"$skip": offset}
-            ]
-            
-            try:
-                dao_cursor = db.dao_transactions.aggregate(dao_pipeline)
-                dao_results = await dao_cursor.to_list(length=None)
-                
-                for dao in dao_results:
-                    # Clean ObjectId from DAO
-                    dao.pop("_id", None)
-                    
-                    # Safe array access for customer
-                    customer_data = dao.get("customer", [])
-                    customer = customer_data[0] if customer_data else {}
-                    
-                    # Create item display for DAO based on type
-                    card_info = ""
-                    dao_type = dao.get("transaction_type", "CREDIT_DAO_POS")
-                    
-                    if dao_type == "CREDIT_DAO_POS":
-                        # POS transaction
-                        if dao.get("card_number"):
-                            card_info = f"{dao.get('bank_name', '')} {dao.get('card_number')}"
-                        elif dao.get("pos_code"):
-                            card_info = f"POS: {dao.get('pos_code')}"
-                        else:
-                            card_info = "Đáo Thẻ POS"
-                    elif dao_type == "CREDIT_DAO_BILL":
-                        # Bill transaction  
-                        if dao.get("bill_code"):
-                            card_info = dao.get("bill_code")
-                        else:
-                            card_info = "Đáo Thẻ Bill"
-                    else:
-                        card_info = "Đáo Thẻ"
-                    
-                    # Determine correct TransactionType enum
-                    transaction_type_enum = TransactionType.CREDIT_DAO_POS
-                    if dao_type == "CREDIT_DAO_BILL":
-                        transaction_type_enum = TransactionType.CREDIT_DAO_BILL
-                    
-                    transaction = UnifiedTransaction(
-                        id=dao["id"],  # Technical UUID
-                        transaction_id=dao.get("transaction_id", dao["id"]),  # Business ID: D98550509
-                        type=transaction_type_enum,
-                        customer_id=dao["customer_id"],
-                        customer_name=customer.get("name", "N/A"),
-                        customer_phone=customer.get("phone"),
-                        total_amount=dao.get("amount", 0),
-                        profit_amount=dao.get("profit_value", 0),
-                        profit_percentage=dao.get("fee_rate", 3.0),
-                        payback=dao.get("amount", 0) - dao.get("profit_value", 0),  
-                        items=[TransactionItem(
-                            id=dao["id"],
-                            code=card_info,
-                            amount=dao.get("amount", 0),
-                            type=dao_type
-                        )],
-                        item_codes=[card_info],
-                        item_display=card_info,
-                        payment_method=dao.get("payment_method", "CASH"),
-                        status=dao.get("status", "COMPLETED"),
-                        notes=dao.get("notes"),
-                        created_at=dao["created_at"]
-                    )
-                    unified_transactions.append(transaction)
-            except Exception as e:
-                logger.error(f"Error processing DAO transactions: {e}")
-                # Continue processing without DAO transactions
-
-        # Sort by created_at descending
-        unified_transactions.sort(key=lambda x: x.created_at, reverse=True)
-        
-        # Apply search filter if provided
-        if search:
-            search_lower = search.lower()
-            unified_transactions = [
-                tx for tx in unified_transactions
-                if (search_lower in tx.customer_name.lower() or
-                    search_lower in (tx.customer_phone or "").lower() or
-                    any(search_lower in code.lower() for code in tx.item_codes))
+        # One branch per source - the discriminator tells rows apart after the union
+        branches = []
+        if not transaction_type or transaction_type == "BILL_SALE":
+            branches.append(("sales", {}, "SALE"))
+        if not transaction_type:
+            branches.append(("dao_transactions", {}, "DAO"))
+        elif transaction_type == "CREDIT_DAO_POS":
+            # Legacy DAOs without transaction_type are POS
+            branches.append(("dao_transactions", {"transaction_type": {"$ne": "CREDIT_DAO_BILL"}}, "DAO"))
+        elif transaction_type == "CREDIT_DAO_BILL":
+            branches.append(("dao_transactions", {"transaction_type": "CREDIT_DAO_BILL"}, "DAO"))
+        if not branches:
+            return StreamingResponse(iter(()), media_type=NDJSON_MEDIA_TYPE) if streaming else []
+        
+        page_limit = limit if streaming else limit + 1  # One extra row tells whether another page exists
+        
+        def branch_pipeline(collection: str, type_filter: dict, source: str) -> list:
+            clauses = [match_filters, type_filter, search_match]
+            return [
+                {"$match": {"$and": [clause for clause in clauses if clause] or [{}]}},
+                # Each branch walks its (created_at, id) index and contributes only its top rows to the union
+                {"$sort": {"created_at": -1, "id": -1}},
+                {"$limit": offset + page_limit},
+                {"$addFields": {"source": {"$literal": source}}}
             ]
         
-        # Apply pagination
-        start_idx = offset
-        end_idx = offset + limit
-        paginated_transactions = unified_transactions[start_idx:end_idx]
+        first, rest = branches[0], branches[1:]
+        pipeline = branch_pipeline(*first)
+        for branch in rest:
+            pipeline.append({"$unionWith": {"coll": branch[0], "pipeline": branch_pipeline(*branch)}})
+        pipeline += [
+            {"$sort": {"created_at": -1, "id": -1}},
+            {"$skip": offset},
+            {"$limit": page_limit},
+            # Joins run on the final page only
+            {
+                "$lookup": {
+                    "from": "customers",
+                    "localField": "customer_id", 
+                    "foreignField": "id",
+                    "as": "customer"
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "bills",
+                    "localField": "bill_ids",
+                    "foreignField": "id", 
+                    "as": "bills"
+                }
+            },
+            {"$project": {"_id": 0}}
+        ]
+        
+        if streaming:
+            async def to_unified(batch: List[dict]) -> List[dict]:
+                return [sale_to_unified(row) if row["source"] == "SALE" else dao_to_unified(row) for row in batch]
+            return ndjson_response(response, db[first[0]].aggregate(pipeline), to_unified)
         
-        # Clean responses for UUID-only system
-        cleaned_transactions = []
-        for tx in paginated_transactions:
-            tx_dict = tx.dict()
-            cleaned_tx = uuid_processor.clean_response(tx_dict)
-            cleaned_transactions.append(UnifiedTransaction(**cleaned_tx))
+        rows = await db[first[0]].aggregate(pipeline).to_list(length=limit + 1)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1], "created_at")
         
-        return cleaned_transactions
+        unified_transactions = [
+            sale_to_unified(row) if row["source"] == "SALE" else dao_to_unified(row)
+            for row in rows
+        ]
+        return TrustedJSONResponse(content=unified_transactions, headers=dict(response.headers))
         
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching unified transactions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ========================================
+# QUICK SEARCH - FEDERATED LOOKUPS
+# ========================================
+
+QUICK_SEARCH_SOURCE_BUDGET_SECONDS = float(os.environ.get('QUICK_SEARCH_SOURCE_BUDGET_SECONDS', '0.3'))
+
+def quick_hit(hit_type: str, doc: dict, title: str, subtitle: Optional[str], score: int) -> dict:
+    return {"type": hit_type, "id": doc["id"], "title": title, "subtitle": subtitle, "score": score}
+
+async def quick_search_customers(query: str, shapes: set, limit: int) -> List[dict]:
+    if quick_search.SHAPE_UUID in shapes:
+        customer = await db.customers.find_one({"id": query, **NOT_DELETED}, {"_id": 0, "id": 1, "name": 1, "phone": 1})
+        return [quick_hit("customer", customer, customer.get("name"), customer.get("phone"), quick_search.SCORE_EXACT)] if customer else []
+    digits = "".join(ch for ch in query if ch.isdigit())
+    hits = []
+    for customer in customer_index.search(query, limit):
+        exact = bool(digits) and "".join(ch for ch in customer.get("phone") or "" if ch.isdigit()) == digits
+        score = quick_search.SCORE_EXACT if exact else quick_search.SCORE_PREFIX
+        hits.append(quick_hit("customer", customer, customer.get("name"), customer.get("phone"), score))
+    return hits
+
+async def quick_search_cards(query: str, shapes: set, limit: int) -> List[dict]:
+    if quick_search.SHAPE_UUID in shapes:
+        match, score = {"id": query}, quick_search.SCORE_EXACT
+    else:
+        match, score = {"card_last4": query.strip()}, quick_search.SCORE_PREFIX
+    cards = await db.credit_cards.find(
+        {**match, **NOT_DELETED}, {"_id": 0, "id": 1, "bank_name": 1, "card_last4": 1, "customer_name": 1}
+    ).limit(limit).to_list(limit)
+    return [
+        quick_hit("credit_card", card, f"{card.get('bank_name', '')} ****{card.get('card_last4') or ''}", card.get("customer_name"), score)
+        for card in cards
+    ]
+
+async def quick_search_bills(query: str, shapes: set, limit: int) -> List[dict]:
+    code = "".join(query.split()).upper()
+    projection = {"_id": 0, "id": 1, "customer_code": 1, "customer_name": 1, "amount": 1, "status": 1}
+    hits = []
+    if quick_search.SHAPE_BILL_ID in shapes:
+        bill = await db.bills.find_one({"id": code, **NOT_DELETED}, projection)
+        if bill:
+            hits.append(quick_hit("bill", bill, bill["id"], bill.get("customer_name"), quick_search.SCORE_EXACT))
+    # Anchored regex on customer_code uses its index
+    bills = await db.bills.find(
+        {"customer_code": {"$regex": f"^{re.escape(code)}"}, **NOT_DELETED}, projection
+    ).limit(limit).to_list(limit)
+    for bill in bills:
+        score = quick_search.SCORE_EXACT if bill.get("customer_code") == code else quick_search.SCORE_PREFIX
+        hits.append(quick_hit("bill", bill, bill["id"], bill.get("customer_name"), score))
+    return hits
+
+async def quick_search_sales(query: str, shapes: set, limit: int) -> List[dict]:
+    match = {"id": query} if quick_search.SHAPE_UUID in shapes else search_filter(query)
+    if not match:
+        return []
+    # Hidden with their deleted customer - excluded like every other read
+    sales = await db.sales.find(
+        {**match, **NOT_DELETED}, {"_id": 0, "id": 1, "bill_ids": 1, "total": 1, "created_at": 1}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    score = quick_search.SCORE_EXACT if quick_search.SHAPE_UUID in shapes else quick_search.SCORE_TOKEN
+    return [
+        quick_hit("sale", sale, ", ".join((sale.get("bill_ids") or [])[:3]), f"{sale.get('total', 0):,.0f}", score)
+        for sale in sales
+    ]
+
+async def quick_search_dao(query: str, shapes: set, limit: int) -> List[dict]:
+    projection = {"_id": 0, "id": 1, "transaction_id": 1, "amount": 1, "bank_name": 1, "created_at": 1}
+    if quick_search.SHAPE_UUID in shapes:
+        match, score = {"id": query}, quick_search.SCORE_EXACT
+    elif quick_search.SHAPE_DAO_ID in shapes:
+        # Business ids are D + digits, repeated ids get -N suffixes
+        match, score = {"transaction_id": {"$regex": f"^{re.escape(query.strip().upper())}"}}, quick_search.SCORE_PREFIX
+    else:
+        match, score = search_filter(query), quick_search.SCORE_TOKEN
+        if not match:
+            return []
+    daos = await db.dao_transactions.find({**match, **NOT_DELETED}, projection).sort("created_at", -1).limit(limit).to_list(limit)
+    hits = []
+    for dao in daos:
+        exact = dao.get("transaction_id") == query.strip().upper()
+        hits.append(quick_hit(
+            "dao_transaction", dao, dao.get("transaction_id") or dao["id"],
+            f"{dao.get('bank_name') or ''} {dao.get('amount', 0):,.0f}".strip(),
+            quick_search.SCORE_EXACT if exact else score
+        ))
+    return hits
+
+@app.get("/api/search/quick")
+async def quick_search_all(q: str = Query(..., min_length=2), limit: int = Query(10, ge=1, le=50)):
+    """One search box - classify the query, ask only the sources that can match, each under a time budget"""
+    try:
+        query = q.strip()
+        shapes = classify(query)
+        
+        sources = {}
+        if shapes & {quick_search.SHAPE_UUID, quick_search.SHAPE_PHONE, quick_search.SHAPE_TEXT}:
+            sources["customers"] = quick_search_customers(query, shapes, limit)
+        if shapes & {quick_search.SHAPE_UUID, quick_search.SHAPE_CARD_LAST4}:
+            sources["credit_cards"] = quick_search_cards(query, shapes, limit)
+        if shapes & {quick_search.SHAPE_BILL_ID, quick_search.SHAPE_CUSTOMER_CODE}:
+            sources["bills"] = quick_search_bills(query, shapes, limit)
+        if shapes & {quick_search.SHAPE_UUID, quick_search.SHAPE_BILL_ID, quick_search.SHAPE_CUSTOMER_CODE, quick_search.SHAPE_TEXT}:
+            sources["sales"] = quick_search_sales(query, shapes, limit)
+        if shapes & {quick_search.SHAPE_UUID, quick_search.SHAPE_DAO_ID, quick_search.SHAPE_CARD_LAST4, quick_search.SHAPE_TEXT}:
+            sources["dao_transactions"] = quick_search_dao(query, shapes, limit)
+        
+        hits, skipped = await run_sources(sources, QUICK_SEARCH_SOURCE_BUDGET_SECONDS)
+        return {
+            "query": query,
+            "shapes": sorted(shapes),
+            "hits": rank(hits, limit),
+            "incomplete_sources": skipped  # Timed out or failed - results may be partial
+        }
+        
+    except Exception as e:
+        logger.error(f"Error in quick search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ========================================  
 # MAIN APPLICATION MOUNT
 # ========================================
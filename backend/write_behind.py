@@ -0,0 +1,109 @@
+"""
+Write-Behind Buffer - Coalesced low-value field updates
+Touch fields (last_login, last_checked_at, ...) are buffered in memory per document and flushed with bulk_write
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# (collection name, key field, key value)
+DocumentKey = Tuple[str, str, Any]
+
+
+class WriteBehindBuffer:
+    """Last-write-wins $set buffer - only for fields a lost flush would not hurt"""
+
+    def __init__(self, db, flush_interval: float = 5.0, max_pending: int = 1000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending  # Flush early once this many documents are dirty
+        self._pending: Dict[DocumentKey, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stats = {
+            "touches_total": 0,
+            "writes_total": 0,
+            "last_flush_size": 0,
+        }
+
+    def touch(self, collection: str, key: Any, fields: Dict[str, Any], key_field: str = "id"):
+        """Buffer a $set - repeated touches of one document collapse into one write"""
+        self._pending.setdefault((collection, key_field, key), {}).update(fields)
+        self._stats["touches_total"] += 1
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write all buffered touches - returns documents written"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+
+        by_collection: Dict[str, list] = {}
+        for (collection, key_field, key), fields in pending.items():
+            by_collection.setdefault(collection, []).append(
+                ((collection, key_field, key), UpdateOne({key_field: key}, {"$set": fields}))
+            )
+
+        written = 0
+        for collection, entries in by_collection.items():
+            try:
+                await self.db[collection].bulk_write([op for _, op in entries], ordered=False)
+                written += len(entries)
+            except asyncio.CancelledError:
+                # Cancelled mid-flush (shutdown) - stop() flushes the rest
+                self._rebuffer(pending, entries)
+                for other, other_entries in by_collection.items():
+                    if other != collection and other_entries:
+                        self._rebuffer(pending, other_entries)
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing {len(entries)} buffered writes to {collection}: {e}")
+                self._rebuffer(pending, entries)
+            entries.clear()
+
+        self._stats["writes_total"] += written
+        self._stats["last_flush_size"] = written
+        return written
+
+    def _rebuffer(self, pending: Dict[DocumentKey, Dict[str, Any]], entries: list):
+        """Put unwritten touches back without clobbering newer ones"""
+        for document_key, _ in entries:
+            self._pending[document_key] = {**pending[document_key], **self._pending.get(document_key, {})}
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"pending": len(self._pending), **self._stats}
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing write-behind buffer: {e}")
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        """Stop the background flusher and write whatever is buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Serialization Benchmark - per-row CPU cost of list responses
+Compares the model path (clean_response + Pydantic model + response_model re-validation + jsonable_encoder)
+with the trusted path (shape to model fields + orjson) on 1,000-row pages; no database needed
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import server
+from serialization import TrustedJSONResponse, shape_many, orjson
+from uuid_utils import generate_uuid, uuid_processor
+
+ROWS = 1000
+ROUNDS = 20
+
+
+def customer_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [{
+        "id": generate_uuid(),
+        "name": f"Nguyễn Văn {i}",
+        "phone": f"09{i:08d}",
+        "email": None,
+        "address": "Quận 1, TP.HCM",
+        "type": "INDIVIDUAL",
+        "tier": "BRONZE",
+        "total_transactions": i % 40,
+        "total_spent": float(i * 125000),
+        "total_profit_generated": float(i * 3750),
+        "total_cards": i % 3,
+        "is_active": True,
+        "version": 3,
+        "created_at": now - timedelta(minutes=i),
+        "updated_at": now,
+    } for i in range(count)]
+
+
+def card_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [{
+        "id": generate_uuid(),
+        "customer_id": generate_uuid(),
+        "customer_name": f"Trần Thị {i}",
+        "card_number": f"4111111111{i:06d}",
+        "card_last4": f"{i:06d}"[-4:],
+        "cardholder_name": f"TRAN THI {i}",
+        "bank_name": "Vietcombank",
+        "card_type": "VISA",
+        "expiry_date": "12/28",
+        "ccv": "123",
+        "statement_date": 5,
+        "payment_due_date": 20,
+        "credit_limit": 50000000.0,
+        "available_credit": 42000000.0,
+        "status": "Cần đáo",
+        "version": 2,
+        "created_at": now - timedelta(minutes=i),
+        "updated_at": now,
+    } for i in range(count)]
+
+
+async def model_path(rows: List[dict], model) -> bytes:
+    """What the list endpoints did: model per row, then FastAPI re-validates against response_model"""
+    models = [model(**uuid_processor.clean_response(dict(row))) for row in rows]
+    field = create_response_field(name="Response", type_=List[model])
+    content = await serialize_response(field=field, response_content=models)
+    return JSONResponse(content=content).body
+
+
+async def trusted_path(rows: List[dict], model) -> bytes:
+    return TrustedJSONResponse(content=shape_many(rows, model)).body
+
+
+async def measure(path, rows: List[dict], model) -> float:
+    """Best-of-ROUNDS microseconds per row"""
+    best = float("inf")
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await path(rows, model)
+        best = min(best, time.perf_counter() - started)
+    return best / len(rows) * 1_000_000
+
+
+async def main():
+    print(f"{ROWS}-row pages, best of {ROUNDS} rounds, encoder: {'orjson' if orjson else 'json (orjson not installed)'}")
+    print(f"{'model':<12}{'before µs/row':>16}{'after µs/row':>16}{'speedup':>10}")
+    for name, model, rows in (
+        ("Customer", server.Customer, customer_rows(ROWS)),
+        ("CreditCard", server.CreditCard, card_rows(ROWS)),
+    ):
+        before = await measure(model_path, rows, model)
+        after = await measure(trusted_path, rows, model)
+        print(f"{name:<12}{before:>16.2f}{after:>16.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules (server.py runs from backend/)
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND)
+
+# The repo root has a uuid_utils.py of its own and ends up ahead of backend/ once test modules are
+# collected - load the backend's now so every later import gets it from sys.modules
+import uuid_utils  # noqa: E402,F401
+
+
+@pytest.fixture(scope="session")
+def server():
+    """The backend app module - skipped when its dependencies are not installed"""
+    return pytest.importorskip("server")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """Empty database - a throwaway one on TEST_MONGO_URL when set, otherwise in-memory mongomock"""
+    url = os.environ.get("TEST_MONGO_URL")
+    if not url:
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        yield mongomock_motor.AsyncMongoMockClient()["test"]
+        return
+
+    from uuid import uuid4
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(url)
+    name = f"test_{uuid4().hex}"
+    yield client[name]
+    await client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture
+def real_db(db):
+    """db for aggregation stages mongomock does not implement ($unionWith, $merge, $convert)"""
+    if not os.environ.get("TEST_MONGO_URL"):
+        pytest.skip("needs a MongoDB server - set TEST_MONGO_URL")
+    return db
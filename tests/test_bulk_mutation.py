@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bulk_mutation import STATUS_DONE, STATUS_RUNNING, BulkLimitExceeded, BulkMutator
+
+pytestmark = pytest.mark.anyio
+
+AVAILABLE = {"status": "AVAILABLE"}
+SET_PENDING = {"$set": {"status": "PENDING"}, "$inc": {"version": 1}}
+
+
+@pytest.fixture
+async def mutator(db):
+    await db.bills.insert_many([{"id": f"b{n}", "status": "AVAILABLE", "version": 1} for n in range(7)])
+    await db.bills.insert_one({"id": "sold", "status": "SOLD", "version": 1})
+    return BulkMutator(db, chunk_size=3)
+
+
+async def finished(mutator, job):
+    await asyncio.gather(*mutator._running.values())
+    return await mutator.get_job(job["id"])
+
+
+async def test_dry_run_counts_without_writing(mutator, db):
+    result = await mutator.dry_run(db.bills, AVAILABLE, cap=5, sample_size=2)
+    assert (result["matched"], result["within_cap"]) == (7, False)
+    assert len(result["sample_ids"]) == 2
+    assert await db.bills.count_documents(AVAILABLE) == 7
+
+
+async def test_match_over_the_cap_is_refused(mutator, db):
+    with pytest.raises(BulkLimitExceeded) as error:
+        await mutator.submit(db.bills, AVAILABLE, SET_PENDING, cap=6, description={})
+    assert (error.value.matched, error.value.cap) == (7, 6)
+    assert await db.bulk_jobs.count_documents({}) == 0
+
+
+async def test_job_updates_every_match_in_chunks(mutator, db):
+    job = await mutator.submit(db.bills, AVAILABLE, SET_PENDING, cap=10, description={"action": "SET_STATUS"})
+    assert job["status"] == STATUS_RUNNING
+    assert "query" not in job
+
+    done = await finished(mutator, job)
+    assert done["status"] == STATUS_DONE
+    assert (done["modified"], done["chunks_done"]) == (7, 3)
+    assert "last_id" not in done
+    assert await db.bills.count_documents({"status": "PENDING", "version": 2}) == 7
+    assert (await db.bills.find_one({"id": "sold"}))["status"] == "SOLD"
+
+
+async def test_filter_is_reapplied_per_chunk(mutator, db):
+    job = await mutator.submit(db.bills, AVAILABLE, SET_PENDING, cap=10, description={})
+    # Sold between the count and the chunk that reaches it
+    await db.bills.update_one({"id": "b6"}, {"$set": {"status": "SOLD"}})
+
+    done = await finished(mutator, job)
+    assert done["modified"] == 6
+    assert (await db.bills.find_one({"id": "b6"}))["status"] == "SOLD"
+
+
+async def test_abandoned_job_resumes_after_its_last_chunk(mutator, db):
+    job = await mutator.submit(db.bills, AVAILABLE, SET_PENDING, cap=10, description={})
+    await finished(mutator, job)
+    await db.bills.update_many({"status": "PENDING"}, {"$set": {"status": "AVAILABLE"}})
+
+    # Worker died after the first chunk
+    first_chunk = await db.bills.find(AVAILABLE, {"_id": 1}).sort("_id", 1).limit(3).to_list(3)
+    await db.bulk_jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": STATUS_RUNNING,
+        "modified": 3,
+        "last_id": first_chunk[-1]["_id"],
+        "locked_until": datetime.now(timezone.utc) - timedelta(seconds=1),
+    }})
+
+    claimed = await mutator._claim()
+    assert claimed["id"] == job["id"]
+    await mutator._execute(claimed)
+
+    done = await mutator.get_job(job["id"])
+    assert (done["status"], done["modified"]) == (STATUS_DONE, 7)
+    assert await db.bills.count_documents({"status": "AVAILABLE"}) == 3
+
+
+async def test_live_job_is_not_claimed(mutator, db):
+    await mutator.submit(db.bills, AVAILABLE, SET_PENDING, cap=10, description={})
+    assert await mutator._claim() is None
+    await asyncio.gather(*mutator._running.values())
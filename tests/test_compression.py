@@ -0,0 +1,183 @@
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, CompressionStats, negotiate
+
+ROWS = [{"id": f"r{n}", "name": "Nguyen Van A", "note": "x" * 20} for n in range(100)]
+ETAG = '"rows-1"'
+
+
+def test_negotiate_without_header():
+    assert negotiate(None, ("br", "gzip")) is None
+    assert negotiate("", ("br", "gzip")) is None
+
+
+def test_negotiate_prefers_server_order_on_ties():
+    assert negotiate("gzip, deflate, br", ("br", "gzip")) == "br"
+    assert negotiate("gzip, br", ("gzip",)) == "gzip"
+
+
+def test_negotiate_uses_quality_values():
+    assert negotiate("br;q=0.5, gzip;q=0.8", ("br", "gzip")) == "gzip"
+    assert negotiate("br;q=0, gzip", ("br", "gzip")) == "gzip"
+    assert negotiate("gzip;q=0", ("gzip",)) is None
+    assert negotiate("gzip;q=abc", ("gzip",)) is None
+
+
+def test_negotiate_wildcard_and_identity():
+    assert negotiate("*", ("br", "gzip")) == "br"
+    assert negotiate("*;q=0.1, br;q=0", ("br", "gzip")) == "gzip"
+    assert negotiate("identity", ("br", "gzip")) is None
+
+
+def make_app(**options):
+    app = FastAPI()
+    stats = CompressionStats()
+    app.add_middleware(CompressionMiddleware, stats=stats, **options)
+
+    @app.get("/rows")
+    def rows(request: Request):
+        if request.headers.get("if-none-match") in (ETAG, f"W/{ETAG}"):
+            return Response(status_code=304, headers={"ETag": ETAG})
+        return JSONResponse(ROWS, headers={"ETag": ETAG})
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/image")
+    def image():
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"{n:04}".encode() * 100 + b"\n" for n in range(5)), media_type="application/x-ndjson")
+
+    return app, stats
+
+
+@pytest.fixture
+def client():
+    app, stats = make_app()
+    client = TestClient(app)
+    client.stats = stats
+    return client
+
+
+def test_large_body_is_gzipped_with_a_weak_etag(client):
+    response = client.get("/rows", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == f"W/{ETAG}"
+    assert response.json() == ROWS
+
+    stats = client.stats.metrics()["routes"]["/rows"]
+    assert stats["compressed"] == 1
+    assert stats["bytes_out"] == int(response.headers["content-length"]) < stats["bytes_in"]
+
+
+def test_brotli_preferred_when_installed(client):
+    pytest.importorskip("brotli")
+    response = client.get("/rows", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+
+
+def test_small_body_goes_out_as_is(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["content-length"] == str(len(response.content))
+    assert client.stats.metrics()["routes"]["/small"]["compressed"] == 0
+
+
+def test_uncompressed_for_clients_without_gzip(client):
+    response = client.get("/rows", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == ETAG
+
+
+def test_incompressible_types_and_head_pass_through(client):
+    response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    response = client.head("/rows", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_not_modified_echoes_the_etag_form_of_the_200(client):
+    compressed = client.get("/rows", headers={"Accept-Encoding": "gzip", "If-None-Match": f"W/{ETAG}"})
+    assert compressed.status_code == 304
+    assert compressed.headers["etag"] == f"W/{ETAG}"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+
+    plain = client.get("/rows", headers={"Accept-Encoding": "identity", "If-None-Match": ETAG})
+    assert plain.status_code == 304
+    assert plain.headers["etag"] == ETAG
+
+
+def test_stream_is_compressed_chunk_by_chunk(client):
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw).splitlines() == [f"{n:04}".encode() * 100 for n in range(5)]
+
+
+@pytest.mark.anyio
+async def test_each_streamed_chunk_is_decodable_on_arrival():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for n in range(3):
+            await send({"type": "http.response.body", "body": b'{"n": %d}\n' % n * 200, "more_body": n < 2})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+    await CompressionMiddleware(app, minimum_size=1024)(scope, None, send)
+
+    bodies = [message for message in sent if message["type"] == "http.response.body"]
+    assert [message["more_body"] for message in bodies] == [True, True, False]
+    decoder = zlib.decompressobj(31)
+    # Flushed per chunk - the client can parse each batch before the stream ends
+    for n, message in enumerate(bodies):
+        assert decoder.decompress(message["body"]) == b'{"n": %d}\n' % n * 200
+
+
+@pytest.mark.anyio
+async def test_large_bodies_are_compressed_off_the_event_loop(monkeypatch):
+    offloaded = []
+
+    async def to_thread(operation, data):
+        offloaded.append(len(data))
+        return operation(data)
+
+    monkeypatch.setattr(compression.asyncio, "to_thread", to_thread)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+    middleware = CompressionMiddleware(app, minimum_size=10, offload_size=4096)
+
+    body = b"a" * 100
+    await middleware(scope, None, send)
+    body = b"a" * 5000
+    await middleware(scope, None, send)
+
+    assert offloaded == [5000]
+    assert gzip.decompress(sent[-1]["body"]) == body
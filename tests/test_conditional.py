@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from conditional import entity_etag, http_date, is_not_modified
+
+CHANGED_AT = datetime(2026, 5, 6, 7, 8, 9, 500000, tzinfo=timezone.utc)
+
+
+def test_if_none_match_matches_strong_and_weak_forms():
+    etag = entity_etag(3, CHANGED_AT)
+    assert is_not_modified(etag, None, etag)
+    assert is_not_modified(f"W/{etag}", None, etag)
+    assert is_not_modified(etag, None, f"W/{etag}")
+    assert is_not_modified(f'"other", {etag}', None, etag)
+    assert is_not_modified("*", None, etag)
+    assert not is_not_modified(entity_etag(4, CHANGED_AT), None, etag)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    etag = entity_etag(3, CHANGED_AT)
+    assert not is_not_modified('"stale"', http_date(CHANGED_AT), etag, CHANGED_AT)
+
+
+def test_if_modified_since_has_second_precision():
+    etag = entity_etag(3, CHANGED_AT)
+    assert is_not_modified(None, http_date(CHANGED_AT), etag, CHANGED_AT)
+    assert not is_not_modified(None, "Tue, 05 May 2026 00:00:00 GMT", etag, CHANGED_AT)
+    assert not is_not_modified(None, "not a date", etag, CHANGED_AT)
+    assert not is_not_modified(None, http_date(CHANGED_AT), etag, None)
+
+
+@pytest.fixture(scope="module")
+def parse_if_match(server):
+    return server.parse_if_match
+
+
+def test_parse_if_match_versions(parse_if_match):
+    assert parse_if_match(None) is None
+    assert parse_if_match("*") is None
+    assert parse_if_match('"v7"') == 7
+    assert parse_if_match(entity_etag(7, CHANGED_AT)) == 7
+    assert parse_if_match(f"W/{entity_etag(12, CHANGED_AT)}") == 12
+
+
+@pytest.mark.parametrize("header", ['"abc"', '"v"', '"vx.1"', '"7"'])
+def test_parse_if_match_rejects_foreign_tags(parse_if_match, header):
+    with pytest.raises(HTTPException) as error:
+        parse_if_match(header)
+    assert error.value.status_code == 412
@@ -0,0 +1,105 @@
+import pytest
+
+from customer_index import CustomerPrefixIndex, customer_tokens
+
+pytestmark = pytest.mark.anyio
+
+CUSTOMERS = [
+    {"id": "c1", "name": "Nguyễn Văn An", "phone": "0901234567", "type": "INDIVIDUAL"},
+    {"id": "c2", "name": "Nguyễn Thị Bình", "phone": "0912345678", "type": "AGENT"},
+    {"id": "c3", "name": "Trần An", "phone": "0987654321", "type": "INDIVIDUAL"},
+]
+
+
+class ScriptedCollection:
+    """find() cursor that runs a callback part-way through - writes landing during a build"""
+
+    def __init__(self, documents, during=None):
+        self.documents = documents
+        self.during = during
+
+    def find(self, query, projection):
+        async def cursor():
+            for position, document in enumerate(self.documents):
+                if position == 1 and self.during:
+                    self.during()
+                yield dict(document)
+        return cursor()
+
+
+@pytest.fixture
+async def index():
+    index = CustomerPrefixIndex(ScriptedCollection(CUSTOMERS), {})
+    await index.build()
+    return index
+
+
+def ids(results):
+    return [customer["id"] for customer in results]
+
+
+def test_tokens_are_folded_name_words_and_phone_suffixes():
+    tokens = customer_tokens({"name": "Nguyễn Văn An", "phone": "090-123"})
+    assert {"nguyen", "van", "an"} <= tokens
+    assert {"090123", "90123", "0123", "123"} <= tokens
+    assert "23" not in tokens
+
+
+async def test_name_prefix_is_accent_insensitive(index):
+    assert sorted(ids(index.search("nguy"))) == ["c1", "c2"]
+    assert ids(index.search("Bình")) == ["c2"]
+
+
+async def test_every_term_must_match(index):
+    assert ids(index.search("an tran")) == ["c3"]
+    assert ids(index.search("nguyen binh")) == ["c2"]
+    assert index.search("nguyen tran") == []
+
+
+async def test_phone_fragment_matches_anywhere(index):
+    assert ids(index.search("9012")) == ["c1"]
+    assert sorted(ids(index.search("4567"))) == ["c1", "c2"]
+    assert ids(index.search("0987")) == ["c3"]
+
+
+async def test_search_honours_limit_without_duplicates(index):
+    results = index.search("0", limit=10)
+    assert sorted(ids(results)) == ["c1", "c2", "c3"]
+    assert len(index.search("0", limit=2)) == 2
+
+
+async def test_query_without_terms(index):
+    assert index.search(" - ") == []
+
+
+async def test_upsert_replaces_the_old_tokens(index):
+    index.upsert({"id": "c1", "name": "Lê Văn Cường", "phone": "0901234567", "type": "AGENT"})
+    assert ids(index.search("cuong")) == ["c1"]
+    assert ids(index.search("nguyen")) == ["c2"]
+    assert index.search("cuong")[0]["type"] == "AGENT"
+    assert len(index) == 3
+
+
+async def test_remove(index):
+    index.remove("c2")
+    assert index.search("binh") == []
+    assert len(index) == 2
+    index.remove("missing")
+
+
+async def test_writes_during_a_build_are_replayed_on_the_snapshot():
+    index = CustomerPrefixIndex(None, {})
+
+    def concurrent_writes():
+        # c1 renamed and c3 deleted after the cursor read them, a new customer created meanwhile
+        index.upsert({"id": "c1", "name": "Phạm Minh", "phone": "0901234567"})
+        index.remove("c3")
+        index.upsert({"id": "c4", "name": "Đỗ Hoa", "phone": "0933333333"})
+
+    index.collection = ScriptedCollection(CUSTOMERS, during=concurrent_writes)
+    await index.build()
+
+    assert ids(index.search("pham")) == ["c1"]
+    assert index.search("an tran") == []
+    assert ids(index.search("hoa")) == ["c4"]
+    assert sorted(index._entries) == ["c1", "c2", "c4"]
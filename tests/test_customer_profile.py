@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from customer_summary import CustomerSummaries
+
+pytestmark = pytest.mark.anyio
+
+CUSTOMER_ID = str(uuid4())
+START = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def profile(server, real_db, monkeypatch):
+    monkeypatch.setattr(server, "db", real_db)
+    monkeypatch.setattr(server, "customer_summaries", CustomerSummaries(real_db))
+    await real_db.customers.insert_one({
+        "id": CUSTOMER_ID, "name": "Tran Thi B", "type": "INDIVIDUAL", "created_at": START
+    })
+    await real_db.sales.insert_many([
+        {"id": f"s{n}", "customer_id": CUSTOMER_ID, "total": 100, "profit_value": 10,
+         "bill_ids": ["b1", "b2"], "created_at": START + timedelta(hours=2 * n)}
+        for n in range(7)
+    ])
+    await real_db.dao_transactions.insert_many([
+        {"id": f"d{n}", "customer_id": CUSTOMER_ID, "amount": 1000, "profit_value": 30,
+         "transaction_type": "CREDIT_DAO_POS", "transaction_id": f"D{n}",
+         "created_at": START + timedelta(hours=2 * n + 1)}
+        for n in range(7)
+    ])
+    await real_db.credit_cards.insert_many([
+        {"id": "k1", "customer_id": CUSTOMER_ID, "card_number": "4111111111111111", "credit_limit": 5000,
+         "status": "Cần đáo"},
+        {"id": "k2", "customer_id": CUSTOMER_ID, "card_number": "5500000000000004", "credit_limit": 3000,
+         "status": "Hết hạn"},
+    ])
+    # Summaries as the sale/DAO outbox handlers leave them
+    for sale in await real_db.sales.find().to_list(None):
+        await server.customer_summaries.record(sale["id"], CUSTOMER_ID, "BILL_SALE", 100, 10, sale["created_at"])
+    for dao in await real_db.dao_transactions.find().to_list(None):
+        await server.customer_summaries.record(dao["id"], CUSTOMER_ID, "CREDIT_DAO_POS", 1000, 30, dao["created_at"])
+    return server.get_customer_detailed_profile
+
+
+async def test_recent_activity_is_the_newest_five_of_each_kind(profile):
+    result = await profile(CUSTOMER_ID)
+    assert [activity["id"] for activity in result["recent_activities"]] == [
+        "d6", "s6", "d5", "s5", "d4", "s4", "d3", "s3", "d2", "s2"
+    ]
+    assert result["recent_activities"][1]["bills_count"] == 2
+
+
+async def test_cards_and_metrics(profile):
+    result = await profile(CUSTOMER_ID)
+    cards = result["credit_cards"]
+    assert (cards["total_cards"], cards["active_cards"], cards["total_credit_limit"]) == (2, 1, 8000)
+    assert {card["card_number"] for card in cards["cards"]} == {"****1111", "****0004"}
+    assert result["metrics"]["sales_transactions"] == 7
+    assert result["metrics"]["dao_transactions"] == 7
+    assert result["metrics"]["total_transaction_value"] == 7700
+
+
+async def test_unknown_customer(profile):
+    with pytest.raises(HTTPException) as error:
+        await profile(str(uuid4()))
+    assert error.value.status_code == 404
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from customer_summary import (
+    CustomerSummaries,
+    RebuildInProgress,
+    customer_tier,
+    customer_totals,
+    empty_summary,
+)
+from outbox import RetryLater
+
+pytestmark = pytest.mark.anyio
+
+MARCH = datetime(2026, 3, 15, tzinfo=timezone.utc)
+APRIL = datetime(2026, 4, 2, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def summaries(db):
+    summaries = CustomerSummaries(db)
+    await summaries.ensure_indexes()
+    return summaries
+
+
+def test_tiers():
+    assert [customer_tier(value) for value in (0, 5_000_000, 20_000_000, 50_000_000)] == [
+        "New", "Regular", "Premium", "VIP"
+    ]
+
+
+def test_customer_totals_split_sales_from_daos():
+    summary = {
+        **empty_summary("c1"),
+        "total_value": 300, "total_profit": 30, "total_transactions": 3, "tier": "Regular",
+        "by_type": {
+            "BILL_SALE": {"count": 1, "value": 100, "profit": 10},
+            "CREDIT_DAO_POS": {"count": 2, "value": 200, "profit": 20},
+        },
+    }
+    totals = customer_totals(summary)
+    assert totals == {
+        "tier": "SILVER",
+        "total_transactions": 3,
+        "total_spent": 300,
+        "total_profit_generated": 30,
+        "total_dao_amount": 200,
+        "total_dao_transactions": 2,
+        "total_dao_profit": 20,
+    }
+    assert customer_totals({**summary, "total_cards": 2})["total_cards"] == 2
+
+
+async def test_record_rolls_up_by_type_and_month(summaries):
+    await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+    await summaries.record("d1", "c1", "CREDIT_DAO_POS", 6_000_000, 60, APRIL)
+
+    summary = await summaries.get("c1")
+    assert (summary["total_value"], summary["total_transactions"]) == (6_000_100, 2)
+    assert summary["by_type"]["BILL_SALE"] == {"count": 1, "value": 100, "profit": 10}
+    assert summary["months"]["2026-04"]["value"] == 6_000_000
+    assert summary["tier"] == "Regular"
+
+
+async def test_redelivered_transaction_counts_once(summaries):
+    for _ in range(3):
+        await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+    assert (await summaries.get("c1"))["total_transactions"] == 1
+
+
+async def test_customer_without_summary_gets_an_empty_one(summaries):
+    assert await summaries.get("nobody") == empty_summary("nobody")
+
+
+async def test_overlay_keeps_stored_totals_without_a_summary(summaries):
+    await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+    customers = [
+        {"id": "c1", "total_spent": 999.0, "total_cards": 4},
+        {"id": "c2", "total_spent": 50.0, "total_cards": 1},
+    ]
+    returned = await summaries.overlay(customers)
+
+    assert customers[0]["total_spent"] == 100
+    # Cards not counted into the summary yet - stored figure stays
+    assert customers[0]["total_cards"] == 4
+    assert customers[1] == {"id": "c2", "total_spent": 50.0, "total_cards": 1}
+    assert returned["c2"] == empty_summary("c2")
+
+
+async def test_card_recount(summaries, db):
+    await db.credit_cards.insert_many([
+        {"id": "k1", "customer_id": "c1"},
+        {"id": "k2", "customer_id": "c1"},
+        {"id": "k3", "customer_id": "c1", "deleted_at": MARCH},
+    ])
+    await summaries.record_cards("c1")
+    assert (await summaries.get("c1"))["total_cards"] == 2
+
+    await db.credit_cards.delete_one({"id": "k1"})
+    await summaries.record_cards("c1")
+    await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+    summary = await summaries.get("c1")
+    assert (summary["total_cards"], summary["total_transactions"]) == (1, 1)
+
+
+async def test_older_recount_does_not_overwrite_a_newer_one(summaries):
+    later = datetime.now(timezone.utc) + timedelta(minutes=1)
+    await summaries.collection.insert_one({"customer_id": "c1", "total_cards": 3, "cards_counted_at": later})
+    await summaries.record_cards("c1")
+    assert (await summaries.get("c1"))["total_cards"] == 3
+
+
+async def test_events_wait_while_a_rebuild_holds_the_lease(summaries):
+    generation = await summaries._lock()
+    with pytest.raises(RetryLater):
+        await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+    with pytest.raises(RetryLater):
+        await summaries.record_cards("c1")
+    with pytest.raises(RebuildInProgress):
+        await summaries._lock()
+
+    await summaries._unlock(generation)
+    await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+    assert (await summaries.get("c1"))["total_transactions"] == 1
+
+
+async def test_rebuild_from_sources(real_db):
+    summaries = CustomerSummaries(real_db)
+    await summaries.ensure_indexes()
+    await real_db.sales.insert_many([
+        {"id": "s1", "customer_id": "c1", "total": 100, "profit_value": 10, "created_at": MARCH},
+        # Legacy rows - an isoformat string and one that does not parse
+        {"id": "s2", "customer_id": "c1", "total": 200, "profit_value": 20, "created_at": APRIL.isoformat()},
+        {"id": "s3", "customer_id": "c1", "total": 300, "profit_value": 30, "created_at": "2026-13-45"},
+    ])
+    await real_db.dao_transactions.insert_one(
+        {"id": "d1", "customer_id": "c1", "amount": 1000, "profit_value": 50, "created_at": APRIL}
+    )
+    await real_db.credit_cards.insert_many([
+        {"id": "k1", "customer_id": "c1"},
+        {"id": "k2", "customer_id": "c2"},
+        {"id": "k3", "customer_id": "c2", "deleted_at": MARCH},
+    ])
+    # Left over from a customer whose transactions are gone
+    await summaries.record("gone", "c3", "BILL_SALE", 5, 1, MARCH)
+    # Already counted - replaying its event after the rebuild changes nothing
+    await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+
+    assert await summaries.rebuild() == 1
+
+    c1 = await summaries.get("c1")
+    assert (c1["total_value"], c1["total_transactions"], c1["total_cards"]) == (1600, 4, 1)
+    assert c1["by_type"]["CREDIT_DAO_POS"] == {"count": 1, "value": 1000, "profit": 50}
+    assert c1["months"] == {
+        "2026-03": {"count": 1, "value": 100, "profit": 10},
+        "2026-04": {"count": 2, "value": 1200, "profit": 70},
+    }
+    c2 = await summaries.get("c2")
+    assert (c2["total_cards"], c2["total_transactions"], c2["tier"]) == (1, 0, "New")
+    assert await summaries.get("c3") == empty_summary("c3")
+
+    await summaries.record("s1", "c1", "BILL_SALE", 100, 10, MARCH)
+    assert (await summaries.get("c1"))["total_transactions"] == 4
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import anyio
+import pytest
+
+import delta_sync
+from delta_sync import (
+    SETTLE_SECONDS,
+    TOMBSTONE_RETENTION_SECONDS,
+    ChangeSource,
+    InvalidSyncToken,
+    Tombstones,
+    collect_changes,
+    decode_sync_token,
+    encode_sync_token,
+    token_expired,
+)
+
+
+def test_sync_token_round_trip():
+    moment = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    watermarks = {"customers": (moment, "c1"), "summaries": (moment + timedelta(seconds=1), "c2")}
+    assert decode_sync_token(encode_sync_token(watermarks)) == watermarks
+
+
+def test_naive_watermarks_are_encoded_as_utc():
+    naive = datetime(2026, 1, 2, 3, 4, 5)
+    decoded = decode_sync_token(encode_sync_token({"customers": (naive, "c1")}))
+    assert decoded["customers"] == (naive.replace(tzinfo=timezone.utc), "c1")
+
+
+def test_absent_token_means_from_the_beginning():
+    assert decode_sync_token(None) == {}
+    assert decode_sync_token("") == {}
+
+
+@pytest.mark.parametrize("token", ["%%%", "bm90IGpzb24", "W10="])
+def test_invalid_token(token):
+    with pytest.raises(InvalidSyncToken):
+        decode_sync_token(token)
+
+
+def test_token_expired():
+    now = datetime.now(timezone.utc)
+    retention = timedelta(seconds=TOMBSTONE_RETENTION_SECONDS)
+    assert not token_expired({})
+    assert not token_expired({"customers": (now - retention + timedelta(hours=1), "c1")})
+    assert token_expired({
+        "customers": (now, "c1"),
+        "bills": (now - retention - timedelta(hours=1), "b1"),
+    })
+
+
+def ago(seconds):
+    return datetime.now(timezone.utc) - timedelta(seconds=seconds)
+
+
+@pytest.fixture
+async def customers(db):
+    await db.customers.insert_many([
+        {"id": "c2", "updated_at": ago(60)},
+        {"id": "c1", "updated_at": ago(60)},
+        {"id": "c3", "updated_at": ago(30)},
+        {"id": "legacy", "updated_at": None},
+        # Inside the settle window - left for the next poll
+        {"id": "fresh", "updated_at": ago(0)},
+    ])
+    return ChangeSource(db.customers, {})
+
+
+@pytest.mark.anyio
+async def test_first_poll_returns_settled_changes_oldest_first(customers):
+    ids, watermarks, has_more = await collect_changes({"customers": customers}, {}, limit=10)
+    assert ids == ["c1", "c2", "c3"]
+    assert not has_more
+    # Drained - the watermark moves to the settle point, before the fresh write
+    moment, last_id = watermarks["customers"]
+    assert last_id == ""
+    assert ago(SETTLE_SECONDS + 5) < moment < ago(SETTLE_SECONDS - 1)
+
+
+@pytest.mark.anyio
+async def test_pages_continue_after_the_last_id_at_one_timestamp(customers):
+    ids, watermarks, has_more = await collect_changes({"customers": customers}, {}, limit=1)
+    assert (ids, has_more) == (["c1"], True)
+
+    ids, watermarks, has_more = await collect_changes({"customers": customers}, watermarks, limit=1)
+    assert (ids, has_more) == (["c2"], True)
+
+    ids, watermarks, has_more = await collect_changes({"customers": customers}, watermarks, limit=1)
+    assert (ids, has_more) == (["c3"], False)
+
+
+@pytest.mark.anyio
+async def test_write_is_picked_up_once_it_settles(customers, monkeypatch):
+    monkeypatch.setattr(delta_sync, "SETTLE_SECONDS", 0.2)
+    ids, watermarks, _ = await collect_changes({"customers": customers}, {}, limit=10)
+    assert "fresh" not in ids
+
+    await anyio.sleep(0.3)
+    ids, _, _ = await collect_changes({"customers": customers}, watermarks, limit=10)
+    assert ids == ["fresh"]
+
+
+@pytest.mark.anyio
+async def test_sources_are_merged_without_duplicates(customers, db):
+    await db.customer_summaries.insert_many([
+        {"customer_id": "c3", "updated_at": ago(10)},
+        {"customer_id": "c9", "updated_at": ago(10)},
+    ])
+    sources = {
+        "customers": customers,
+        "summaries": ChangeSource(db.customer_summaries, {}, id_field="customer_id"),
+    }
+    ids, watermarks, _ = await collect_changes(sources, {}, limit=10)
+    assert ids == ["c1", "c2", "c3", "c9"]
+    assert set(watermarks) == {"customers", "summaries"}
+
+
+@pytest.mark.anyio
+async def test_tombstones(db):
+    tombstones = Tombstones(db.tombstones, tracked=("customers",))
+    await tombstones.record("customers", ["c1", None])
+    await tombstones.record("activities", ["a1"])
+    assert await db.tombstones.count_documents({}) == 1
+
+    await db.tombstones.update_many({}, {"$set": {"deleted_at": ago(SETTLE_SECONDS + 1)}})
+    ids, watermarks, _ = await collect_changes({"deleted": tombstones.source("customers")}, {}, limit=10)
+    assert ids == ["c1"]
+    # Not reported twice
+    ids, _, _ = await collect_changes({"deleted": tombstones.source("customers")}, watermarks, limit=10)
+    assert ids == []
@@ -0,0 +1,76 @@
+import pytest
+from fastapi import HTTPException
+
+from idempotency import IdempotencyStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store(db):
+    return IdempotencyStore(db.idempotency_keys)
+
+
+def counting_handler(result):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return result
+
+    return handler, calls
+
+
+async def test_replays_the_first_response(store):
+    handler, calls = counting_handler({"sale_id": "s1", "total": 100})
+    first = await store.execute("key-1", "sale", {"bill_ids": ["b1"]}, handler)
+    second = await store.execute("key-1", "sale", {"bill_ids": ["b1"]}, handler)
+
+    assert len(calls) == 1
+    assert second.body == first.body
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+
+async def test_key_reused_with_another_body_is_rejected(store):
+    handler, calls = counting_handler({"sale_id": "s1"})
+    await store.execute("key-1", "sale", {"bill_ids": ["b1"]}, handler)
+
+    with pytest.raises(HTTPException) as error:
+        await store.execute("key-1", "sale", {"bill_ids": ["b2"]}, handler)
+    assert error.value.status_code == 422
+    assert len(calls) == 1
+
+
+async def test_keys_are_scoped(store):
+    handler, calls = counting_handler({"ok": True})
+    await store.execute("key-1", "sale", {}, handler)
+    await store.execute("key-1", "dao", {}, handler)
+    assert len(calls) == 2
+
+
+async def test_failed_request_releases_the_key(store):
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await store.execute("key-1", "sale", {}, failing)
+
+    handler, calls = counting_handler({"ok": True})
+    await store.execute("key-1", "sale", {}, handler)
+    assert len(calls) == 1
+
+
+async def test_without_key_every_request_runs(store):
+    handler, calls = counting_handler({"ok": True})
+    await store.execute(None, "sale", {}, handler)
+    await store.execute(None, "sale", {}, handler)
+    assert len(calls) == 2
+    assert await store.collection.count_documents({}) == 0
+
+
+async def test_overlong_key_is_rejected(store):
+    handler, _ = counting_handler({})
+    with pytest.raises(HTTPException) as error:
+        await store.execute("k" * 256, "sale", {}, handler)
+    assert error.value.status_code == 400
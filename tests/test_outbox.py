@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from outbox import STATUS_DONE, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING, Outbox, RetryLater
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def outbox(db):
+    return Outbox(None, db.outbox_events, max_attempts=2)
+
+
+def collecting(outbox, event_type):
+    delivered = []
+
+    @outbox.handler(event_type)
+    async def handle(event):
+        delivered.append(event["payload"])
+
+    return delivered
+
+
+async def test_events_are_delivered_in_order_and_marked_done(outbox):
+    delivered = collecting(outbox, "sale.created")
+    for n in range(3):
+        await outbox.record("sale.created", {"n": n})
+
+    assert await outbox.process_batch() == 3
+    assert delivered == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert await outbox.collection.count_documents({"status": STATUS_DONE}) == 3
+    # Nothing left to claim
+    assert await outbox.process_batch() == 0
+
+
+async def test_failed_delivery_is_retried_with_backoff(outbox):
+    @outbox.handler("sale.created")
+    async def fail(event):
+        raise RuntimeError("boom")
+
+    event_id = await outbox.record("sale.created", {})
+    await outbox.process_batch()
+
+    event = await outbox.collection.find_one({"_id": event_id})
+    assert event["status"] == STATUS_PENDING
+    assert event["attempts"] == 1
+    assert event["last_error"] == "boom"
+    # Backing off - not due yet
+    assert await outbox.process_batch() == 0
+
+
+async def test_event_is_parked_after_max_attempts(outbox):
+    @outbox.handler("sale.created")
+    async def fail(event):
+        raise RuntimeError("boom")
+
+    event_id = await outbox.record("sale.created", {})
+    for _ in range(2):
+        await outbox.collection.update_one({"_id": event_id}, {"$set": {"available_at": datetime.now(timezone.utc)}})
+        await outbox.process_batch()
+
+    event = await outbox.collection.find_one({"_id": event_id})
+    assert event["status"] == STATUS_FAILED
+    assert (await outbox.metrics())["failed"] == 1
+
+
+async def test_expired_claim_is_taken_over(outbox):
+    delivered = collecting(outbox, "dao.created")
+    event_id = await outbox.record("dao.created", {"dao_id": "d1"})
+    # Claimed by a worker that died mid-batch
+    await outbox.collection.update_one({"_id": event_id}, {"$set": {
+        "status": STATUS_PROCESSING,
+        "claim_id": "dead",
+        "locked_until": datetime.now(timezone.utc) - timedelta(seconds=1),
+    }})
+
+    assert await outbox.process_batch() == 1
+    assert delivered == [{"dao_id": "d1"}]
+
+
+async def test_live_claim_is_left_alone(outbox):
+    delivered = collecting(outbox, "dao.created")
+    event_id = await outbox.record("dao.created", {})
+    await outbox.collection.update_one({"_id": event_id}, {"$set": {
+        "status": STATUS_PROCESSING,
+        "claim_id": "other",
+        "locked_until": datetime.now(timezone.utc) + timedelta(seconds=60),
+    }})
+
+    assert await outbox.process_batch() == 0
+    assert delivered == []
+
+
+async def test_standalone_server_writes_without_a_session(outbox):
+    async with outbox.transaction() as session:
+        assert session is None
+
+
+async def test_metrics_report_the_backlog(outbox):
+    await outbox.record("sale.created", {})
+    metrics = await outbox.metrics()
+    assert metrics["pending"] == 1
+    assert metrics["lag_seconds"] >= 0
+    assert not metrics["worker_running"]
+
+
+async def test_retry_later_defers_without_using_an_attempt(outbox):
+    @outbox.handler("sale.created")
+    async def busy(event):
+        raise RetryLater(30, "rebuilding")
+
+    event_id = await outbox.record("sale.created", {})
+    await outbox.process_batch()
+
+    event = await outbox.collection.find_one({"_id": event_id})
+    assert (event["status"], event["attempts"]) == (STATUS_PENDING, 0)
+    assert "last_error" not in event
+    assert event["available_at"] > datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=20)
+    assert (await outbox.metrics())["deferred_total"] == 1
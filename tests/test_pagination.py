@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+
+
+def test_cursor_round_trip_datetime():
+    created = datetime(2026, 3, 4, 5, 6, 7, 123000, tzinfo=timezone.utc)
+    cursor = encode_cursor({"id": "abc", "created_at": created}, "created_at")
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "created_at") == (created, "abc")
+
+
+def test_cursor_round_trip_plain_and_null_values():
+    assert decode_cursor(encode_cursor({"id": "a", "amount": 1500}, "amount"), "amount") == (1500, "a")
+    assert decode_cursor(encode_cursor({"id": "a"}, "amount"), "amount") == (None, "a")
+
+
+def test_cursor_for_another_sort_field_is_rejected():
+    cursor = encode_cursor({"id": "abc", "amount": 1}, "amount")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, "created_at")
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "e30", "eyJmIjoiYSJ9"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, "a")
+
+
+def test_keyset_filter_after_value():
+    assert keyset_filter("amount", 10, "m") == {"$or": [
+        {"amount": {"$lt": 10}},
+        {"amount": 10, "id": {"$lt": "m"}},
+        {"amount": None},
+    ]}
+
+
+def test_keyset_filter_after_null_stays_in_nulls():
+    assert keyset_filter("amount", None, "m") == {"amount": None, "id": {"$lt": "m"}}
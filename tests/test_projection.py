@@ -0,0 +1,27 @@
+import pytest
+
+from projection import FIELD_PRESETS, InvalidFields, parse_fields
+
+ALLOWED = ["name", "phone", "type", "tier", "is_active", "total_transactions", "total_spent", "created_at", "email"]
+
+
+def test_no_fields_means_full_document():
+    assert parse_fields(None, "customers", ALLOWED) is None
+    assert parse_fields("", "customers", ALLOWED) is None
+
+
+def test_fields_keep_order_and_always_include_id():
+    assert parse_fields("phone, name,,phone", "customers", ALLOWED) == ["id", "phone", "name"]
+
+
+def test_preset_expands_without_duplicates():
+    selected = parse_fields("name,summary,email", "customers", ALLOWED)
+    assert selected[:2] == ["id", "name"]
+    assert selected[2:-1] == [field for field in FIELD_PRESETS["customers"]["summary"] if field != "name"]
+    assert selected[-1] == "email"
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(InvalidFields) as error:
+        parse_fields("name,ccv", "customers", ALLOWED)
+    assert "ccv" in str(error.value)
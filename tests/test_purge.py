@@ -0,0 +1,66 @@
+import pytest
+
+from purge import NOT_DELETED, STATUS_DONE, STATUS_PENDING, STATUS_RUNNING, CustomerPurger
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def purger(db):
+    await db.customers.insert_many([
+        {"id": "c1", "deleted_at": "2026-01-01"},
+        {"id": "c2", "deleted_at": None},
+    ])
+    await db.credit_cards.insert_many(
+        [{"id": f"k{n}", "customer_id": "c1"} for n in range(5)] + [{"id": "k9", "customer_id": "c2"}]
+    )
+    await db.sales.insert_many([{"id": "s1", "customer_id": "c1"}, {"id": "s2", "customer_id": "c2"}])
+    return CustomerPurger(db, ["credit_cards", "sales"], batch_size=2, pause_seconds=0, hidden=["credit_cards"])
+
+
+async def test_enqueue_hides_related_documents_right_away(purger, db):
+    job = await purger.enqueue("c1")
+
+    assert job["status"] == STATUS_PENDING
+    assert job["progress"] == {"credit_cards": 0, "sales": 0}
+    assert await db.credit_cards.count_documents({"customer_id": "c1", **NOT_DELETED}) == 0
+    assert await db.credit_cards.count_documents({"customer_id": "c2", **NOT_DELETED}) == 1
+    # Not listed as hidden - left for the purge
+    assert await db.sales.count_documents({"customer_id": "c1", **NOT_DELETED}) == 1
+    assert (await purger.get_job(job["id"]))["customer_id"] == "c1"
+
+
+async def test_run_job_deletes_related_documents_and_the_tombstone(purger, db):
+    job = await purger.enqueue("c1")
+    await purger.run_job(job)
+
+    assert await db.credit_cards.count_documents({"customer_id": "c1"}) == 0
+    assert await db.sales.count_documents({"customer_id": "c1"}) == 0
+    assert await db.customers.count_documents({"id": "c1"}) == 0
+    # Other customers are untouched
+    assert await db.credit_cards.count_documents({"customer_id": "c2"}) == 1
+    assert await db.customers.count_documents({"id": "c2"}) == 1
+
+    done = await purger.get_job(job["id"])
+    assert done["status"] == STATUS_DONE
+    assert done["progress"] == {"credit_cards": 5, "sales": 1}
+
+
+async def test_live_customer_is_never_deleted(purger, db):
+    job = await purger.enqueue("c2")
+    await purger.run_job(job)
+    assert await db.customers.count_documents({"id": "c2"}) == 1
+    assert await db.credit_cards.count_documents({"customer_id": "c2"}) == 0
+
+
+async def test_claim_takes_pending_jobs_oldest_first(real_db):
+    # mongomock re-reads the post-image with the pre-update query - status would no longer match
+    purger = CustomerPurger(real_db, ["sales"], pause_seconds=0)
+    first = await purger.enqueue("c1")
+    await purger.enqueue("c2")
+
+    claimed = await purger._claim()
+    assert claimed["id"] == first["id"]
+    assert (await purger.get_job(first["id"]))["status"] == STATUS_RUNNING
+    assert (await purger._claim())["customer_id"] == "c2"
+    assert await purger._claim() is None
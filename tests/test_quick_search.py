@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from quick_search import (
+    SCORE_EXACT,
+    SCORE_PREFIX,
+    SCORE_TOKEN,
+    SHAPE_BILL_ID,
+    SHAPE_CARD_LAST4,
+    SHAPE_CUSTOMER_CODE,
+    SHAPE_DAO_ID,
+    SHAPE_PHONE,
+    SHAPE_TEXT,
+    SHAPE_UUID,
+    classify,
+    rank,
+    run_sources,
+)
+from search_tokens import SEARCH_TOKENS_FIELD
+
+
+@pytest.mark.parametrize("query, shapes", [
+    ("1234", {SHAPE_CARD_LAST4, SHAPE_PHONE}),
+    ("090.123.4567", {SHAPE_PHONE, SHAPE_CUSTOMER_CODE}),
+    ("D98550509", {SHAPE_DAO_ID, SHAPE_CUSTOMER_CODE, SHAPE_TEXT}),
+    ("PA22040444645", {SHAPE_CUSTOMER_CODE, SHAPE_TEXT}),
+    ("PA220404446451025", {SHAPE_BILL_ID, SHAPE_CUSTOMER_CODE, SHAPE_TEXT}),
+    ("Nguyễn An", {SHAPE_TEXT}),
+    (" c3f1b2a4-1111-4222-8333-444455556666 ", {SHAPE_UUID}),
+    ("12", set()),
+])
+def test_classify(query, shapes):
+    assert classify(query) == shapes
+
+
+def hit(hit_type, hit_id, score):
+    return {"type": hit_type, "id": hit_id, "score": score}
+
+
+def test_rank_keeps_the_best_hit_per_entity():
+    hits = [
+        hit("customer", "c1", SCORE_PREFIX),
+        hit("bill", "b1", SCORE_TOKEN),
+        hit("customer", "c1", SCORE_EXACT),
+        hit("sale", "c1", SCORE_TOKEN),
+    ]
+    ranked = rank(hits, limit=10)
+    assert [(h["type"], h["score"]) for h in ranked] == [
+        ("customer", SCORE_EXACT), ("bill", SCORE_TOKEN), ("sale", SCORE_TOKEN)
+    ]
+    assert len(rank(hits, limit=1)) == 1
+
+
+@pytest.mark.anyio
+async def test_slow_and_failing_sources_are_skipped():
+    async def fast():
+        return [hit("customer", "c1", SCORE_EXACT)]
+
+    async def slow():
+        await asyncio.sleep(1)
+        return [hit("bill", "b1", SCORE_EXACT)]
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    hits, skipped = await run_sources({"customers": fast(), "bills": slow(), "sales": broken()}, budget_seconds=0.05)
+    assert [h["id"] for h in hits] == ["c1"]
+    assert sorted(skipped) == ["bills", "sales"]
+
+
+@pytest.fixture
+async def sources(server, db, monkeypatch):
+    monkeypatch.setattr(server, "db", db)
+    deleted = {"deleted_at": "2026-01-01"}
+    await db.credit_cards.insert_many([
+        {"id": "k1", "card_last4": "1234", "bank_name": "VCB"},
+        {"id": "k2", "card_last4": "1234", "bank_name": "ACB", **deleted},
+    ])
+    await db.bills.insert_many([
+        {"id": "PA220404446451025", "customer_code": "PA22040444645"},
+        {"id": "PA220404446451125", "customer_code": "PA22040444645", **deleted},
+    ])
+    await db.sales.insert_many([
+        {"id": "s1", SEARCH_TOKENS_FIELD: ["nguyen"], "total": 1, "created_at": 1},
+        {"id": "s2", SEARCH_TOKENS_FIELD: ["nguyen"], "total": 1, "created_at": 2, **deleted},
+    ])
+    await db.dao_transactions.insert_many([
+        {"id": "d1", "transaction_id": "D98550509", "created_at": 1},
+        {"id": "d2", "transaction_id": "D98550509-2", "created_at": 2, **deleted},
+    ])
+    return server
+
+
+@pytest.mark.anyio
+async def test_sources_skip_soft_deleted_documents(sources):
+    cards = await sources.quick_search_cards("1234", classify("1234"), 10)
+    bills = await sources.quick_search_bills("PA220404446451025", classify("PA220404446451025"), 10)
+    sales = await sources.quick_search_sales("nguyen", classify("nguyen"), 10)
+    daos = await sources.quick_search_dao("D98550509", classify("D98550509"), 10)
+
+    assert [h["id"] for h in cards] == ["k1"]
+    assert {h["id"] for h in bills} == {"PA220404446451025"}
+    assert [h["id"] for h in sales] == ["s1"]
+    assert [(h["id"], h["score"]) for h in daos] == [("d1", SCORE_EXACT)]
@@ -0,0 +1,81 @@
+import pytest
+
+from repository import Repository, VersionConflict
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def repo(db):
+    return Repository(db.bills)
+
+
+async def test_insert_returns_the_stored_document(repo):
+    document = await repo.insert({"id": "b1", "amount": 100})
+    assert "_id" not in document
+    assert await repo.get({"id": "b1"}) == document
+
+
+async def test_update_returns_the_post_image(repo):
+    await repo.insert({"id": "b1", "amount": 100})
+    updated = await repo.update({"id": "b1"}, {"$set": {"amount": 200}})
+    assert updated["amount"] == 200
+    assert "_id" not in updated
+
+
+async def test_update_of_a_missing_document_returns_none(repo):
+    assert await repo.update({"id": "missing"}, {"$set": {"amount": 1}}) is None
+
+
+async def test_update_can_upsert(repo):
+    created = await repo.update({"id": "b1"}, {"$set": {"amount": 5}}, upsert=True)
+    assert created["id"] == "b1"
+
+
+async def test_delete_returns_the_deleted_document(repo):
+    await repo.insert({"id": "b1", "amount": 100})
+    deleted = await repo.delete({"id": "b1"})
+    assert deleted["amount"] == 100
+    assert await repo.get({"id": "b1"}) is None
+    assert await repo.delete({"id": "b1"}) is None
+
+
+async def test_get_with_projection(repo):
+    await repo.insert({"id": "b1", "amount": 100, "status": "AVAILABLE"})
+    assert await repo.get({"id": "b1"}, {"_id": 0, "status": 1}) == {"status": "AVAILABLE"}
+
+
+async def test_writes_bump_the_version(repo):
+    assert (await repo.insert({"id": "b1"}))["version"] == 1
+    assert (await repo.update({"id": "b1"}, {"$set": {"amount": 1}}))["version"] == 2
+
+
+async def test_update_at_the_expected_version(real_db):
+    # mongomock re-reads the post-image with the pre-update query - version would no longer match
+    repo = Repository(real_db.bills)
+    await repo.insert({"id": "b1", "amount": 100})
+    updated = await repo.update({"id": "b1"}, {"$set": {"amount": 200}}, expected_version=1)
+    assert (updated["amount"], updated["version"]) == (200, 2)
+
+
+async def test_stale_version_raises_conflict(repo):
+    await repo.insert({"id": "b1", "amount": 100})
+    await repo.update({"id": "b1"}, {"$set": {"amount": 200}})
+
+    with pytest.raises(VersionConflict):
+        await repo.update({"id": "b1"}, {"$set": {"amount": 300}}, expected_version=1)
+    with pytest.raises(VersionConflict):
+        await repo.get({"id": "b1"}, expected_version=1)
+    assert (await repo.get({"id": "b1"}))["amount"] == 200
+
+
+async def test_missing_document_is_not_a_conflict(repo):
+    assert await repo.update({"id": "missing"}, {"$set": {"amount": 1}}, expected_version=1) is None
+    assert await repo.get({"id": "missing"}, expected_version=1) is None
+
+
+async def test_legacy_document_without_version_is_version_zero(real_db):
+    repo = Repository(real_db.bills)
+    await repo.collection.insert_one({"id": "b1", "amount": 100})
+    updated = await repo.update({"id": "b1"}, {"$set": {"amount": 200}}, expected_version=0)
+    assert updated["version"] == 1
@@ -0,0 +1,24 @@
+from search_tokens import SEARCH_TOKENS_FIELD, fold, search_filter
+
+
+def test_fold_strips_vietnamese_diacritics():
+    assert fold("Nguyễn Đức Thắng") == "nguyen duc thang"
+    assert fold("đường ĐÀO") == "duong dao"
+    assert fold("PA22040444645") == "pa22040444645"
+
+
+def test_search_filter_prefix_matches_every_term():
+    assert search_filter("Nguyễn  0912") == {"$and": [
+        {SEARCH_TOKENS_FIELD: {"$regex": "^nguyen"}},
+        {SEARCH_TOKENS_FIELD: {"$regex": "^0912"}},
+    ]}
+
+
+def test_search_filter_escapes_regex_characters():
+    assert search_filter("a+b") == {"$and": [{SEARCH_TOKENS_FIELD: {"$regex": r"^a\+b"}}]}
+
+
+def test_search_filter_drops_short_terms():
+    assert search_filter("a nguyen") == {"$and": [{SEARCH_TOKENS_FIELD: {"$regex": "^nguyen"}}]}
+    assert search_filter("a b") is None
+    assert search_filter("   ") is None
@@ -0,0 +1,143 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+from bson import Decimal128
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+
+import serialization
+from serialization import dumps, ndjson_chunks, ndjson_lines, shape, shape_many
+
+
+class Row(BaseModel):
+    id: str
+    name: str
+    note: Optional[str] = None
+    count: int = 0
+    tags: list = Field(default_factory=list)
+
+
+def test_shape_keeps_model_fields_and_fills_static_defaults():
+    document = {"_id": "oid", "id": "r1", "name": "Row", "secret": "x"}
+    assert shape(document, Row) == {"id": "r1", "name": "Row", "note": None, "count": 0}
+
+
+def test_shape_keeps_stored_values():
+    document = {"id": "r1", "name": "Row", "note": "n", "count": 3, "tags": ["a"]}
+    assert shape(document, Row) == document
+
+
+def test_shape_with_selected_fields():
+    document = {"id": "r1", "name": "Row", "count": 5}
+    assert shape(document, Row, ["id", "count", "note"]) == {"id": "r1", "count": 5, "note": None}
+    assert shape({"id": "r1"}, Row, ["id", "name"]) == {"id": "r1"}
+
+
+# Datetimes as the driver returns them - naive UTC
+CREATED = datetime(2026, 1, 2, 3, 4, 5, 678000)
+
+
+class Nested(BaseModel):
+    label: str
+
+
+def test_dumps_encodes_database_types():
+    content = {"at": CREATED, "price": Decimal("12.5"), "stored": Decimal128("7.25"), "nested": Nested(label="x")}
+    assert json.loads(dumps(content)) == {
+        "at": "2026-01-02T03:04:05.678000", "price": 12.5, "stored": 7.25, "nested": {"label": "x"},
+    }
+
+
+def test_dumps_without_orjson_matches(monkeypatch):
+    content = [{"id": "r1", "at": CREATED, "name": "Nguyễn"}]
+    fast = dumps(content)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(dumps(content)) == json.loads(fast)
+    assert "Nguyễn".encode() in dumps(content)
+
+
+def test_trusted_response_matches_validated_response(server):
+    document = {
+        "_id": "oid", "id": "c1", "name": "Nguyen Van A", "phone": "0901234567", "total_spent": 1500.5,
+        "created_at": CREATED, "updated_at": CREATED, "search_tokens": ["nguyen"],
+    }
+    trusted = server.trusted_response(Response(headers={"ETag": '"e1"'}), [dict(document)], server.Customer)
+
+    validated = jsonable_encoder([server.Customer(**document)])
+    assert json.loads(trusted.body) == validated
+    assert trusted.headers["ETag"] == '"e1"'
+
+
+def test_ndjson_lines_one_document_per_line(monkeypatch):
+    rows = [{"id": "r1", "at": CREATED}, {"id": "r2", "at": None}]
+    body = ndjson_lines(rows)
+    assert body.endswith(b"\n")
+    assert [json.loads(line) for line in body.splitlines()] == [
+        {"id": "r1", "at": "2026-01-02T03:04:05.678000"}, {"id": "r2", "at": None},
+    ]
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert ndjson_lines(rows) == body
+    assert ndjson_lines([]) == b""
+
+
+class Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.anyio
+async def test_ndjson_chunks_encode_batch_by_batch():
+    cursor = Cursor([{"_id": n, "id": f"r{n}", "name": "Row"} for n in range(5)])
+    batches = []
+
+    async def transform(batch):
+        batches.append(len(batch))
+        return shape_many(batch, Row, ["id"])
+
+    chunks = [chunk async for chunk in ndjson_chunks(cursor, transform, batch_size=2)]
+    assert batches == [2, 2, 1]
+    assert len(chunks) == 3
+    assert [json.loads(line) for line in b"".join(chunks).splitlines()] == [{"id": f"r{n}"} for n in range(5)]
+    assert cursor.closed
+
+
+@pytest.mark.anyio
+async def test_ndjson_chunks_close_the_cursor_when_the_client_leaves():
+    cursor = Cursor([{"id": f"r{n}", "name": "Row"} for n in range(5)])
+
+    async def transform(batch):
+        return shape_many(batch, Row)
+
+    chunks = ndjson_chunks(cursor, transform, batch_size=2)
+    await chunks.__anext__()
+    await chunks.aclose()
+    assert cursor.closed
+
+
+@pytest.mark.anyio
+async def test_streamed_rows_match_buffered_responses(server):
+    document = {"_id": "oid", "id": "c1", "name": "Nguyen Van A", "phone": "0901234567", "created_at": CREATED}
+
+    streamed = await server.row_transform(server.Customer)([dict(document)])
+    buffered = server.trusted_response(Response(), [dict(document)], server.Customer)
+    assert json.loads(ndjson_lines(streamed)) == json.loads(buffered.body)[0]
+
+    # fields= keeps only the selection - created_at was fetched for the cursor, not returned
+    streamed = await server.row_transform(server.Customer, ["id", "name"])([dict(document)])
+    buffered = server.projected_response(Response(), [dict(document)], ["id", "name"])
+    assert streamed == json.loads(buffered.body) == [{"id": "c1", "name": "Nguyen Van A"}]
@@ -0,0 +1,93 @@
+import json
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+
+pytestmark = pytest.mark.anyio
+
+CUSTOMER_ID = str(uuid4())
+START = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def rows(result):
+    """Endpoint result as plain JSON rows"""
+    if isinstance(result, Response):
+        return json.loads(result.body)
+    return jsonable_encoder(result)
+
+
+@pytest.fixture
+async def feed(server, real_db, monkeypatch):
+    monkeypatch.setattr(server, "db", real_db)
+    await real_db.customers.insert_one({"id": CUSTOMER_ID, "name": "Nguyen Van A", "phone": "0901234567"})
+    await real_db.sales.insert_many([
+        {"id": f"s{n}", "customer_id": CUSTOMER_ID, "total": 100 + n, "bill_ids": [],
+         "created_at": START + timedelta(hours=2 * n)}
+        for n in range(3)
+    ])
+    await real_db.dao_transactions.insert_many([
+        {"id": f"d{n}", "transaction_id": f"D{n}", "customer_id": CUSTOMER_ID, "amount": 1000 + n,
+         "transaction_type": "CREDIT_DAO_BILL" if n == 0 else "CREDIT_DAO_POS",
+         "created_at": START + timedelta(hours=2 * n + 1)}
+        for n in range(3)
+    ])
+    # Legacy POS DAO without transaction_type, and one hidden by a customer delete
+    await real_db.dao_transactions.insert_one(
+        {"id": "legacy", "customer_id": CUSTOMER_ID, "amount": 1, "created_at": START - timedelta(days=1)}
+    )
+    await real_db.sales.insert_one(
+        {"id": "hidden", "customer_id": CUSTOMER_ID, "total": 1, "created_at": START, "deleted_at": START}
+    )
+
+    async def get(**params):
+        request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+        response = Response()
+        params = {"limit": 50, "offset": 0, "transaction_type": None, "customer_id": None,
+                  "date_from": None, "date_to": None, "cursor": None, **params}
+        result = await server.get_unified_transactions(request, response, **params)
+        return rows(result), response.headers.get("X-Next-Cursor")
+
+    return get
+
+
+async def test_sales_and_daos_newest_first(feed):
+    result, next_cursor = await feed()
+    assert [row["id"] for row in result] == ["d2", "s2", "d1", "s1", "d0", "s0", "legacy"]
+    assert next_cursor is None
+    assert result[0]["customer_name"] == "Nguyen Van A"
+    assert result[1]["type"] == "BILL_SALE"
+
+
+async def test_cursor_pages_do_not_overlap(feed):
+    first, cursor = await feed(limit=3)
+    second, cursor = await feed(limit=3, cursor=cursor)
+    third, cursor = await feed(limit=3, cursor=cursor)
+    ids = [row["id"] for row in first + second + third]
+    assert ids == ["d2", "s2", "d1", "s1", "d0", "s0", "legacy"]
+    assert cursor is None
+
+
+async def test_offset_pages(feed):
+    result, _ = await feed(limit=2, offset=3)
+    assert [row["id"] for row in result] == ["s1", "d0"]
+
+
+@pytest.mark.parametrize("transaction_type, expected", [
+    ("BILL_SALE", ["s2", "s1", "s0"]),
+    ("CREDIT_DAO_BILL", ["d0"]),
+    ("CREDIT_DAO_POS", ["d2", "d1", "legacy"]),
+])
+async def test_type_filter(feed, transaction_type, expected):
+    result, _ = await feed(transaction_type=transaction_type)
+    assert [row["id"] for row in result] == expected
+
+
+async def test_date_range(feed):
+    result, _ = await feed(
+        date_from=(START + timedelta(hours=1)).isoformat(), date_to=(START + timedelta(hours=3)).isoformat()
+    )
+    assert [row["id"] for row in result] == ["d1", "s1", "d0"]
@@ -0,0 +1,65 @@
+import pytest
+
+from write_behind import WriteBehindBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingCollection:
+    async def bulk_write(self, requests, ordered=True):
+        raise RuntimeError("unavailable")
+
+
+@pytest.fixture
+async def buffer(db):
+    await db.users.insert_many([{"username": "alice"}, {"username": "bob"}])
+    return WriteBehindBuffer(db)
+
+
+async def test_touches_of_one_document_collapse_into_one_write(buffer, db):
+    buffer.touch("users", "alice", {"last_login": 1}, key_field="username")
+    buffer.touch("users", "alice", {"last_login": 2}, key_field="username")
+    buffer.touch("users", "bob", {"last_login": 3}, key_field="username")
+    assert await db.users.count_documents({"last_login": {"$exists": True}}) == 0
+
+    assert await buffer.flush() == 2
+    assert (await db.users.find_one({"username": "alice"}))["last_login"] == 2
+    assert (await db.users.find_one({"username": "bob"}))["last_login"] == 3
+    assert buffer.metrics() == {"pending": 0, "touches_total": 3, "writes_total": 2, "last_flush_size": 2}
+
+
+async def test_flush_with_nothing_buffered(buffer):
+    assert await buffer.flush() == 0
+
+
+async def test_failed_flush_is_buffered_again(buffer):
+    buffer.db = {"users": FailingCollection()}
+    buffer.touch("users", "alice", {"last_login": 1}, key_field="username")
+    assert await buffer.flush() == 0
+    assert buffer._pending == {("users", "username", "alice"): {"last_login": 1}}
+
+
+async def test_buffering_again_keeps_newer_touches(buffer):
+    key = ("users", "username", "alice")
+    failed = {key: {"last_login": 1, "last_seen_ip": "a"}}
+    # Touched again while the failed flush was in flight
+    buffer.touch("users", "alice", {"last_login": 2}, key_field="username")
+    buffer._rebuffer(failed, [(key, None)])
+    assert buffer._pending[key] == {"last_login": 2, "last_seen_ip": "a"}
+
+
+async def test_stop_flushes_what_is_buffered(buffer, db):
+    await buffer.start()
+    buffer.touch("bills", "b1", {"last_checked_at": 1})
+    await db.bills.insert_one({"id": "b1"})
+    await buffer.stop()
+    assert (await db.bills.find_one({"id": "b1"}))["last_checked_at"] == 1
+    assert buffer.metrics()["pending"] == 0
+
+
+async def test_full_buffer_wakes_the_flusher(db):
+    buffer = WriteBehindBuffer(db, max_pending=2)
+    buffer.touch("users", "alice", {"n": 1}, key_field="username")
+    assert not buffer._wakeup.is_set()
+    buffer.touch("users", "bob", {"n": 1}, key_field="username")
+    assert buffer._wakeup.is_set()